@@ -0,0 +1,194 @@
+"""Micro-benchmarks of the client-side hot path on recorded ORS responses.
+
+Everything the app does to a response between parsing and st.* calls is
+timed on the fixtures in benchmarks/fixtures/ (see record_fixtures.py):
+coordinate swapping, polyline decoding, line simplification, folium map
+construction and HTML rendering, instruction/isochrone table rows, route
+normalization and response parsing.
+
+Each run is appended to benchmarks/results/hotpath.jsonl with the git
+commit, and compared against the previous run on the same Python version;
+benchmarks more than --threshold slower are reported as regressions.
+
+    python benchmarks/bench_hotpath.py
+    python benchmarks/bench_hotpath.py --filter map --no-save
+    python benchmarks/bench_hotpath.py --fail-on-regression
+"""
+import argparse
+import gzip
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ors_geometry  # noqa: E402
+import ors_maps  # noqa: E402
+import ors_parsing  # noqa: E402
+import ors_results  # noqa: E402
+
+try:
+    import polyline
+except ImportError:
+    polyline = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BENCH_DIR, "fixtures")
+RESULTS_FILE = os.path.join(BENCH_DIR, "results", "hotpath.jsonl")
+REPEAT = 5
+REGRESSION_THRESHOLD = 0.10
+SIMPLIFY_TOLERANCE = 0.0001  # ~11 m, below what a map at street zoom shows
+PAGE_ROWS = 50               # TABLE_PAGE_SIZE in the app
+
+
+def load_fixtures(directory=FIXTURE_DIR):
+    fixtures = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".json.gz"):
+            with gzip.open(os.path.join(directory, filename), "rb") as f:
+                fixtures[filename[:-len(".json.gz")]] = f.read()
+    return fixtures
+
+
+def benchmarks(fixtures):
+    """name -> zero-argument callable"""
+    cases = {}
+    for name, content in fixtures.items():
+        cases[f"parse/{name}/dict"] = lambda c=content: ors_parsing.parse_response(c)
+        cases[f"parse/{name}/arrays"] = lambda c=content: ors_parsing.parse_response(c, arrays=True)
+
+    for name in ("city_hop", "java_100km"):
+        if name not in fixtures:
+            continue
+        result = ors_parsing.loads(fixtures[name])
+        routes, _ = ors_results.normalize_routes(result)
+        _, segments, geometry = ors_results.route_parts(routes[0])
+        coordinates = geometry["coordinates"]
+        waypoints = [coordinates[0], coordinates[-1]]
+
+        def build_map(coordinates=coordinates, geometry=geometry, waypoints=waypoints):
+            m = ors_maps.create_map([coordinates[0][1], coordinates[0][0]])
+            ors_maps.add_markers_to_map(m, waypoints)
+            return ors_maps.add_route_to_map(m, geometry)
+
+        cases[f"normalize/{name}"] = lambda r=result: [ors_results.route_parts(route)
+                                                       for route in ors_results.normalize_routes(r)[0]]
+        cases[f"to_latlon/{name}"] = lambda c=coordinates: ors_maps.to_latlon(c)
+        cases[f"simplify/{name}"] = lambda c=coordinates: ors_geometry.simplify_line(c, SIMPLIFY_TOLERANCE)
+        cases[f"map/{name}/build"] = build_map
+        cases[f"map/{name}/render"] = lambda build=build_map: build().get_root().render()
+        cases[f"instructions/{name}/count"] = lambda s=segments: ors_results.count_instruction_rows(s)
+        cases[f"instructions/{name}/page"] = lambda s=segments: ors_results.instruction_rows(s, 0, PAGE_ROWS)
+        cases[f"instructions/{name}/all"] = lambda s=segments: ors_results.instruction_rows(s)
+
+    if "java_100km" in fixtures:
+        coordinates = ors_parsing.loads(fixtures["java_100km"])["features"][0]["geometry"]["coordinates"]
+        points = coordinates[::max(1, len(coordinates) // 50)][:50]
+        cases["map/markers_50"] = lambda p=points: ors_maps.add_markers_to_map(ors_maps.create_map(), p)
+
+    if "java_100km_polyline" in fixtures:
+        encoded = ors_parsing.loads(fixtures["java_100km_polyline"])["routes"][0]["geometry"]
+        cases["polyline/java_100km/ors_geometry"] = lambda e=encoded: ors_geometry.decode_polyline(e)
+        if polyline is not None:
+            cases["polyline/java_100km/polyline"] = lambda e=encoded: polyline.decode(e)
+
+    if "isochrones_5" in fixtures:
+        features = ors_parsing.loads(fixtures["isochrones_5"])["features"]
+        cases["isochrones_5/rows"] = lambda f=features: ors_results.isochrone_rows(f, "time", "km")
+        cases["isochrones_5/to_latlon"] = lambda f=features: [ors_maps.to_latlon(feature["geometry"]["coordinates"][0])
+                                                              for feature in f]
+    return cases
+
+
+def measure(fn, repeat=REPEAT):
+    """Median and best time per call in microseconds"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    times = [t / number * 1e6 for t in timer.repeat(repeat=repeat, number=number)]
+    return {"median_us": round(statistics.median(times), 2), "min_us": round(min(times), 2), "number": number}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=BENCH_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_run(path, python):
+    """Last stored run made with the same Python version"""
+    previous = None
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    run = json.loads(line)
+                    if run.get("python") == python:
+                        previous = run
+    except FileNotFoundError:
+        pass
+    return previous
+
+
+def compare(results, previous):
+    """name -> relative change of the median against the previous run"""
+    changes = {}
+    if previous:
+        for name, stats in results.items():
+            before = previous["results"].get(name)
+            if before and before["median_us"] > 0:
+                changes[name] = stats["median_us"] / before["median_us"] - 1
+    return changes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Client hot-path micro-benchmarks")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Relative slowdown reported as a regression (default 0.10)")
+    parser.add_argument("--results", default=RESULTS_FILE)
+    parser.add_argument("--no-save", action="store_true", help="Do not append this run to the results file")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    python = platform.python_version()
+    previous = previous_run(args.results, python)
+    cases = benchmarks(load_fixtures())
+    if args.filter:
+        cases = {name: fn for name, fn in cases.items() if args.filter in name}
+
+    results = {}
+    width = max(len(name) for name in cases) + 2
+    print(f"python {python}, orjson: {'yes' if ors_parsing.orjson else 'no'}, "
+          f"polyline: {'yes' if polyline else 'no'}, baseline: {previous['commit'] if previous else '-'}")
+    print(f"{'benchmark':<{width}}{'median us':>12}{'min us':>12}{'change':>10}")
+    for name, fn in cases.items():
+        results[name] = measure(fn, args.repeat)
+        change = compare({name: results[name]}, previous).get(name)
+        flag = ""
+        if change is not None:
+            flag = f"{change:+.1%}" + ("  REGRESSION" if change > args.threshold else "")
+        print(f"{name:<{width}}{results[name]['median_us']:>12.1f}{results[name]['min_us']:>12.1f}  {flag:>8}")
+
+    regressions = {name: change for name, change in compare(results, previous).items() if change > args.threshold}
+    if not args.no_save:
+        os.makedirs(os.path.dirname(args.results), exist_ok=True)
+        run = {"ts": round(time.time(), 3), "commit": git_commit(), "python": python,
+               "platform": platform.platform(), "results": results}
+        with open(args.results, "a", encoding="utf-8") as f:
+            f.write(json.dumps(run, separators=(",", ":")) + "\n")
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(sorted(regressions))}")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Parse time and peak memory of large ORS responses, dict path vs array path.
+
+Payloads are /matrix answers generated by the stand-in server's response
+builder: a full 50x50 matrix (the default 2500-cell maximum_routes limit)
+and a 300x300 one, as an instance with a raised limit returns. "before" is
+what the app did so far (response.json() and then np.array over the
+lists); "after" is ors_parsing.parse_response(..., arrays=True).
+
+    python benchmarks/bench_parsing.py
+"""
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ors_parsing  # noqa: E402
+import standin_server  # noqa: E402
+
+
+def payloads():
+    state = standin_server.StandinState(points_per_km=200)
+    cases = {}
+    for size in (50, 300):
+        locations = [[106.70 + 0.01 * (i % 20), -6.30 + 0.01 * (i // 20)] for i in range(size)]
+        matrix = standin_server.matrix_response(state, "driving-car",
+                                                {"locations": locations, "metrics": ["duration", "distance"]})
+        cases[f"matrix {size}x{size}"] = json.dumps(matrix).encode()
+    return cases
+
+
+def before(content):
+    result = json.loads(content)
+    for key in ("durations", "distances"):
+        if key in result:
+            result[key] = np.array(result[key], dtype=float)
+    return result
+
+
+def after(content):
+    return ors_parsing.parse_response(content, arrays=True)
+
+
+def measure(fn, content, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn(content)
+        best = min(best, time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    result = fn(content)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return best, peak
+
+
+def main():
+    print(f"orjson: {'yes' if ors_parsing.orjson else 'no'}")
+    print(f"{'payload':<20}{'size KB':>9}{'before ms':>11}{'after ms':>10}{'before peak KB':>16}{'after peak KB':>15}")
+    for name, content in payloads().items():
+        t_before, m_before = measure(before, content)
+        t_after, m_after = measure(after, content)
+        print(f"{name:<20}{len(content) / 1024:>9.0f}{t_before * 1000:>11.2f}{t_after * 1000:>10.2f}"
+              f"{m_before / 1024:>16.0f}{m_after / 1024:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Benchmark the region dispatcher against two local stand-in servers.
+
+One stand-in plays a Jakarta metro graph (small bbox, fast), the other the
+full Java graph (large bbox, slower per request because of its size). The
+same mixed workload is sent once with every request going to the Java
+instance and once through the RegionDispatcher, and the per-request
+overhead of resolve() itself is measured separately.
+
+    python benchmarks/bench_regions.py --requests 400 --concurrency 8
+
+--workload samples the requests from a model built by ors_logs.py instead
+of uniform random points.
+"""
+import argparse
+import concurrent.futures
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ors_client import send_request  # noqa: E402
+from ors_logs import WorkloadModel  # noqa: E402
+from ors_regions import Region, RegionDispatcher  # noqa: E402
+from standin_server import start_standin_server  # noqa: E402
+
+JAKARTA_BBOX = [106.45, -6.55, 107.20, -5.95]
+JAVA_BBOX = [105.0, -8.9, 114.7, -5.8]
+
+
+def make_workload(n, jakarta_share, seed=0):
+    rng = random.Random(seed)
+    workload = []
+    for _ in range(n):
+        bbox = JAKARTA_BBOX if rng.random() < jakarta_share else JAVA_BBOX
+        kind = rng.choice(["directions", "matrix", "isochrones"])
+        points = [[rng.uniform(bbox[0] + 0.1, bbox[2] - 0.1), rng.uniform(bbox[1] + 0.1, bbox[3] - 0.1)]
+                  for _ in range(2 if kind == "directions" else 5 if kind == "matrix" else 1)]
+        if kind == "directions":
+            workload.append(("directions/driving-car", {"coordinates": points, "format": "geojson"}))
+        elif kind == "matrix":
+            workload.append(("matrix/driving-car", {"locations": points, "metrics": ["duration"]}))
+        else:
+            workload.append(("isochrones/driving-car", {"locations": points, "range": [300]}))
+    return workload
+
+
+def run(workload, base_url, dispatcher, concurrency):
+    latencies = []
+
+    def one(item):
+        endpoint, body = item
+        start = time.perf_counter()
+        result, error = send_request(base_url, endpoint, data=body, method="POST",
+                                     priority="batch", session_id="bench", dispatcher=dispatcher)
+        latencies.append(time.perf_counter() - start)
+        return error is None
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as pool:
+        ok = sum(pool.map(one, workload))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "ok": ok,
+        "throughput_rps": round(len(workload) / elapsed, 1),
+        "p50_ms": round(1000 * statistics.median(latencies), 1),
+        "p95_ms": round(1000 * latencies[int(0.95 * (len(latencies) - 1))], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--jakarta-share", type=float, default=0.8)
+    parser.add_argument("--workload", help="Workload model JSON from ors_logs.py")
+    args = parser.parse_args()
+
+    _, jakarta_url = start_standin_server(bbox=JAKARTA_BBOX, base_latency=0.004, work_latency=0.0002,
+                                          knee=4, name="jakarta")
+    _, java_url = start_standin_server(bbox=JAVA_BBOX, base_latency=0.012, work_latency=0.0005,
+                                       knee=4, name="java")
+    dispatcher = RegionDispatcher([Region("jakarta", jakarta_url, JAKARTA_BBOX), Region("java", java_url, JAVA_BBOX)])
+    if args.workload:
+        workload = WorkloadModel.load(args.workload).sample_requests(args.requests)
+    else:
+        workload = make_workload(args.requests, args.jakarta_share)
+
+    # Warm connections and the limiter before measuring
+    run(workload[:50], java_url, None, args.concurrency)
+
+    single = run(workload, java_url, None, args.concurrency)
+    dispatcher.counts = dict.fromkeys(dispatcher.counts, 0)
+    sharded = run(workload, java_url, dispatcher, args.concurrency)
+    split = dict(dispatcher.counts)
+
+    start = time.perf_counter()
+    for endpoint, body in workload:
+        dispatcher.resolve(endpoint, body)
+    resolve_us = 1e6 * (time.perf_counter() - start) / len(workload)
+
+    print(f"{'mode':<12}{'ok':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, stats in (("java only", single), ("dispatched", sharded)):
+        print(f"{name:<12}{stats['ok']:>6}{stats['throughput_rps']:>10}{stats['p50_ms']:>10}{stats['p95_ms']:>10}")
+    print(f"dispatch split: {split}")
+    print(f"resolve() overhead: {resolve_us:.1f} us/request")
+
+
+if __name__ == "__main__":
+    main()
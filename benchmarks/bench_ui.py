@@ -0,0 +1,231 @@
+"""End-to-end interaction latency of the Streamlit app, driven headlessly.
+
+ors_streamlit_app.py is run under Streamlit's AppTest harness against a
+stand-in ORS started in a subprocess, through scripted scenarios:
+
+    directions   load the app, change a waypoint, calculate a route, then
+                 change a waypoint again with the route on screen
+    isochrones   switch service, generate the 3 default bands, change a band
+    tsp          switch to Optimization, add two locations, optimize
+    vrp          switch to Optimization/VRP, optimize
+
+Each interaction is one script rerun; its wall time (median over --runs
+fresh sessions), peak traced memory (one extra tracemalloc pass, which is
+slower so it is not timed) and the number of elements the rerun produced
+are reported. Scenarios that need a service the app does not offer in its
+selector are reported as skipped. Runs are appended to
+benchmarks/results/ui.jsonl and compared with the previous one like
+bench_hotpath.py does, so a rerun that got >10% slower or heavier, or an
+app that renders more elements than before, is flagged.
+
+    python benchmarks/bench_ui.py
+    python benchmarks/bench_ui.py --scenario directions --runs 5 --no-save
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import requests
+from streamlit.testing.v1 import AppTest
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from bench_hotpath import REGRESSION_THRESHOLD, git_commit, previous_run  # noqa: E402
+
+APP_FILE = os.path.join(os.path.dirname(BENCH_DIR), "ors_streamlit_app.py")
+RESULTS_FILE = os.path.join(BENCH_DIR, "results", "ui.jsonl")
+RUNS = 3
+APP_TIMEOUT = 120  # seconds one rerun may take before AppTest gives up
+
+
+class Skipped(Exception):
+    pass
+
+
+def _widget(elements, label=None, key=None):
+    for element in elements:
+        if (key is not None and element.key == key) or (label is not None and element.label.startswith(label)):
+            return element
+    raise LookupError(f"No widget with label {label!r} / key {key!r}")
+
+
+def select_service(at, service):
+    selector = _widget(at.selectbox, label="🎯 Select ORS Service")
+    if service not in selector.options:
+        raise Skipped(f"'{service}' is not offered in the service selector")
+    selector.set_value(service)
+
+
+# name -> [(interaction, action(at) applied before the rerun)]
+SCENARIOS = {
+    "directions": [
+        ("load", None),
+        ("change waypoint", lambda at: _widget(at.number_input, key="lat_1").set_value(-6.2409)),
+        ("calculate route", lambda at: _widget(at.button, key="calculate_route").click()),
+        ("change waypoint with route", lambda at: _widget(at.number_input, key="lon_1").set_value(106.7932)),
+    ],
+    "isochrones": [
+        ("load", None),
+        ("select isochrones", lambda at: select_service(at, "Isochrones")),
+        ("generate 3 bands", lambda at: _widget(at.button, key="generate_iso").click()),
+        ("change band with results", lambda at: _widget(at.number_input, label="Range 3").set_value(20)),
+    ],
+    "tsp": [
+        ("load", None),
+        ("select optimization", lambda at: select_service(at, "Optimization")),
+        ("add location", lambda at: _widget(at.button, key="tsp_add").click()),
+        ("add another location", lambda at: _widget(at.button, key="tsp_add").click()),
+        ("optimize tsp", lambda at: _widget(at.button, key="optimize_tsp").click()),
+    ],
+    "vrp": [
+        ("load", None),
+        ("select optimization", lambda at: select_service(at, "Optimization")),
+        ("select vrp", lambda at: _widget(at.selectbox, label="Problem Type")
+            .set_value("Vehicle Routing Problem (VRP)")),
+        ("optimize vrp", lambda at: _widget(at.button, key="optimize_vrp").click()),
+    ],
+}
+
+
+def count_elements(node):
+    children = getattr(node, "children", None)
+    if not children:
+        return 1
+    return 1 + sum(count_elements(child) for child in children.values())
+
+
+def run_scenario(steps, base_url, memory=False):
+    """One fresh session through the scenario; per-interaction measurements"""
+    at = AppTest.from_file(APP_FILE, default_timeout=APP_TIMEOUT)
+    at.session_state["base_url"] = base_url
+    measurements = []
+    for name, action in steps:
+        if action is not None:
+            action(at)
+        if memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        at.run()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if memory else None
+        if memory:
+            tracemalloc.stop()
+        if at.exception:
+            raise RuntimeError(f"{name}: {at.exception[0].message}")
+        measurements.append({"interaction": name, "script_ms": elapsed * 1000, "peak_kb": peak and peak / 1024,
+                             "elements": count_elements(at._tree), "errors": len(at.error)})
+    return measurements
+
+
+def benchmark(name, steps, base_url, runs=RUNS):
+    timed = [run_scenario(steps, base_url) for _ in range(runs)]
+    traced = run_scenario(steps, base_url, memory=True)
+    results = {}
+    for index, (interaction, _) in enumerate(steps):
+        times = [run[index]["script_ms"] for run in timed]
+        results[f"{name}/{interaction}"] = {
+            "median_ms": round(statistics.median(times), 1),
+            "min_ms": round(min(times), 1),
+            "peak_kb": round(traced[index]["peak_kb"], 1),
+            "elements": traced[index]["elements"],
+            "errors": traced[index]["errors"],
+        }
+    return results
+
+
+def start_standin():
+    """Stand-in ORS in a subprocess, so its allocations stay out of the traced memory"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    process = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "standin_server.py"), "--port", str(port)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}/ors/v2"
+    for _ in range(100):
+        try:
+            requests.get(f"{base_url}/health", timeout=1)
+            return process, base_url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Stand-in server did not start")
+
+
+def compare(results, previous, threshold=REGRESSION_THRESHOLD):
+    """name -> list of what got worse against the previous run"""
+    regressions = {}
+    if not previous:
+        return regressions
+    for name, stats in results.items():
+        before = previous["results"].get(name)
+        if not before:
+            continue
+        worse = []
+        for metric in ("median_ms", "peak_kb"):
+            if before[metric] and stats[metric] / before[metric] - 1 > threshold:
+                worse.append(f"{metric} {stats[metric] / before[metric] - 1:+.0%}")
+        if stats["elements"] > before["elements"]:
+            worse.append(f"elements {before['elements']} -> {stats['elements']}")
+        if worse:
+            regressions[name] = worse
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless end-to-end UI rerun benchmark")
+    parser.add_argument("--scenario", nargs="*", choices=sorted(SCENARIOS), help="Scenarios to run (default all)")
+    parser.add_argument("--runs", type=int, default=RUNS, help="Timed sessions per scenario")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--results", default=RESULTS_FILE)
+    parser.add_argument("--no-save", action="store_true", help="Do not append this run to the results file")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    python = platform.python_version()
+    previous = previous_run(args.results, python)
+    process, base_url = start_standin()
+    results, skipped = {}, {}
+    try:
+        for name in args.scenario or SCENARIOS:
+            try:
+                results.update(benchmark(name, SCENARIOS[name], base_url, args.runs))
+            except Skipped as exc:
+                skipped[name] = str(exc)
+    finally:
+        process.kill()
+
+    regressions = compare(results, previous, args.threshold)
+    width = max([len(name) for name in results] + [20]) + 2
+    print(f"python {python}, baseline: {previous['commit'] if previous else '-'}")
+    print(f"{'interaction':<{width}}{'median ms':>11}{'min ms':>9}{'peak KB':>10}{'elements':>10}  flags")
+    for name, stats in results.items():
+        flags = ", ".join(regressions.get(name, []))
+        if stats["errors"]:
+            flags = f"{stats['errors']} st.error  {flags}"
+        print(f"{name:<{width}}{stats['median_ms']:>11.1f}{stats['min_ms']:>9.1f}{stats['peak_kb']:>10.0f}"
+              f"{stats['elements']:>10}  {flags}")
+    for name, reason in skipped.items():
+        print(f"{name:<{width}}skipped: {reason}")
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(args.results), exist_ok=True)
+        run = {"ts": round(time.time(), 3), "commit": git_commit(), "python": python,
+               "platform": platform.platform(), "results": results, "skipped": skipped}
+        with open(args.results, "a", encoding="utf-8") as f:
+            f.write(json.dumps(run, separators=(",", ":")) + "\n")
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(sorted(regressions))}")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
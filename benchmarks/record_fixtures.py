@@ -0,0 +1,139 @@
+"""Record the response fixtures used by bench_hotpath.py.
+
+Each fixture is one raw ORS response body, gzipped, in benchmarks/fixtures/:
+
+    city_hop.json.gz       Blok M -> Kolam Renang Bulungan, GeoJSON
+    java_100km.json.gz     Jakarta -> Bandung, GeoJSON
+    java_100km_polyline.json.gz
+                           the same route as format=json (encoded polyline)
+    isochrones_5.json.gz   5 origins x 10 time ranges
+    matrix_50.json.gz      50 x 50 durations and distances
+
+With --base-url the requests go to a real ORS instance, which is what the
+committed fixtures should come from. Without it the stand-in's response
+builders are used and the geometry is made to look like a road (a ~20 m
+zig-zag, ~1 km instruction steps, detailed isochrone rings), so sizes and
+shapes stay realistic when no ORS with a Java graph is at hand.
+
+    python benchmarks/record_fixtures.py --base-url http://localhost:8080/ors/v2
+    python benchmarks/record_fixtures.py
+"""
+import argparse
+import gzip
+import json
+import math
+import os
+import sys
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import standin_server  # noqa: E402
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+PROFILE = "driving-car"
+BLOK_M = [106.8006, -6.2446]
+BULUNGAN = [106.7932, -6.2409]
+JAKARTA = [106.8272, -6.1754]
+BANDUNG = [107.6191, -6.9175]
+MATRIX_LOCATIONS = [[round(106.70 + 0.02 * (i % 10), 4), round(-6.30 + 0.02 * (i // 10), 4)] for i in range(50)]
+
+# name -> (endpoint, request body)
+FIXTURES = {
+    "city_hop": (f"directions/{PROFILE}/geojson", {"coordinates": [BLOK_M, BULUNGAN]}),
+    "java_100km": (f"directions/{PROFILE}/geojson", {"coordinates": [JAKARTA, BANDUNG]}),
+    "java_100km_polyline": (f"directions/{PROFILE}/json", {"coordinates": [JAKARTA, BANDUNG]}),
+    "isochrones_5": (f"isochrones/{PROFILE}", {"locations": MATRIX_LOCATIONS[:5],
+                                               "range": list(range(360, 3960, 360))}),
+    "matrix_50": (f"matrix/{PROFILE}", {"locations": MATRIX_LOCATIONS, "metrics": ["duration", "distance"]}),
+}
+
+WIGGLE_M = 20.0   # lateral zig-zag of generated route geometry
+STEP_KM = 1.0     # length of a generated instruction step
+RING_DETAIL = 10  # vertices per stand-in ring edge
+
+
+def record(base_url, endpoint, body):
+    response = requests.post(f"{base_url.rstrip('/')}/{endpoint}", json=body,
+                             headers={"Content-Type": "application/json"}, timeout=300)
+    response.raise_for_status()
+    return response.content
+
+
+def _wiggle(coordinates):
+    out = []
+    for i, (lon, lat) in enumerate(coordinates):
+        offset = WIGGLE_M / 111320.0 * (1 if i % 2 else -1) if 0 < i < len(coordinates) - 1 else 0.0
+        out.append([round(lon + offset / math.cos(math.radians(lat)), 6), round(lat + offset, 6)])
+    return out
+
+
+def _steps(segment, start, stop):
+    count = max(1, int(segment["distance"] / 1000 / STEP_KM))
+    bounds = [start + (stop - start) * k // count for k in range(count + 1)]
+    steps = []
+    for k, (a, b) in enumerate(zip(bounds, bounds[1:])):
+        steps.append({"distance": round(segment["distance"] / count, 1),
+                      "duration": round(segment["duration"] / count, 1),
+                      "type": 11 if k == 0 else (k % 8), "instruction": f"Continue onto Jalan {k + 1}",
+                      "name": f"Jalan {k + 1}", "way_points": [a, b]})
+    steps.append({"distance": 0.0, "duration": 0.0, "type": 10, "instruction": "Arrive at your destination",
+                  "name": "-", "way_points": [stop, stop]})
+    return steps
+
+
+def generate(endpoint, body):
+    state = standin_server.StandinState(points_per_km=40)
+    service = endpoint.split("/")[0]
+    if service == "directions":
+        geojson = endpoint.endswith("/geojson")
+        result = standin_server.directions_response(state, PROFILE, dict(body), True)
+        feature = result["features"][0]
+        coordinates = _wiggle(feature["geometry"]["coordinates"])
+        properties = feature["properties"]
+        way_points = properties["way_points"]
+        for segment, start, stop in zip(properties["segments"], way_points, way_points[1:]):
+            segment["steps"] = _steps(segment, start, stop)
+        if geojson:
+            feature["geometry"]["coordinates"] = coordinates
+        else:
+            result = {"bbox": result["bbox"], "metadata": result["metadata"],
+                      "routes": [dict(properties, bbox=feature["bbox"],
+                                      geometry=standin_server.encode_polyline(coordinates))]}
+            result["metadata"]["query"]["format"] = "json"
+    elif service == "isochrones":
+        result = standin_server.isochrones_response(state, PROFILE, body)
+        for feature in result["features"]:
+            ring = feature["geometry"]["coordinates"][0]
+            feature["geometry"]["coordinates"][0] = [
+                [round(a[0] + (b[0] - a[0]) * t / RING_DETAIL, 6), round(a[1] + (b[1] - a[1]) * t / RING_DETAIL, 6)]
+                for a, b in zip(ring, ring[1:]) for t in range(RING_DETAIL)
+            ] + [ring[0]]
+    else:
+        result = standin_server.matrix_response(state, PROFILE, body)
+    # Pin the timestamp so regenerated fixtures are byte-identical
+    result["metadata"].pop("timestamp", None)
+    return json.dumps(result, separators=(",", ":")).encode()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record ORS response fixtures for bench_hotpath.py")
+    parser.add_argument("--base-url", help="Record from this ORS (e.g. http://localhost:8080/ors/v2) "
+                                           "instead of generating from the stand-in")
+    parser.add_argument("--only", nargs="*", choices=sorted(FIXTURES), help="Fixtures to (re)record")
+    parser.add_argument("--output-dir", default=FIXTURE_DIR)
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for name in args.only or FIXTURES:
+        endpoint, body = FIXTURES[name]
+        content = record(args.base_url, endpoint, body) if args.base_url else generate(endpoint, body)
+        path = os.path.join(args.output_dir, f"{name}.json.gz")
+        with gzip.GzipFile(path, "wb", mtime=0) as f:
+            f.write(content)
+        print(f"{name:<22}{len(content) / 1024:>10.1f} KiB  {path}")
+
+
+if __name__ == "__main__":
+    main()
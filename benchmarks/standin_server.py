@@ -0,0 +1,341 @@
+"""Local stand-in for the ORS v2 HTTP API, used by the benchmarks.
+
+It answers /health, /status, directions, isochrones, matrix, snap and
+optimization with responses shaped like the real ORS 8 / VROOM ones
+(straight-line geometry, haversine based distances and durations,
+nearest-neighbour tours) and emulates the JVM's behaviour under load:
+every request costs a base latency plus work-proportional time, and once
+more than `knee` requests are in flight the service time grows
+quadratically. Points outside the configured coverage bbox are rejected
+the way ORS rejects points it cannot snap.
+
+Run standalone:
+    python benchmarks/standin_server.py --port 8090 --bbox 106.6,-6.4,107.0,-6.1
+
+Or from another script:
+    server, base_url = start_standin_server(bbox=[...])
+"""
+import argparse
+import http.server
+import json
+import math
+import os
+import threading
+import time
+
+STATUS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ors_status.json")
+
+# Average speeds (km/h) used to turn straight-line distance into durations
+PROFILE_SPEEDS = {"driving-car": 40.0, "driving-hgv": 30.0, "foot-walking": 5.0, "foot-hiking": 4.0,
+                  "wheelchair": 4.0, "cycling-regular": 15.0, "cycling-road": 20.0,
+                  "cycling-mountain": 12.0, "cycling-electric": 20.0}
+CIRCUITY = 1.3  # road distance / straight-line distance
+EARTH_RADIUS = 6371008.8
+
+
+def haversine(a, b):
+    """Great-circle distance in metres between two [lon, lat] points"""
+    lon1, lat1, lon2, lat2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(h))
+
+
+def encode_polyline(coords, precision=5):
+    """Google encoded polyline for [lon, lat] coordinates (as ORS emits)"""
+    factor = 10 ** precision
+    output = []
+    prev_lat = prev_lon = 0
+    for lon, lat in coords:
+        lat_i, lon_i = int(round(lat * factor)), int(round(lon * factor))
+        for delta in (lat_i - prev_lat, lon_i - prev_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                output.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            output.append(chr(value + 63))
+        prev_lat, prev_lon = lat_i, lon_i
+    return "".join(output)
+
+
+class StandinState:
+    """Configuration and load counters shared by the handler threads"""
+
+    def __init__(self, bbox=None, base_latency=0.005, knee=4, work_latency=0.0005,
+                 points_per_km=20, name="standin"):
+        self.bbox = bbox
+        self.base_latency = base_latency
+        self.knee = knee
+        self.work_latency = work_latency
+        self.points_per_km = points_per_km
+        self.name = name
+        self.active = 0
+        self.served = 0
+        self.lock = threading.Lock()
+        with open(STATUS_FILE) as f:
+            self.status = json.load(f)
+
+    def covers(self, coord):
+        if not self.bbox:
+            return True
+        return self.bbox[0] <= coord[0] <= self.bbox[2] and self.bbox[1] <= coord[1] <= self.bbox[3]
+
+
+def _speed(profile):
+    return PROFILE_SPEEDS.get(profile, 40.0) / 3.6
+
+
+def _line(a, b, points):
+    points = max(2, points)
+    return [[round(a[0] + (b[0] - a[0]) * t / (points - 1), 6),
+             round(a[1] + (b[1] - a[1]) * t / (points - 1), 6)] for t in range(points)]
+
+
+def directions_response(state, profile, body, geojson):
+    coordinates = body["coordinates"]
+    speed = _speed(profile)
+    geometry = []
+    segments = []
+    way_points = [0]
+    for a, b in zip(coordinates, coordinates[1:]):
+        distance = haversine(a, b) * CIRCUITY
+        leg = _line(a, b, int(distance / 1000 * state.points_per_km) + 2)
+        offset = len(geometry) - 1 if geometry else 0
+        geometry.extend(leg if not geometry else leg[1:])
+        way_points.append(len(geometry) - 1)
+        duration = distance / speed
+        steps = [
+            {"distance": round(distance, 1), "duration": round(duration, 1), "type": 11,
+             "instruction": "Head along the straight line", "name": "-", "way_points": [offset, len(geometry) - 1]},
+            {"distance": 0.0, "duration": 0.0, "type": 10, "instruction": "Arrive at your destination",
+             "name": "-", "way_points": [len(geometry) - 1, len(geometry) - 1]},
+        ]
+        segments.append({"distance": round(distance, 1), "duration": round(duration, 1), "steps": steps})
+
+    summary = {"distance": round(sum(s["distance"] for s in segments), 1),
+               "duration": round(sum(s["duration"] for s in segments), 1)}
+    lons = [c[0] for c in geometry]
+    lats = [c[1] for c in geometry]
+    bbox = [min(lons), min(lats), max(lons), max(lats)]
+    properties = {"summary": summary, "way_points": way_points}
+    if body.get("instructions", True):
+        properties["segments"] = segments
+    info = {"attribution": "standin", "service": "routing", "timestamp": int(time.time() * 1000),
+            "query": {"coordinates": coordinates, "profile": profile, "format": "geojson" if geojson else "json"},
+            "engine": state.status["engine"]}
+
+    if geojson:
+        feature = {"bbox": bbox, "type": "Feature", "properties": properties,
+                   "geometry": {"coordinates": geometry, "type": "LineString"}}
+        return {"type": "FeatureCollection", "bbox": bbox, "features": [feature], "metadata": info}
+    route = dict(properties, bbox=bbox, geometry=encode_polyline(geometry))
+    return {"bbox": bbox, "routes": [route], "metadata": info}
+
+
+def isochrones_response(state, profile, body):
+    features = []
+    speed = _speed(profile)
+    range_type = body.get("range_type", "time")
+    for group_index, location in enumerate(body["locations"]):
+        for value in sorted(body["range"]):
+            radius = value * speed / CIRCUITY if range_type == "time" else value / CIRCUITY
+            dlat = radius / 111320.0
+            dlon = dlat / max(0.01, math.cos(math.radians(location[1])))
+            ring = [[round(location[0] + dlon * math.cos(2 * math.pi * k / 64), 6),
+                     round(location[1] + dlat * math.sin(2 * math.pi * k / 64), 6)] for k in range(64)]
+            ring.append(ring[0])
+            properties = {"group_index": group_index, "value": value, "center": location}
+            if body.get("area_units") or "area" in body.get("attributes", []):
+                area = math.pi * radius ** 2
+                units = body.get("area_units", "m")
+                properties["area"] = area / {"m": 1, "km": 1e6, "mi": 2.59e6}.get(units, 1)
+            features.append({"type": "Feature", "properties": properties,
+                             "geometry": {"type": "Polygon", "coordinates": [ring]}})
+    lons = [c[0] for f in features for c in f["geometry"]["coordinates"][0]]
+    lats = [c[1] for f in features for c in f["geometry"]["coordinates"][0]]
+    return {"type": "FeatureCollection", "bbox": [min(lons), min(lats), max(lons), max(lats)],
+            "features": features, "metadata": {"service": "isochrones", "engine": state.status["engine"]}}
+
+
+def matrix_response(state, profile, body):
+    locations = body["locations"]
+    sources = body.get("sources", list(range(len(locations))))
+    destinations = body.get("destinations", list(range(len(locations))))
+    if sources == "all" or sources == ["all"]:
+        sources = list(range(len(locations)))
+    if destinations == "all" or destinations == ["all"]:
+        destinations = list(range(len(locations)))
+    speed = _speed(profile)
+    metrics = body.get("metrics", ["duration"])
+    distances = [[round(haversine(locations[s], locations[d]) * CIRCUITY, 2) for d in destinations] for s in sources]
+    response = {"metadata": {"service": "matrix", "engine": state.status["engine"]},
+                "sources": [{"location": locations[s]} for s in sources],
+                "destinations": [{"location": locations[d]} for d in destinations]}
+    if "duration" in metrics:
+        response["durations"] = [[round(d / speed, 2) for d in row] for row in distances]
+    if "distance" in metrics:
+        response["distances"] = distances
+    return response
+
+
+def snap_response(state, profile, body):
+    return {"locations": [{"location": loc, "snapped_distance": 0.0} if state.covers(loc) else None
+                          for loc in body["locations"]],
+            "metadata": {"service": "snap", "engine": state.status["engine"]}}
+
+
+def optimization_response(state, body):
+    """VROOM-shaped answer: nearest-neighbour tours that respect vehicle capacity"""
+    remaining = list(body.get("jobs", []))
+    routes = []
+    for vehicle in body.get("vehicles", []):
+        speed = _speed(vehicle.get("profile", "driving-car"))
+        capacity = (vehicle.get("capacity") or [float("inf")])[0]
+        load = 0
+        position = vehicle.get("start") or vehicle.get("end")
+        clock = (vehicle.get("time_window") or [0])[0]
+        distance = duration = service = 0
+        steps = [{"type": "start", "location": position, "arrival": clock, "duration": 0, "distance": 0}]
+        while remaining:
+            fitting = [job for job in remaining if load + (job.get("amount") or [0])[0] <= capacity]
+            if not fitting:
+                break
+            job = min(fitting, key=lambda j: haversine(position, j["location"]))
+            remaining.remove(job)
+            leg = haversine(position, job["location"]) * CIRCUITY
+            distance += leg
+            duration += leg / speed
+            clock += leg / speed
+            load += (job.get("amount") or [0])[0]
+            steps.append({"type": "job", "id": job["id"], "job": job["id"], "location": job["location"],
+                          "arrival": int(clock), "duration": int(duration), "distance": int(distance),
+                          "service": job.get("service", 0), "load": [load]})
+            clock += job.get("service", 0)
+            service += job.get("service", 0)
+            position = job["location"]
+        end = vehicle.get("end") or position
+        leg = haversine(position, end) * CIRCUITY
+        distance += leg
+        duration += leg / speed
+        steps.append({"type": "end", "location": end, "arrival": int(clock + leg / speed),
+                      "duration": int(duration), "distance": int(distance)})
+        routes.append({"vehicle": vehicle["id"], "cost": int(duration), "distance": int(distance),
+                       "duration": int(duration), "service": service, "steps": steps})
+    summary = {key: sum(route[key] for route in routes) for key in ("cost", "distance", "duration", "service")}
+    summary.update(routes=len(routes), unassigned=len(remaining))
+    return {"code": 0, "summary": summary, "routes": routes,
+            "unassigned": [{"id": job["id"], "location": job["location"]} for job in remaining]}
+
+
+def make_handler(state):
+    class StandinHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, payload):
+            body = json.dumps(payload, separators=(",", ":")).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _simulate(self, work):
+            with state.lock:
+                state.active += 1
+                active = state.active
+            try:
+                congestion = max(1.0, active / state.knee) ** 2
+                time.sleep((state.base_latency + state.work_latency * work) * congestion)
+            finally:
+                with state.lock:
+                    state.active -= 1
+                    state.served += 1
+
+        def do_GET(self):
+            path = self.path.split("?")[0].rstrip("/")
+            if path.endswith("/health"):
+                self._send(200, {"status": "ready"})
+            elif path.endswith("/status"):
+                self._send(200, state.status)
+            else:
+                self._send(404, {"error": {"code": 404, "message": "Not found"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            parts = self.path.split("?")[0].strip("/").split("/")
+            if parts[-1] == "optimization":
+                payload = optimization_response(state, body)
+                self._simulate(20 * len(body.get("jobs", [])))
+                self._send(200, payload)
+                return
+            try:
+                service_index = next(i for i, p in enumerate(parts)
+                                     if p in ("directions", "isochrones", "matrix", "snap"))
+            except StopIteration:
+                self._send(404, {"error": {"code": 404, "message": "Unknown endpoint"}})
+                return
+            service = parts[service_index]
+            profile = parts[service_index + 1] if len(parts) > service_index + 1 else "driving-car"
+            points = body.get("coordinates") or body.get("locations") or []
+            if service != "snap" and not all(state.covers(p) for p in points):
+                self._send(404, {"error": {"code": 2010, "message": f"Could not find routable point ({state.name})"}})
+                return
+
+            if service == "directions":
+                geojson = parts[-1] == "geojson" or body.get("format") == "geojson"
+                payload = directions_response(state, profile, body, geojson)
+                work = sum(haversine(a, b) for a, b in zip(points, points[1:])) / 1000
+            elif service == "isochrones":
+                payload = isochrones_response(state, profile, body)
+                work = 50 * len(points) * len(body.get("range", []))
+            elif service == "matrix":
+                payload = matrix_response(state, profile, body)
+                rows = payload.get("durations", payload.get("distances")) or [[]]
+                work = 0.1 * len(rows) * len(rows[0])  # computed cells
+            else:
+                payload = snap_response(state, profile, body)
+                work = len(points)
+            self._simulate(work)
+            self._send(200, payload)
+
+    return StandinHandler
+
+
+def start_standin_server(port=0, **kwargs):
+    """Start a stand-in server in a background thread; returns (server, base_url)"""
+    state = StandinState(**kwargs)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    server.state = state
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/ors/v2"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the ORS v2 API")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--bbox", help="Coverage as min_lon,min_lat,max_lon,max_lat")
+    parser.add_argument("--base-latency-ms", type=float, default=5.0)
+    parser.add_argument("--work-latency-ms", type=float, default=0.5)
+    parser.add_argument("--knee", type=int, default=4, help="In-flight requests before latency degrades")
+    args = parser.parse_args()
+
+    bbox = [float(v) for v in args.bbox.split(",")] if args.bbox else None
+    server, base_url = start_standin_server(
+        port=args.port, bbox=bbox, base_latency=args.base_latency_ms / 1000,
+        work_latency=args.work_latency_ms / 1000, knee=args.knee
+    )
+    print(f"ORS stand-in listening on {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
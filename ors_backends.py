@@ -0,0 +1,294 @@
+"""Pool of ORS replicas with least-outstanding-requests routing and hedging.
+
+Several ORS containers can serve the same prebuilt graphs (see the replica
+example in docker-compose.yml). The pool health-checks each of them, keeps
+only replicas whose engine and graph build dates agree with the majority,
+sends every request to the replica with the fewest requests in flight and,
+if the request asks for it, hedges a slow request to a second replica once
+it has been outstanding longer than the pool's recent p95 latency.
+
+Once ors_warmup.py has written its state file (ORS_WARMUP_STATE, by
+default ors_warmup_state.json in the temp directory, so a reboot makes
+every replica cold again), a replica only counts as ready after it has
+been warmed up against its current graph build; cold replicas are used
+only when no warm one is available.
+"""
+import collections
+import concurrent.futures
+import json
+import os
+import tempfile
+import threading
+import time
+
+import requests
+
+HEALTH_INTERVAL = 30  # seconds between active health checks
+LATENCY_SAMPLES = 200  # recent latencies kept per backend
+MIN_HEDGE_DELAY = 0.05  # seconds; never hedge sooner than this
+# Shared by ors_warmup.py (writer) and the pool (reader)
+WARMUP_STATE_FILE = os.environ.get("ORS_WARMUP_STATE") or os.path.join(tempfile.gettempdir(),
+                                                                        "ors_warmup_state.json")
+
+
+def parse_base_urls(base_url):
+    """Split a comma-separated base URL setting into a list of URLs"""
+    if isinstance(base_url, (list, tuple)):
+        urls = base_url
+    else:
+        urls = base_url.split(",")
+    return [u.strip().rstrip("/") for u in urls if u.strip()]
+
+
+class ConnectionFailure(str):
+    """Error message of a request that never reached ORS (refused, reset, connect timeout)
+
+    A plain str for everything that displays errors; the pool takes the
+    replica out of rotation only for these, not for slow answers.
+    """
+
+
+def load_warmup_state(path=WARMUP_STATE_FILE):
+    """base_url -> warm-up record written by ors_warmup.py ({} if none yet)"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("backends", {})
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+class Backend:
+    """One ORS instance and what the pool knows about it"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.outstanding = 0
+        self.healthy = True
+        self.consistent = True
+        self.ready = True
+        self.fingerprint = None
+        self.last_error = None
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+
+    @property
+    def available(self):
+        return self.healthy and self.consistent and self.ready
+
+    def snapshot(self):
+        latencies = sorted(self.latencies)
+        return {
+            "base_url": self.base_url,
+            "available": self.available,
+            "healthy": self.healthy,
+            "consistent": self.consistent,
+            "ready": self.ready,
+            "outstanding": self.outstanding,
+            "p50_ms": round(1000 * latencies[len(latencies) // 2], 1) if latencies else None,
+            "build": " / ".join(self.fingerprint) if self.fingerprint else None,
+            "last_error": self.last_error,
+        }
+
+
+def status_fingerprint(status):
+    """Engine build date/version plus per-profile graph dates from /status"""
+    engine = status.get("engine", {})
+    graph_dates = sorted(
+        str(p.get("graph_build_date") or p.get("creation_date") or "")
+        for p in status.get("profiles", {}).values()
+    )
+    return (str(engine.get("build_date", "")), str(engine.get("version", "")), ",".join(graph_dates))
+
+
+class BackendPool:
+    """Route requests across several ORS base URLs"""
+
+    def __init__(self, base_urls, health_interval=HEALTH_INTERVAL):
+        self.backends = [Backend(url) for url in base_urls]
+        self.health_interval = health_interval
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self._checking = False
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(4, 4 * len(self.backends)), thread_name_prefix="ors-pool"
+        )
+
+    @staticmethod
+    def _probe(backend, timeout):
+        """(healthy, fingerprint, error) of one backend; network only, no pool state"""
+        try:
+            health = requests.get(f"{backend.base_url}/health", timeout=timeout)
+            status = requests.get(f"{backend.base_url}/status", timeout=timeout)
+            if health.status_code == 200 and status.status_code == 200:
+                return True, status_fingerprint(status.json()), None
+            return False, backend.fingerprint, f"health {health.status_code}, status {status.status_code}"
+        except Exception as e:
+            return False, backend.fingerprint, str(e)
+
+    def check_health(self, timeout=5):
+        """Actively probe every backend and re-evaluate build consistency
+
+        The probes run concurrently and without the pool lock, so requests
+        keep being routed on the previous state while they are in flight.
+        """
+        with concurrent.futures.ThreadPoolExecutor(len(self.backends)) as probes:
+            results = list(probes.map(lambda backend: self._probe(backend, timeout), self.backends))
+        # No state file means warm-up is not in use; every replica then counts as ready
+        warm = load_warmup_state() if os.path.exists(WARMUP_STATE_FILE) else None
+
+        with self._lock:
+            for backend, (healthy, fingerprint, error) in zip(self.backends, results):
+                backend.healthy = healthy
+                backend.fingerprint = fingerprint
+                backend.last_error = error
+            # Replicas built from different graphs would give different answers;
+            # only the majority build is eligible for routing
+            fingerprints = collections.Counter(b.fingerprint for b in self.backends if b.healthy)
+            majority = fingerprints.most_common(1)[0][0] if fingerprints else None
+            for backend in self.backends:
+                backend.consistent = backend.fingerprint == majority or not backend.healthy
+            if warm is not None:
+                for backend in self.backends:
+                    record = warm.get(backend.base_url)
+                    backend.ready = bool(record) and backend.fingerprint is not None and \
+                        tuple(record.get("fingerprint") or ()) == backend.fingerprint
+            self._last_check = time.monotonic()
+
+    def _maybe_check_health(self):
+        """Start a health check when one is due; only the first ever check is waited for"""
+        with self._lock:
+            if self._checking or time.monotonic() - self._last_check <= self.health_interval:
+                return
+            self._checking = True
+            first = self._last_check == 0.0
+
+        def run():
+            try:
+                self.check_health()
+            finally:
+                with self._lock:
+                    self._checking = False
+                    self._last_check = max(self._last_check, time.monotonic())
+
+        if first:
+            run()
+        else:
+            threading.Thread(target=run, name="ors-pool-health", daemon=True).start()
+
+    def choose(self, exclude=()):
+        """Available backend with the fewest outstanding requests"""
+        with self._lock:
+            candidates = [b for b in self.backends if b.available and b not in exclude]
+            if not candidates:
+                # A cold replica is slow, but better than no answer
+                candidates = [b for b in self.backends if b.healthy and b.consistent and b not in exclude]
+            if not candidates:
+                return None
+            backend = min(candidates, key=lambda b: (b.outstanding, _median(b.latencies)))
+            backend.outstanding += 1
+            return backend
+
+    def hedge_delay(self):
+        """p95 latency across the pool's recent requests"""
+        latencies = sorted(l for b in self.backends for l in b.latencies)
+        if len(latencies) < 20:
+            return None
+        return max(MIN_HEDGE_DELAY, latencies[int(0.95 * (len(latencies) - 1))])
+
+    def _run(self, backend, call):
+        start = time.monotonic()
+        try:
+            result, error, status_code = call(backend.base_url)
+        except requests.ConnectionError as e:
+            result, error, status_code = None, ConnectionFailure(e), None
+        except Exception as e:
+            result, error, status_code = None, str(e), None
+        with self._lock:
+            backend.outstanding -= 1
+            if isinstance(error, ConnectionFailure):
+                # Passive health check: a connection-level failure takes the
+                # replica out until the next active check. A read timeout
+                # only means a slow query, so the replica stays in.
+                backend.healthy = False
+                backend.last_error = error
+            elif status_code is not None:
+                backend.latencies.append(time.monotonic() - start)
+        return result, error, status_code
+
+    def call(self, call, limiter=None, hedge=False):
+        """Run call(base_url) -> (result, error, status_code) on the best backend
+
+        hedge is per request, as sessions sharing the pool choose it
+        independently; hedging also needs the limiter for a spare slot.
+        """
+        self._maybe_check_health()
+        primary = self.choose()
+        if primary is None:
+            return None, "No healthy ORS backend available", None
+
+        delay = self.hedge_delay() if hedge and limiter is not None else None
+        if delay is None:
+            return self._run(primary, call)
+
+        first = self._executor.submit(self._run, primary, call)
+        try:
+            return first.result(timeout=delay)
+        except concurrent.futures.TimeoutError:
+            pass
+
+        # Only hedge with spare capacity, otherwise hedging amplifies overload
+        token = limiter.try_acquire()
+        secondary = self.choose(exclude=(primary,)) if token is not None else None
+        if secondary is None:
+            if token is not None:
+                limiter.release(token)
+            return first.result()
+
+        with self._lock:
+            self.hedges_sent += 1
+
+        def run_hedge():
+            outcome = None
+            try:
+                outcome = self._run(secondary, call)
+                return outcome
+            finally:
+                status_code = outcome[2] if outcome else None
+                limiter.release(token, status_code=status_code, failed=status_code is None)
+
+        second = self._executor.submit(run_hedge)
+        pending = {first, second}
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                result, error, status_code = future.result()
+                if result is not None or not pending:
+                    if future is second:
+                        with self._lock:
+                            self.hedges_won += 1
+                    return result, error, status_code
+
+    def snapshot(self):
+        """Per-backend state for display"""
+        return [b.snapshot() for b in self.backends]
+
+
+def _median(values):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(base_urls):
+    """Process-wide pool for a set of base URLs, so sessions share outstanding counts"""
+    key = tuple(base_urls)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = BackendPool(base_urls)
+        return _pools[key]
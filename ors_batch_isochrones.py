@@ -0,0 +1,183 @@
+"""Batch isochrones for facility files of any size.
+
+The Isochrones tab takes at most maximum_locations (5) origins. This runner
+takes a facility file with thousands of them and:
+
+- packs facilities into requests of maximum_locations origins, each with
+  every requested range (the planner splits a request further only when
+  there are more ranges than maximum_intervals),
+- runs those requests with bounded concurrency through the shared client
+  (batch priority, so interactive users keep their share),
+- streams each isochrone to a GeoJSON Lines file as soon as its request
+  returns, tagged with the facility id,
+- checkpoints finished requests next to the output, so an interrupted run
+  resumes where it stopped (the output is truncated back to the last
+  checkpointed byte, so no feature is written twice),
+- retries a failed request RETRIES times with exponential backoff,
+- reports throughput in facilities per minute.
+
+Facilities are a CSV with id,lon,lat columns or a GeoJSON FeatureCollection
+of points with an "id" property.
+
+    python ors_batch_isochrones.py facilities.csv --base-url http://localhost:8080/ors/v2 \\
+        --range 600,1200,1800 -o catchments.geojsonl
+"""
+import argparse
+import concurrent.futures
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+
+from ors_client import send_request
+from ors_planner import DEFAULT_ENDPOINT_LIMITS, get_limits, send_planned
+
+WORKERS = 8
+RETRIES = 2
+RETRY_BACKOFF = 0.5  # seconds before the first retry, doubled for each one after
+REPORT_EVERY = 50  # requests between progress lines
+
+
+def load_facilities(path):
+    """[(id, [lon, lat]), ...] from a CSV (id,lon,lat) or a GeoJSON point FeatureCollection"""
+    if path.endswith((".geojson", ".json")):
+        with open(path, encoding="utf-8") as f:
+            collection = json.load(f)
+        return [(str(feature.get("properties", {}).get("id", index)), feature["geometry"]["coordinates"][:2])
+                for index, feature in enumerate(collection["features"])]
+    with open(path, newline="", encoding="utf-8") as f:
+        return [(row["id"], [float(row["lon"]), float(row["lat"])]) for row in csv.DictReader(f)]
+
+
+def plan_batches(facilities, limits):
+    """Facilities in groups of maximum_locations, one request each"""
+    size = limits.get("isochrones", DEFAULT_ENDPOINT_LIMITS["isochrones"])["maximum_locations"]
+    return [facilities[start:start + size] for start in range(0, len(facilities), size)]
+
+
+def load_checkpoint(path):
+    """({done batch indices}, output byte offset) recorded by an earlier run"""
+    done, offset = set(), 0
+    if not os.path.exists(path):
+        return done, offset
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break  # a torn last line from a crash; everything before it stands
+            done.add(entry["batch"])
+            offset = max(offset, entry["offset"])
+    return done, offset
+
+
+def feature_lines(result, batch):
+    """GeoJSON Lines for one response, each isochrone tagged with its facility"""
+    lines = []
+    for feature in result.get("features", []):
+        properties = dict(feature.get("properties", {}))
+        facility_id, _ = batch[properties.get("group_index", 0)]
+        properties["facility_id"] = facility_id
+        lines.append(json.dumps({"type": "Feature", "properties": properties, "geometry": feature["geometry"]},
+                                separators=(",", ":")))
+    return lines
+
+
+def run(facilities, send, limits, body, output, checkpoint=None, profile="driving-car", workers=WORKERS,
+        on_progress=None):
+    """Compute every facility's isochrones into output (GeoJSON Lines); returns the run report"""
+    checkpoint = checkpoint or f"{output}.checkpoint"
+    batches = plan_batches(facilities, limits)
+    done, offset = load_checkpoint(checkpoint)
+    pending = [i for i in range(len(batches)) if i not in done]
+    endpoint = f"isochrones/{profile}"
+
+    def fetch(index):
+        request = dict(body, locations=[location for _, location in batches[index]])
+        for attempt in range(RETRIES + 1):
+            if attempt:
+                time.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+            result, error = send_planned(endpoint, request, send, limits)
+            if result is not None or (error or "").startswith("Rejected locally"):
+                return index, result, error
+        return index, result, error
+
+    started = time.monotonic()
+    report = {"facilities": len(facilities), "requests": len(batches), "resumed": len(done),
+              "completed": 0, "failed": [], "features": 0, "facilities_done": 0}
+    # Truncate anything written after the last checkpoint, so a resumed run never duplicates features
+    with open(output, "a+b") as out:
+        out.truncate(offset)
+    with open(output, "ab") as out, open(checkpoint, "a", encoding="utf-8") as log, \
+            concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        # Submit a bounded window so a 100k-facility file does not queue every request at once
+        window = workers * 4
+        queue = iter(pending)
+        running = {pool.submit(fetch, index) for index in itertools.islice(queue, window)}
+        while running:
+            finished, running = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                index, result, error = future.result()
+                if result is None:
+                    report["failed"].append({"batch": index, "facilities": [f for f, _ in batches[index]],
+                                             "error": error})
+                else:
+                    lines = feature_lines(result, batches[index])
+                    out.write("".join(line + "\n" for line in lines).encode("utf-8"))
+                    out.flush()
+                    os.fsync(out.fileno())
+                    log.write(json.dumps({"batch": index, "offset": out.tell()}) + "\n")
+                    log.flush()
+                    report["completed"] += 1
+                    report["facilities_done"] += len(batches[index])
+                    report["features"] += len(lines)
+                for next_index in queue:
+                    running.add(pool.submit(fetch, next_index))
+                    break
+                if on_progress is not None and (report["completed"] + len(report["failed"])) % REPORT_EVERY == 0:
+                    on_progress(_throughput(report, started))
+    return _throughput(report, started)
+
+
+def _throughput(report, started):
+    elapsed = time.monotonic() - started
+    return dict(report, elapsed_s=round(elapsed, 1),
+                facilities_per_minute=round(report["facilities_done"] / elapsed * 60, 1) if elapsed > 0 else None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Isochrones for every facility in a file, resumable")
+    parser.add_argument("facilities", help="CSV with id,lon,lat or GeoJSON points with an id property")
+    parser.add_argument("--base-url", required=True)
+    parser.add_argument("--profile", default="driving-car")
+    parser.add_argument("--range", required=True, help="Comma-separated ranges, e.g. 600,1200,1800")
+    parser.add_argument("--range-type", choices=("time", "distance"), default="time")
+    parser.add_argument("--attributes", default="", help="Comma-separated, e.g. area,reachfactor")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("-o", "--output", required=True, help="GeoJSON Lines output")
+    parser.add_argument("--checkpoint", help="Defaults to <output>.checkpoint")
+    args = parser.parse_args(argv)
+
+    def send(endpoint, data):
+        return send_request(args.base_url, endpoint, data=data, method="POST", priority="batch")
+
+    body = {"range": [int(v) for v in args.range.split(",")], "range_type": args.range_type}
+    if args.attributes:
+        body["attributes"] = args.attributes.split(",")
+    facilities = load_facilities(args.facilities)
+    report = run(facilities, send, get_limits(args.base_url), body, args.output, args.checkpoint,
+                 args.profile, args.workers,
+                 on_progress=lambda r: print(f"  {r['completed'] + r['resumed']}/{r['requests']} requests, "
+                                             f"{r['facilities_per_minute']} facilities/min", file=sys.stderr))
+    print(f"{report['completed']} requests done ({report['resumed']} resumed from checkpoint), "
+          f"{len(report['failed'])} failed, {report['features']} isochrones in {report['elapsed_s']}s: "
+          f"{report['facilities_per_minute']} facilities/min -> {args.output}")
+    if report["failed"]:
+        print(json.dumps(report["failed"][:10], indent=2), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
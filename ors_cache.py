@@ -0,0 +1,125 @@
+"""Shared result cache for ORS responses.
+
+With ORS_CACHE_FILE set, successful directions/isochrones/matrix/snap
+responses are stored as raw bodies in that SQLite file, keyed by backend,
+endpoint and canonical request, so every app process and batch tool on the host
+shares them and a repeated query skips the queue and the JVM entirely.
+
+ORS answers only change when the graphs are rebuilt, so the cache records
+the graph fingerprint it was filled against (ors_backends.status_fingerprint)
+and is cleared when ors_warmup.py sees a different one. Entries also expire
+after ORS_CACHE_TTL seconds (default one day).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from ors_parsing import json_default
+
+CACHEABLE = ("directions", "isochrones", "matrix", "snap")
+CACHE_TTL = float(os.environ.get("ORS_CACHE_TTL", 86400))
+MAX_ENTRY_BYTES = 16 * 1024 * 1024  # larger answers are not worth a disk round-trip
+
+
+def cacheable(endpoint):
+    return endpoint.split("/")[0] in CACHEABLE
+
+
+def cache_key(endpoint, method, params=None, data=None, base_url=None):
+    """Stable key for a request: same backend, endpoint and body, same key
+
+    base_url keeps answers of different ORS instances (other regions or
+    graph builds) apart; replicas of a pool share the pool's URL list.
+    """
+    request = {"base_url": base_url, "endpoint": endpoint, "method": method, "params": params, "data": data}
+    canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), default=json_default)
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+class ResultCache:
+    """SQLite-backed map of request key -> response body"""
+
+    def __init__(self, path, ttl=CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # WAL lets other processes read while one writes
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS responses ("
+                         "key TEXT PRIMARY KEY, endpoint TEXT, stored REAL, content BLOB)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT stored, content FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or time.time() - row[0] > self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[1]
+
+    def put(self, key, endpoint, content):
+        if len(content) > MAX_ENTRY_BYTES:
+            return
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                             (key, endpoint, time.time(), sqlite3.Binary(content)))
+            self._db.commit()
+
+    def fingerprint(self):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE name = 'fingerprint'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_fingerprint(self, fingerprint):
+        """Record the graph build the cache is filled against; clears it if that changed"""
+        fingerprint = list(fingerprint) if fingerprint else None
+        changed = self.fingerprint() != fingerprint
+        with self._lock:
+            if changed:
+                self._db.execute("DELETE FROM responses")
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)", (json.dumps(fingerprint),))
+            self._db.commit()
+        return changed
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(content)), 0) "
+                                             "FROM responses").fetchone()
+        return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_cache = None
+_cache_path = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Cache at ORS_CACHE_FILE, or None when caching is off"""
+    global _cache, _cache_path
+    path = os.environ.get("ORS_CACHE_FILE")
+    if not path:
+        return None
+    with _cache_lock:
+        if _cache is None or _cache_path != path:
+            if _cache is not None:
+                _cache.close()
+            _cache = ResultCache(path)
+            _cache_path = path
+        return _cache
@@ -0,0 +1,177 @@
+"""HTTP client for the ORS backend, shared by the Streamlit app and batch tools.
+
+Every upstream call goes through send_request(), which returns the same
+(result, error) pair the app has always used. Requests are queued by the
+process-wide scheduler (priority class + session fairness) and admitted by
+the adaptive concurrency limiter behind it. A comma-separated base URL
+spreads requests over a pool of replicas (see ors_backends.py), and a
+region dispatcher (see ors_regions.py) can pick the base URL per request.
+With ORS_RECORD_FILE set, every upstream call is also appended to a traffic
+log that ors_recorder.py can replay. Each call is timed phase by phase
+(see ors_slowlog.py) and slow ones go to the slow-query log. With
+ORS_CACHE_FILE set, answers are looked up in and stored to the shared
+result cache (see ors_cache.py) before anything is queued.
+"""
+import os
+import threading
+import time
+
+import requests
+import urllib3
+
+from ors_backends import ConnectionFailure, get_pool, parse_base_urls
+from ors_cache import cache_key, cacheable, get_cache
+from ors_parsing import parse_response
+from ors_recorder import get_recorder
+from ors_regions import get_dispatcher
+from ors_scheduler import get_scheduler
+from ors_slowlog import RequestTrace, get_slow_log
+
+DEFAULT_TIMEOUT = 120  # seconds; long isochrones and matrices can take a while
+QUEUE_TIMEOUT = 300  # seconds a request may wait for a free slot
+HEDGE_REQUESTS = os.environ.get("ORS_CLIENT_HEDGE", "false").lower() in ("1", "true", "yes")
+
+_timing = threading.local()
+
+
+class _TimedConnectionMixin:
+    """Adds the time spent opening each new connection to the calling thread's counter"""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _timing.connect = getattr(_timing, "connect", 0.0) + time.perf_counter() - start
+
+
+# Keep urllib3's class names so connection errors read the same as before
+_TimedHTTPConnectionPool = type("HTTPConnectionPool", (urllib3.HTTPConnectionPool,), {
+    "ConnectionCls": type("HTTPConnection", (_TimedConnectionMixin, urllib3.connection.HTTPConnection), {})
+})
+_TimedHTTPSConnectionPool = type("HTTPSConnectionPool", (urllib3.HTTPSConnectionPool,), {
+    "ConnectionCls": type("HTTPSConnection", (_TimedConnectionMixin, urllib3.connection.HTTPSConnection), {})
+})
+
+
+class _TimedAdapter(requests.adapters.HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool, "https": _TimedHTTPSConnectionPool
+        }
+
+
+_session = requests.Session()
+_session.mount("http://", _TimedAdapter())
+_session.mount("https://", _TimedAdapter())
+
+
+def _call(base_url, endpoint, params, data, method, timeout, arrays=False, trace=None, key=None):
+    """One HTTP round-trip; returns (result, error, status_code)
+
+    With a cache key, a 200 body is stored in the shared result cache.
+    """
+    url = f"{base_url}/{endpoint}"
+    headers = {"Content-Type": "application/json"}
+    recorder = get_recorder()
+    started = time.time()
+    content = latency = None
+    phases = {}
+    _timing.connect = 0.0
+    sent = time.perf_counter()
+    try:
+        # stream=True returns once the headers are in, which splits server time from download
+        if method == "GET":
+            response = _session.get(url, params=params, headers=headers, timeout=timeout, stream=True)
+        else:
+            response = _session.post(url, json=data, headers=headers, timeout=timeout, stream=True)
+        headers_in = time.perf_counter()
+        content = response.content
+        body_in = time.perf_counter()
+        latency = time.time() - started
+        phases["connect"] = _timing.connect
+        phases["ttfb"] = headers_in - sent - _timing.connect
+        phases["transfer"] = body_in - headers_in
+
+        if response.status_code == 200:
+            outcome = parse_response(content, arrays=arrays), None, response.status_code
+            cache = get_cache() if key is not None else None
+            if cache is not None:
+                cache.put(key, endpoint, content)
+        else:
+            outcome = None, f"Error {response.status_code}: {response.text}", response.status_code
+        phases["parse"] = time.perf_counter() - body_in
+    except Exception as e:
+        # Refused, reset or connect timeout before any answer: the backend pool evicts on these
+        # only (a body read timeout also surfaces as ConnectionError, but after the headers)
+        connection_failed = isinstance(e, requests.ConnectionError) and "ttfb" not in phases
+        outcome = None, ConnectionFailure(e) if connection_failed else str(e), None
+        if "ttfb" not in phases:
+            phases["connect"] = _timing.connect
+            phases["ttfb"] = time.perf_counter() - sent - _timing.connect
+    if trace is not None:
+        trace.add_attempt(base_url, phases, outcome[2], outcome[1], None if content is None else len(content))
+    if recorder is not None:
+        # Latency covers the round-trip only, not parsing
+        latency = time.time() - started if latency is None else latency
+        recorder.record(base_url, endpoint, method, params, data, started, latency, outcome[2],
+                        content=content, error=outcome[1],
+                        priority=trace.priority if trace else None, session_id=trace.session_id if trace else None)
+    return outcome
+
+
+def send_request(base_url, endpoint, params=None, data=None, method="GET", timeout=DEFAULT_TIMEOUT,
+                 priority="interactive", session_id=None, hedge=None, dispatcher=None, arrays=False,
+                 traces=None):
+    """Send a request to ORS and return (result, error)
+
+    arrays=True decodes the durations and distances of large matrices into NumPy arrays
+    (see ors_parsing.py) for callers that compute on them.
+
+    The request's RequestTrace goes to the slow-query log right away, unless
+    a traces list is passed: then it is appended there and the caller hands
+    the list to get_slow_log().finish() once the result has been rendered.
+    """
+    scheduler = get_scheduler()
+    dispatcher = dispatcher or get_dispatcher()
+    if dispatcher is not None and endpoint.split("/")[0] in ("directions", "isochrones", "matrix", "snap"):
+        base_url = dispatcher.resolve(endpoint, data).base_url
+    base_urls = parse_base_urls(base_url)
+    if not base_urls:
+        return None, "No ORS base URL configured"
+
+    cache = get_cache() if cacheable(endpoint) else None
+    key = None
+    if cache is not None:
+        key = cache_key(endpoint, method, params, data, ",".join(base_urls))
+        content = cache.get(key)
+        if content is not None:
+            return parse_response(content, arrays=arrays), None
+
+    trace = RequestTrace(endpoint, method, params=params, data=data, priority=priority, session_id=session_id)
+    queued = time.perf_counter()
+    try:
+        token = scheduler.acquire(priority, session_id, timeout=QUEUE_TIMEOUT)
+    except TimeoutError as e:
+        return None, str(e)
+    trace.phases["queue"] = time.perf_counter() - queued
+
+    status_code = None
+    try:
+        if len(base_urls) > 1:
+            result, error, status_code = get_pool(base_urls).call(
+                lambda url: _call(url, endpoint, params, data, method, timeout, arrays, trace, key),
+                limiter=scheduler.limiter, hedge=HEDGE_REQUESTS if hedge is None else hedge
+            )
+        else:
+            result, error, status_code = _call(base_urls[0], endpoint, params, data, method, timeout, arrays, trace,
+                                               key)
+        return result, error
+    finally:
+        # Timeouts and connection errors count as overload signals
+        scheduler.release(token, status_code=status_code, failed=status_code is None)
+        if traces is None:
+            get_slow_log().observe(trace)
+        else:
+            traces.append(trace)
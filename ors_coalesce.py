@@ -0,0 +1,84 @@
+"""Coalescing of near-duplicate coordinates before matrix requests.
+
+Stop lists repeat the same place many times: several orders for one
+building, one shop, one loading dock. Each copy costs a matrix row and a
+column although its travel times are those of its neighbour, so a list
+with 40% repeats pays for almost twice the cells it needs.
+
+coalesce() groups coordinates that lie within `radius` metres of a group's
+first member (leader clustering on a grid, linear in the number of
+points). Only the representatives go upstream; labels maps every original
+point to its representative, which attach_matrices (ors_matrix.py) uses as
+the point's VROOM location index, so repeats share one row and column.
+
+Merging nearby points changes their travel times slightly, so it is opt-in:
+the radius defaults to ORS_COALESCE_RADIUS, which is 0 (only identical
+coordinates are merged) unless set, e.g. to 15 metres.
+"""
+import math
+import os
+
+import numpy as np
+
+from ors_geometry import as_lonlat_array
+
+COALESCE_RADIUS = float(os.environ.get("ORS_COALESCE_RADIUS", 0))  # metres; 0 merges identical points only
+METRES_PER_DEGREE = 111320.0
+
+
+class Coalescing:
+    """Mapping of N original coordinates onto R representatives"""
+
+    def __init__(self, coordinates, labels, leaders, representatives):
+        self.coordinates = coordinates
+        self.labels = labels  # (N,) representative of each original point
+        self.leaders = leaders  # (R,) original index each representative stands for
+        self.representatives = representatives  # (R, 2) coordinates sent upstream
+
+    def __len__(self):
+        return len(self.representatives)
+
+    @property
+    def reduction(self):
+        """Share of rows (and columns) saved"""
+        return 1 - len(self.representatives) / len(self.labels) if len(self.labels) else 0.0
+
+
+def coalesce(coordinates, radius=COALESCE_RADIUS):
+    """Group coordinates within radius metres of their group's first member"""
+    points = as_lonlat_array(coordinates)
+    n = len(points)
+    labels = np.empty(n, dtype=np.int64)
+    leaders = []
+    if radius <= 0:
+        keys = {}
+        for i, (lon, lat) in enumerate(np.round(points, 6)):
+            labels[i] = keys.setdefault((lon, lat), len(keys))
+            if labels[i] == len(leaders):
+                leaders.append(i)
+    else:
+        cell_lat = radius / METRES_PER_DEGREE
+        # Widest cell at the highest latitude present, so neighbouring cells always cover the radius
+        cos_min = max(math.cos(math.radians(float(np.abs(points[:, 1]).max()))), 1e-6) if n else 1.0
+        cell_lon = cell_lat / cos_min
+        cells = {}
+        for i, (lon, lat) in enumerate(points):
+            cx, cy = math.floor(lon / cell_lon), math.floor(lat / cell_lat)
+            best, best_distance = None, radius
+            scale = math.cos(math.radians(lat)) * METRES_PER_DEGREE
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for r in cells.get((cx + dx, cy + dy), ()):
+                        leader_lon, leader_lat = points[leaders[r]]
+                        # Equirectangular distance is exact enough at building scale
+                        distance = math.hypot((lon - leader_lon) * scale, (lat - leader_lat) * METRES_PER_DEGREE)
+                        if distance <= best_distance:
+                            best, best_distance = r, distance
+            if best is None:
+                best = len(leaders)
+                leaders.append(i)
+                cells.setdefault((cx, cy), []).append(best)
+            labels[i] = best
+    leaders = np.array(leaders, dtype=np.int64)
+    return Coalescing(points, labels, leaders, points[leaders] if n else np.empty((0, 2)))
+
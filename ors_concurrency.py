@@ -0,0 +1,155 @@
+"""Adaptive concurrency limiting for requests sent to the ORS backend.
+
+A single ORS JVM (see docker-compose.yml) only sustains a handful of requests
+in flight before garbage collection and thread contention make latency
+collapse. The limiter below learns that number from observed latency and
+overload responses (gradient + AIMD, in the spirit of Netflix's
+concurrency-limits) and queues anything above it.
+"""
+import math
+import os
+import threading
+import time
+
+# Status codes that mean "the backend is overloaded, back off"
+OVERLOAD_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class AdaptiveConcurrencyLimiter:
+    """Gradient/AIMD concurrency limiter shared by all callers in the process"""
+
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=64,
+                 smoothing=0.2, backoff_ratio=0.75, tolerance=1.5,
+                 long_window=600):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.smoothing = smoothing
+        self.backoff_ratio = backoff_ratio
+        self.tolerance = tolerance
+        self.long_window = long_window
+
+        self.in_flight = 0
+        self.queued = 0
+        self.rtt_noload = None  # slowly decaying minimum latency
+        self.rtt_short = None  # EWMA of recent latencies
+        self.samples = 0
+        self.drops = 0
+
+        self._cond = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+        self._left_queue = set()  # tickets that were served or gave up
+
+    def acquire(self, timeout=None):
+        """Wait for a free slot (FIFO) and return a token for release()"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self.queued += 1
+            try:
+                while ticket != self._serving or self.in_flight >= int(self.limit):
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("Timed out waiting for an ORS request slot")
+                    self._cond.wait(remaining)
+            except BaseException:
+                # Give up our place in line without blocking the tickets behind us
+                self._left_queue.add(ticket)
+                self._advance()
+                raise
+            finally:
+                self.queued -= 1
+            self._left_queue.add(ticket)
+            self._advance()
+            self.in_flight += 1
+            self._cond.notify_all()
+            return {"start": time.monotonic(), "in_flight": self.in_flight}
+
+    def try_acquire(self):
+        """Take a slot only if one is free and nobody is queued, else return None"""
+        with self._cond:
+            if self.queued or self.in_flight >= int(self.limit):
+                return None
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self._left_queue.add(ticket)
+            self._advance()
+            self.in_flight += 1
+            return {"start": time.monotonic(), "in_flight": self.in_flight}
+
+    def _advance(self):
+        while self._serving in self._left_queue:
+            self._left_queue.discard(self._serving)
+            self._serving += 1
+        self._cond.notify_all()
+
+    def release(self, token, status_code=None, failed=False):
+        """Return a slot and feed the observed outcome into the limit"""
+        latency = time.monotonic() - token["start"]
+        with self._cond:
+            self.in_flight -= 1
+            if failed or status_code in OVERLOAD_STATUS_CODES:
+                self._on_overload()
+            else:
+                self._on_sample(latency, token["in_flight"])
+            self._cond.notify_all()
+        return latency
+
+    def _on_overload(self):
+        # Multiplicative decrease
+        self.drops += 1
+        self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+
+    def _on_sample(self, latency, in_flight_at_start):
+        self.samples += 1
+        if self.rtt_noload is None:
+            self.rtt_noload = latency
+            self.rtt_short = latency
+            return
+
+        # The no-load RTT creeps back up so a permanently slower backend
+        # (e.g. after a graph reload) does not pin the limit to the floor
+        self.rtt_noload = min(latency, self.rtt_noload + (self.rtt_short - self.rtt_noload) / self.long_window)
+        self.rtt_short += (latency - self.rtt_short) * 0.1
+
+        # Don't grow the limit when callers are not using it
+        if in_flight_at_start < self.limit / 2:
+            return
+
+        gradient = max(0.5, min(1.0, self.tolerance * self.rtt_noload / self.rtt_short))
+        queue_size = math.sqrt(self.limit)
+        new_limit = self.limit * gradient + queue_size
+        new_limit = self.limit * (1 - self.smoothing) + new_limit * self.smoothing
+        self.limit = max(self.min_limit, min(self.max_limit, new_limit))
+
+    def snapshot(self):
+        """Current limiter state for display"""
+        with self._cond:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "rtt_noload_ms": round(self.rtt_noload * 1000, 1) if self.rtt_noload else None,
+                "rtt_short_ms": round(self.rtt_short * 1000, 1) if self.rtt_short else None,
+                "samples": self.samples,
+                "drops": self.drops,
+            }
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """Return the process-wide limiter, configured from the environment"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = AdaptiveConcurrencyLimiter(
+                initial_limit=int(os.environ.get("ORS_CLIENT_INITIAL_CONCURRENCY", 4)),
+                min_limit=int(os.environ.get("ORS_CLIENT_MIN_CONCURRENCY", 1)),
+                max_limit=int(os.environ.get("ORS_CLIENT_MAX_CONCURRENCY", 64)),
+            )
+        return _limiter
@@ -0,0 +1,358 @@
+"""Live dispatch: keep a fleet plan current as jobs arrive and are cancelled.
+
+The VRP form solves a whole problem at once, which is right for planning
+but not for dispatching through the day, when jobs trickle in one at a
+time. DispatchEngine holds the current plan (one ordered list of jobs per
+vehicle) and answers each event on its own:
+
+- a new job is inserted at its cheapest feasible position over all
+  vehicles (extra travel time, with capacity, job time windows and the
+  vehicle's shift respected); its matrix row and column are the only ORS
+  cells fetched (see ors_matrix.py),
+- a cancelled job is taken out of its route, and jobs that were left
+  unassigned get another chance to fit,
+- every reoptimize_every seconds the whole plan is re-solved by
+  /optimization in a background thread on the cached matrix. Jobs that
+  arrived meanwhile are inserted into the new plan, which replaces the
+  current one only if it is cheaper.
+
+Jobs and vehicles use the /optimization (VROOM) fields: id, location,
+amount/delivery/pickup, service, time_windows; id, start, end, capacity,
+time_window. Durations are in seconds.
+
+    python ors_dispatch.py --base-url http://localhost:8080/ors/v2 \\
+        --fleet fleet.json --events events.jsonl
+
+fleet.json is {"vehicles": [...]} and each events line is
+{"op": "add", "job": {...}} or {"op": "cancel", "id": ...}; "-" reads
+events from stdin as they arrive.
+"""
+import argparse
+import copy
+import json
+import math
+import sys
+import threading
+import time
+
+from ors_client import send_request
+from ors_matrix import LocationMatrix
+from ors_planner import get_limits
+
+REOPTIMIZE_INTERVAL = 300  # seconds between background re-solves
+REOPTIMIZE_TIMEOUT = 60  # seconds a background re-solve may take before it is dropped
+
+
+def _amount(job):
+    """Capacity a job uses: its amount, delivery and pickup added up per dimension"""
+    total = []
+    for key in ("amount", "delivery", "pickup"):
+        for i, value in enumerate(job.get(key) or []):
+            if i < len(total):
+                total[i] += value
+            else:
+                total.append(value)
+    return total
+
+
+def _fits(load, amount, capacity):
+    if capacity is None:
+        return True
+    return all((load[i] if i < len(load) else 0) + (amount[i] if i < len(amount) else 0) <= limit
+               for i, limit in enumerate(capacity))
+
+
+def _add(load, amount):
+    size = max(len(load), len(amount))
+    return [(load[i] if i < len(load) else 0) + (amount[i] if i < len(amount) else 0) for i in range(size)]
+
+
+class DispatchEngine:
+    """Current fleet plan with cheapest-insertion updates and background re-solves"""
+
+    def __init__(self, vehicles, send, limits=None, profile="driving-car",
+                 reoptimize_every=REOPTIMIZE_INTERVAL):
+        self.vehicles = {vehicle["id"]: dict(vehicle) for vehicle in vehicles}
+        self.send = send
+        self.limits = limits
+        self.matrix = LocationMatrix(profile)
+        self.reoptimize_every = reoptimize_every
+        self.jobs = {}
+        self.routes = {vehicle_id: [] for vehicle_id in self.vehicles}
+        self.unassigned = []
+        self.version = 0  # bumped on every change, so a re-solve can tell what happened meanwhile
+        self.reoptimizations = {"runs": 0, "adopted": 0, "failed": 0}
+        self._rows = {}
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()  # one matrix update at a time, fetched outside _lock
+        self._solving = None
+        self._last_solve = time.monotonic()
+
+    # --- matrix ---------------------------------------------------------
+
+    def _slots(self):
+        slots = []
+        for vehicle_id, vehicle in self.vehicles.items():
+            for end in ("start", "end"):
+                if vehicle.get(end) is not None:
+                    slots.append(((end, vehicle_id), vehicle[end]))
+        slots.extend((("job", job_id), job["location"]) for job_id, job in self.jobs.items())
+        return slots
+
+    def _updated_matrix(self, matrix, slots):
+        """A copy of matrix brought in line with slots; returns (matrix, error)
+
+        Works on a copy so that the plan keeps answering from its own matrix
+        while new rows are fetched; _use_matrix swaps the result in.
+        """
+        matrix = copy.copy(matrix)
+        error = matrix.update([location for _, location in slots], self.send, self.limits)
+        return (None, error) if error else (matrix, None)
+
+    def _use_matrix(self, matrix, slots):
+        self.matrix = matrix
+        self._rows = {key: row for row, (key, _) in enumerate(slots)}
+
+    def _duration(self, a, b):
+        """Travel seconds between two matrix rows; None (a vehicle without start or end) costs nothing"""
+        if a is None or b is None:
+            return 0.0
+        value = self.matrix["duration"][a, b]
+        return math.inf if math.isnan(value) else float(value)
+
+    # --- routes ---------------------------------------------------------
+
+    def _route_rows(self, vehicle_id, job_ids):
+        return (self._rows.get(("start", vehicle_id)), [self._rows[("job", j)] for j in job_ids],
+                self._rows.get(("end", vehicle_id)))
+
+    def _schedule(self, vehicle_id, job_ids):
+        """(travel seconds, feasible) of a vehicle serving job_ids in order"""
+        vehicle = self.vehicles[vehicle_id]
+        shift = vehicle.get("time_window") or [0, math.inf]
+        start, rows, end = self._route_rows(vehicle_id, job_ids)
+        clock = shift[0]
+        travel = 0.0
+        previous = start
+        for job_id, row in zip(job_ids, rows):
+            leg = self._duration(previous, row)
+            travel += leg
+            clock += leg
+            job = self.jobs[job_id]
+            windows = job.get("time_windows") or [[0, math.inf]]
+            window = next((w for w in windows if clock <= w[1]), None)
+            if window is None:
+                return travel, False
+            clock = max(clock, window[0]) + job.get("service", 0)
+            previous = row
+        leg = self._duration(previous, end)
+        return travel + leg, clock + leg <= shift[1]
+
+    def _load(self, job_ids):
+        load = []
+        for job_id in job_ids:
+            load = _add(load, _amount(self.jobs[job_id]))
+        return load
+
+    def _insertion(self, job_id):
+        """Cheapest feasible (added seconds, vehicle, position) for a job, or None"""
+        row = self._rows[("job", job_id)]
+        amount = _amount(self.jobs[job_id])
+        candidates = []
+        for vehicle_id, route in self.routes.items():
+            if not _fits(self._load(route), amount, self.vehicles[vehicle_id].get("capacity")):
+                continue
+            start, rows, end = self._route_rows(vehicle_id, route)
+            stops = [start] + rows + [end]
+            for position in range(len(route) + 1):
+                before, after = stops[position], stops[position + 1]
+                added = (self._duration(before, row) + self._duration(row, after)
+                         - self._duration(before, after))
+                if math.isfinite(added):
+                    candidates.append((added, vehicle_id, position))
+        # Cheapest first; the schedule check is the expensive part and usually passes early
+        for added, vehicle_id, position in sorted(candidates, key=lambda c: c[0]):
+            route = self.routes[vehicle_id]
+            if self._schedule(vehicle_id, route[:position] + [job_id] + route[position:])[1]:
+                return added, vehicle_id, position
+        return None
+
+    def _place(self, job_id):
+        best = self._insertion(job_id)
+        if best is None:
+            self.unassigned.append(job_id)
+            return None
+        added, vehicle_id, position = best
+        self.routes[vehicle_id].insert(position, job_id)
+        return best
+
+    # --- events ---------------------------------------------------------
+
+    def add_job(self, job):
+        """Insert an arriving job; returns where it went and how long that took"""
+        started = time.perf_counter()
+        with self._sync_lock:
+            with self._lock:
+                if job["id"] in self.jobs:
+                    return {"job": job["id"], "error": "Job id already in the plan"}
+                slots = self._slots() + [(("job", job["id"]), job["location"])]
+                matrix = self.matrix
+            # The /matrix round-trip runs without the lock, so plan() and cost() stay responsive
+            matrix, error = self._updated_matrix(matrix, slots)
+            if error:
+                return {"job": job["id"], "error": error}
+            with self._lock:
+                # Jobs cancelled meanwhile keep a row until the next update; nothing refers to it
+                self._use_matrix(matrix, slots)
+                self.jobs[job["id"]] = dict(job)
+                self.version += 1
+                best = self._place(job["id"])
+                outcome = {"job": job["id"], "vehicle": None, "position": None, "added_s": None,
+                           "cells": matrix.last_cells}
+                if best is not None:
+                    outcome.update(added_s=round(best[0], 1), vehicle=best[1], position=best[2])
+        outcome["ms"] = round((time.perf_counter() - started) * 1000, 1)
+        self.maybe_reoptimize()
+        return outcome
+
+    def cancel_job(self, job_id):
+        """Take a job out of the plan and retry the unassigned ones"""
+        started = time.perf_counter()
+        with self._lock:
+            if job_id not in self.jobs:
+                return {"job": job_id, "error": "Unknown job id"}
+            vehicle = next((v for v, route in self.routes.items() if job_id in route), None)
+            if vehicle is not None:
+                self.routes[vehicle].remove(job_id)
+            else:
+                self.unassigned.remove(job_id)
+            del self.jobs[job_id]
+            slots = self._slots()
+            matrix, error = self._updated_matrix(self.matrix, slots)  # only drops rows, nothing to fetch
+            if matrix is not None:
+                self._use_matrix(matrix, slots)
+            self.version += 1
+            retry, self.unassigned = self.unassigned, []
+            placed = [j for j in retry if self._place(j) is not None]
+        return {"job": job_id, "vehicle": vehicle, "reassigned": placed,
+                "ms": round((time.perf_counter() - started) * 1000, 1)}
+
+    def plan(self):
+        """Current routes with their travel time, plus the unassigned jobs"""
+        with self._lock:
+            routes = []
+            for vehicle_id, route in self.routes.items():
+                travel, feasible = self._schedule(vehicle_id, route)
+                routes.append({"vehicle": vehicle_id, "jobs": list(route), "duration": round(travel, 1),
+                               "load": self._load(route), "feasible": feasible})
+            return {"routes": routes, "unassigned": list(self.unassigned),
+                    "duration": round(sum(r["duration"] for r in routes), 1), "version": self.version}
+
+    def cost(self):
+        with self._lock:
+            return self._cost_of(self.routes)
+
+    def _cost_of(self, routes):
+        return sum(self._schedule(vehicle_id, route)[0] for vehicle_id, route in routes.items())
+
+    # --- background re-optimization -------------------------------------
+
+    def maybe_reoptimize(self):
+        """Start a background re-solve if the interval has passed and none is running"""
+        if self.reoptimize_every is None or time.monotonic() - self._last_solve < self.reoptimize_every:
+            return False
+        if self._solving is not None and self._solving.is_alive():
+            return False
+        self._last_solve = time.monotonic()
+        self._solving = threading.Thread(target=self.reoptimize, name="dispatch-reoptimize", daemon=True)
+        self._solving.start()
+        return True
+
+    def _problem(self):
+        """/optimization body for the active jobs on the cached matrix"""
+        jobs = [dict(job, location_index=self._rows[("job", job_id)]) for job_id, job in self.jobs.items()]
+        vehicles = []
+        for vehicle_id, vehicle in self.vehicles.items():
+            vehicle = dict(vehicle, profile=self.matrix.profile)
+            for end in ("start", "end"):
+                if (end, vehicle_id) in self._rows:
+                    vehicle[f"{end}_index"] = self._rows[(end, vehicle_id)]
+            vehicles.append(vehicle)
+        return {"jobs": jobs, "vehicles": vehicles, "matrices": self.matrix.vroom_matrices()}
+
+    def reoptimize(self):
+        """Re-solve the plan with /optimization; adopts the answer if it is cheaper"""
+        with self._lock:
+            if not self.jobs or not self.matrix.complete:
+                return False
+            body = self._problem()
+            self.reoptimizations["runs"] += 1
+        result, error = self.send("optimization", body)
+        if result is None:
+            with self._lock:
+                self.reoptimizations["failed"] += 1
+            return False
+
+        with self._lock:
+            routes = {vehicle_id: [] for vehicle_id in self.vehicles}
+            for route in result.get("routes", []):
+                routes[route["vehicle"]] = [step["id"] for step in route.get("steps", [])
+                                            if step.get("type") == "job" and step["id"] in self.jobs]
+            current = (self.routes, self.unassigned)
+            self.routes = routes
+            self.unassigned = []
+            # Jobs that arrived during the solve, or that it left out, are inserted as usual
+            planned = {job_id for route in routes.values() for job_id in route}
+            for job_id in self.jobs:
+                if job_id not in planned:
+                    self._place(job_id)
+            feasible = all(self._schedule(v, route)[1] for v, route in self.routes.items())
+            better = (len(self.unassigned), self._cost_of(self.routes)) < (len(current[1]), self._cost_of(current[0]))
+            if not (feasible and better):
+                self.routes, self.unassigned = current
+                return False
+            self.version += 1
+            self.reoptimizations["adopted"] += 1
+            return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dispatch a stream of jobs onto a fleet as they arrive")
+    parser.add_argument("--base-url", required=True)
+    parser.add_argument("--fleet", required=True, help='JSON file with {"vehicles": [...]}')
+    parser.add_argument("--events", default="-", help="JSONL of add/cancel events, - for stdin")
+    parser.add_argument("--profile", default="driving-car")
+    parser.add_argument("--reoptimize-every", type=float, default=REOPTIMIZE_INTERVAL,
+                        help="Seconds between background re-solves (0 to disable)")
+    args = parser.parse_args(argv)
+
+    def send(endpoint, body, arrays=False):
+        timeout = REOPTIMIZE_TIMEOUT if endpoint == "optimization" else 30
+        return send_request(args.base_url, endpoint, data=body, method="POST", timeout=timeout,
+                            priority="batch" if endpoint == "optimization" else "interactive", arrays=arrays)
+
+    with open(args.fleet, encoding="utf-8") as f:
+        vehicles = json.load(f)["vehicles"]
+    engine = DispatchEngine(vehicles, send, get_limits(args.base_url), args.profile,
+                            reoptimize_every=args.reoptimize_every or None)
+
+    events = sys.stdin if args.events == "-" else open(args.events, encoding="utf-8")
+    with events:
+        for line in events:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if event["op"] == "add":
+                outcome = engine.add_job(event["job"])
+            elif event["op"] == "cancel":
+                outcome = engine.cancel_job(event["id"])
+            else:
+                outcome = {"error": f"Unknown op {event['op']!r}"}
+            print(json.dumps(dict(outcome, op=event["op"])), flush=True)
+
+    plan = engine.plan()
+    print(json.dumps(dict(plan, reoptimizations=engine.reoptimizations), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+"""Export of ORS results to GeoParquet, FlatGeobuf and Arrow IPC.
+
+Rows are produced straight from stored responses (NumPy coordinate arrays
+or encoded polylines) into Arrow record batches with ISO WKB geometry, and
+written one row group at a time, so exporting 100k routes never builds a
+GeoJSON string or holds more than one row group of rows.
+
+    with ExportWriter("routes.parquet", "directions") as writer:
+        for result in results:
+            writer.write(result)
+
+FlatGeobuf is written through pyogrio (GDAL >= 3.8), which is optional;
+row groups are spilled to a temporary Arrow IPC file and streamed into
+GDAL on close. pyarrow itself ships with Streamlit.
+
+    python ors_export.py responses.jsonl --kind matrix --format geoparquet -o matrix.parquet
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from ors_geometry import decode_polyline
+from ors_results import normalize_routes, route_parts
+
+KINDS = ("directions", "isochrones", "snap", "matrix")
+FORMATS = {
+    # format: (file extension, mime type)
+    "geoparquet": (".parquet", "application/vnd.apache.parquet"),
+    "flatgeobuf": (".fgb", "application/octet-stream"),
+    "arrow": (".arrow", "application/vnd.apache.arrow.file"),
+}
+ROW_GROUP_SIZE = 10000
+GEOMETRY_TYPES = {
+    "directions": ["LineString", "LineString Z"],
+    "isochrones": ["Polygon"],
+    "snap": ["Point"],
+    "matrix": ["LineString"],
+}
+# Arrow field metadata so GeoArrow-aware readers (GeoPandas, DuckDB) see geometry
+GEOMETRY_FIELD = pa.field("geometry", pa.binary(), metadata={
+    "ARROW:extension:name": "geoarrow.wkb",
+    "ARROW:extension:metadata": json.dumps({"crs": "OGC:CRS84"}),
+})
+SCHEMAS = {
+    "directions": pa.schema([
+        ("request_id", pa.int64()), ("route_index", pa.int32()),
+        ("distance", pa.float64()), ("duration", pa.float64()),
+        ("ascent", pa.float64()), ("descent", pa.float64()),
+        ("segments", pa.int32()), GEOMETRY_FIELD,
+    ]),
+    "isochrones": pa.schema([
+        ("request_id", pa.int64()), ("group_index", pa.int32()), ("value", pa.float64()),
+        ("center_lon", pa.float64()), ("center_lat", pa.float64()),
+        ("area", pa.float64()), ("reachfactor", pa.float64()), ("total_pop", pa.float64()),
+        GEOMETRY_FIELD,
+    ]),
+    "snap": pa.schema([
+        ("request_id", pa.int64()), ("location_index", pa.int32()),
+        ("name", pa.string()), ("snapped_distance", pa.float64()), GEOMETRY_FIELD,
+    ]),
+    "matrix": pa.schema([
+        ("request_id", pa.int64()), ("source", pa.int32()), ("destination", pa.int32()),
+        ("duration", pa.float64()), ("distance", pa.float64()), GEOMETRY_FIELD,
+    ]),
+}
+
+# Fixed-size WKB records built in one go with NumPy
+_WKB_POINT = np.dtype([("order", "u1"), ("type", "<u4"), ("xy", "<f8", (2,))])
+_WKB_SEGMENT = np.dtype([("order", "u1"), ("type", "<u4"), ("count", "<u4"), ("xy", "<f8", (4,))])
+
+
+def wkb_linestring(coordinates):
+    """ISO WKB of a [[lon, lat(, ele)], ...] line"""
+    coordinates = np.asarray(coordinates, dtype="<f8")
+    geometry_type = 1002 if coordinates.shape[1] == 3 else 2
+    return struct.pack("<BII", 1, geometry_type, len(coordinates)) + coordinates.tobytes()
+
+
+def wkb_polygon(rings):
+    """ISO WKB of a polygon given as a list of [lon, lat] rings"""
+    parts = [struct.pack("<BII", 1, 3, len(rings))]
+    for ring in rings:
+        ring = np.asarray(ring, dtype="<f8")[:, :2]
+        parts.append(struct.pack("<I", len(ring)))
+        parts.append(np.ascontiguousarray(ring).tobytes())
+    return b"".join(parts)
+
+
+def _fixed_wkb_array(records):
+    """Binary Arrow array over a NumPy array of equal-size WKB records"""
+    size = records.dtype.itemsize
+    offsets = np.arange(len(records) + 1, dtype=np.int32) * size
+    return pa.Array.from_buffers(pa.binary(), len(records),
+                                 [None, pa.py_buffer(offsets), pa.py_buffer(records.tobytes())])
+
+
+def wkb_segments(starts, ends):
+    """WKB array of two-point lines between matching rows of two (n, 2) arrays"""
+    records = np.empty(len(starts), dtype=_WKB_SEGMENT)
+    records["order"] = 1
+    records["type"] = 2
+    records["count"] = 2
+    records["xy"][:, :2] = starts
+    records["xy"][:, 2:] = ends
+    return _fixed_wkb_array(records)
+
+
+def _route_coordinates(geometry, elevation):
+    """[lon, lat(, ele)] coordinates of a GeoJSON geometry or encoded polyline"""
+    if isinstance(geometry, str):
+        latlons = np.asarray(decode_polyline(geometry, elevation=elevation), dtype=float)
+        if not len(latlons):
+            return None
+        return np.column_stack([latlons[:, 1], latlons[:, 0], latlons[:, 2:]])
+    if isinstance(geometry, dict) and len(geometry.get("coordinates", [])):
+        return np.asarray(geometry["coordinates"], dtype=float)
+    return None
+
+
+def directions_batches(result, request_id=0, elevation=False):
+    routes, _ = normalize_routes(result)
+    columns = {name: [] for name in SCHEMAS["directions"].names}
+    for index, route in enumerate(routes):
+        summary, segments, geometry = route_parts(route)
+        coordinates = _route_coordinates(geometry, elevation)
+        columns["request_id"].append(request_id)
+        columns["route_index"].append(index)
+        columns["distance"].append(summary.get("distance"))
+        columns["duration"].append(summary.get("duration"))
+        columns["ascent"].append(summary.get("ascent"))
+        columns["descent"].append(summary.get("descent"))
+        columns["segments"].append(len(segments))
+        columns["geometry"].append(None if coordinates is None else wkb_linestring(coordinates))
+    yield pa.RecordBatch.from_pydict(columns, schema=SCHEMAS["directions"])
+
+
+def isochrones_batches(result, request_id=0):
+    columns = {name: [] for name in SCHEMAS["isochrones"].names}
+    for feature in result.get("features", []):
+        props = feature.get("properties", {})
+        center = props.get("center") or [None, None]
+        columns["request_id"].append(request_id)
+        columns["group_index"].append(props.get("group_index", 0))
+        columns["value"].append(props.get("value"))
+        columns["center_lon"].append(center[0])
+        columns["center_lat"].append(center[1])
+        for key in ("area", "reachfactor", "total_pop"):
+            columns[key].append(props.get(key))
+        columns["geometry"].append(wkb_polygon(feature["geometry"]["coordinates"]))
+    yield pa.RecordBatch.from_pydict(columns, schema=SCHEMAS["isochrones"])
+
+
+def snap_batches(result, request_id=0):
+    columns = {name: [] for name in SCHEMAS["snap"].names}
+    for index, location in enumerate(result.get("locations", [])):
+        columns["request_id"].append(request_id)
+        columns["location_index"].append(index)
+        # Unsnappable locations come back as null and keep their row
+        location = location or {}
+        columns["name"].append(location.get("name"))
+        columns["snapped_distance"].append(location.get("snapped_distance"))
+        point = location.get("location")
+        columns["geometry"].append(None if point is None else struct.pack("<BIdd", 1, 1, point[0], point[1]))
+    yield pa.RecordBatch.from_pydict(columns, schema=SCHEMAS["snap"])
+
+
+def matrix_batches(result, request_id=0, chunk_rows=ROW_GROUP_SIZE):
+    """Long-format cells, geometry the source-destination line, built row-block by row-block"""
+    durations = result.get("durations")
+    distances = result.get("distances")
+    reference = durations if durations is not None else distances
+    if reference is None:
+        return
+    reference = np.asarray(reference, dtype=float)
+    n_sources, n_destinations = reference.shape
+    sources = np.array([s["location"] for s in result.get("sources", [])], dtype=float).reshape(-1, 2)
+    destinations = np.array([d["location"] for d in result.get("destinations", [])], dtype=float).reshape(-1, 2)
+    block = max(1, chunk_rows // max(n_destinations, 1))
+    for first in range(0, n_sources, block):
+        rows = np.arange(first, min(first + block, n_sources))
+        source_index = np.repeat(rows, n_destinations)
+        destination_index = np.tile(np.arange(n_destinations), len(rows))
+        arrays = [
+            pa.array(np.full(len(source_index), request_id, dtype=np.int64)),
+            pa.array(source_index.astype(np.int32)),
+            pa.array(destination_index.astype(np.int32)),
+        ]
+        for values in (durations, distances):
+            if values is None:
+                arrays.append(pa.nulls(len(source_index), pa.float64()))
+            else:
+                # NaN marks unreachable cells from the array parser; export those as null
+                cells = np.asarray(values, dtype=float)[rows].ravel()
+                arrays.append(pa.array(cells, mask=np.isnan(cells)))
+        if len(sources) == n_sources and len(destinations) == n_destinations:
+            arrays.append(wkb_segments(sources[source_index], destinations[destination_index]))
+        else:
+            arrays.append(pa.nulls(len(source_index), pa.binary()))
+        yield pa.RecordBatch.from_arrays(arrays, schema=SCHEMAS["matrix"])
+
+
+BATCH_BUILDERS = {
+    "directions": directions_batches,
+    "isochrones": isochrones_batches,
+    "snap": snap_batches,
+    "matrix": matrix_batches,
+}
+
+
+def geo_metadata(kind, bbox=None):
+    """GeoParquet 1.0 'geo' file metadata for one of the export schemas"""
+    column = {"encoding": "WKB", "geometry_types": GEOMETRY_TYPES[kind]}
+    if bbox is not None:
+        column["bbox"] = bbox
+    return {"version": "1.0.0", "primary_column": "geometry", "columns": {"geometry": column}}
+
+
+def _wkb_bbox(geometry):
+    """[min_lon, min_lat, max_lon, max_lat] over a WKB column, None if it has no geometry"""
+    valid = geometry.drop_null()
+    if not len(valid):
+        return None
+    offsets = np.frombuffer(valid.buffers()[1], dtype=np.int32)[valid.offset:valid.offset + len(valid) + 1]
+    data = np.frombuffer(valid.buffers()[2], dtype=np.uint8)
+    sizes = np.diff(offsets)
+    for records in (_WKB_POINT, _WKB_SEGMENT):
+        # Points and matrix segments are fixed-size records: read them all at once
+        if (sizes == records.itemsize).all() and data[offsets[0]:offsets[0] + 5].tobytes() in (
+                b"\x01\x01\x00\x00\x00", b"\x01\x02\x00\x00\x00"):
+            xy = data[offsets[0]:offsets[-1]].view(records)["xy"].reshape(-1, 2)
+            mins, maxs = xy.min(axis=0), xy.max(axis=0)
+            return [float(mins[0]), float(mins[1]), float(maxs[0]), float(maxs[1])]
+    mins, maxs = [np.inf, np.inf], [-np.inf, -np.inf]
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        xy = _wkb_xy(data[start:end].tobytes())
+        if len(xy):
+            mins = np.minimum(mins, xy.min(axis=0))
+            maxs = np.maximum(maxs, xy.max(axis=0))
+    return [float(mins[0]), float(mins[1]), float(maxs[0]), float(maxs[1])]
+
+
+def _wkb_xy(wkb):
+    """All x/y pairs of a point, line or polygon written by this module"""
+    geometry_type = struct.unpack_from("<I", wkb, 1)[0]
+    if geometry_type == 1:
+        return np.frombuffer(wkb, dtype="<f8", count=2, offset=5).reshape(1, 2)
+    if geometry_type in (2, 1002):
+        dims = 3 if geometry_type == 1002 else 2
+        count = struct.unpack_from("<I", wkb, 5)[0]
+        return np.frombuffer(wkb, dtype="<f8", count=count * dims, offset=9).reshape(-1, dims)[:, :2]
+    rings = []
+    offset = 9
+    for _ in range(struct.unpack_from("<I", wkb, 5)[0]):
+        count = struct.unpack_from("<I", wkb, offset)[0]
+        rings.append(np.frombuffer(wkb, dtype="<f8", count=count * 2, offset=offset + 4).reshape(-1, 2))
+        offset += 4 + count * 16
+    return np.concatenate(rings) if rings else np.empty((0, 2))
+
+
+class ExportWriter:
+    """Streaming writer of one kind of ORS result to one file or file-like sink"""
+
+    def __init__(self, sink, kind, fmt="geoparquet", row_group_size=ROW_GROUP_SIZE, elevation=False):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown export kind '{kind}', expected one of {', '.join(KINDS)}")
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format '{fmt}', expected one of {', '.join(FORMATS)}")
+        if fmt == "flatgeobuf":
+            # Fail before any work is done rather than on close
+            try:
+                import pyogrio.raw  # noqa: F401
+            except ImportError:
+                raise RuntimeError("FlatGeobuf export needs pyogrio (pip install pyogrio)")
+        self.sink = sink
+        self.kind = kind
+        self.fmt = fmt
+        self.row_group_size = row_group_size
+        self.elevation = elevation
+        self.schema = SCHEMAS[kind]
+        self.rows_written = 0
+        self.next_request_id = 0
+        self._pending = []
+        self._pending_rows = 0
+        self._bbox = None
+        self._spill = None
+        if fmt == "geoparquet":
+            self._writer = pq.ParquetWriter(sink, self.schema.with_metadata(
+                {"geo": json.dumps(geo_metadata(kind))}), compression="zstd")
+        else:
+            if fmt == "flatgeobuf":
+                handle, self._spill = tempfile.mkstemp(suffix=".arrow")
+                os.close(handle)
+                target = self._spill
+            else:
+                target = sink
+            self._writer = pa.ipc.new_file(target, self.schema)
+
+    def write(self, result, request_id=None):
+        """Append the rows of one response; request_id defaults to a running counter"""
+        if request_id is None:
+            request_id = self.next_request_id
+        self.next_request_id = max(self.next_request_id, request_id + 1)
+        builder = BATCH_BUILDERS[self.kind]
+        if self.kind == "directions":
+            batches = builder(result, request_id, elevation=self.elevation)
+        else:
+            batches = builder(result, request_id)
+        for batch in batches:
+            if batch.num_rows:
+                self._pending.append(batch)
+                self._pending_rows += batch.num_rows
+            if self._pending_rows >= self.row_group_size:
+                self.flush()
+
+    def flush(self):
+        """Write buffered rows out as one row group"""
+        if not self._pending:
+            return
+        table = pa.Table.from_batches(self._pending, schema=self.schema)
+        self._pending = []
+        self._pending_rows = 0
+        if self.fmt == "geoparquet":
+            bbox = _wkb_bbox(table.column("geometry").combine_chunks())
+            if bbox is not None:
+                self._bbox = bbox if self._bbox is None else (
+                    [min(self._bbox[0], bbox[0]), min(self._bbox[1], bbox[1]),
+                     max(self._bbox[2], bbox[2]), max(self._bbox[3], bbox[3])])
+            self._writer.write_table(table, row_group_size=self.row_group_size)
+        else:
+            self._writer.write_table(table, max_chunksize=self.row_group_size)
+        self.rows_written += table.num_rows
+
+    def close(self):
+        self.flush()
+        if self.fmt == "geoparquet":
+            # The footer is written last, so the final bbox can still go in
+            self._writer.add_key_value_metadata({"geo": json.dumps(geo_metadata(self.kind, self._bbox))})
+        self._writer.close()
+        if self.fmt == "flatgeobuf":
+            try:
+                self._write_flatgeobuf()
+            finally:
+                os.remove(self._spill)
+
+    def _write_flatgeobuf(self):
+        import pyogrio.raw
+
+        geometry_type = {"directions": "LineString", "isochrones": "Polygon",
+                         "snap": "Point", "matrix": "LineString"}[self.kind]
+        if self.kind == "directions" and self.elevation:
+            geometry_type = "LineString Z"
+        with pa.memory_map(self._spill) as source:
+            reader = pa.ipc.open_file(source)
+            stream = pa.RecordBatchReader.from_batches(
+                self.schema, (reader.get_batch(i) for i in range(reader.num_record_batches)))
+            # The spatial index would need every feature in memory at once
+            options = {"SPATIAL_INDEX": "NO"}
+            if isinstance(self.sink, (str, os.PathLike)):
+                pyogrio.raw.write_arrow(stream, self.sink, driver="FlatGeobuf", geometry_name="geometry",
+                                        geometry_type=geometry_type, crs="EPSG:4326", layer_options=options)
+                return
+            # GDAL writes to paths only; copy into file-like sinks afterwards
+            handle, path = tempfile.mkstemp(suffix=".fgb")
+            os.close(handle)
+            try:
+                pyogrio.raw.write_arrow(stream, path, driver="FlatGeobuf", geometry_name="geometry",
+                                        geometry_type=geometry_type, crs="EPSG:4326", layer_options=options)
+                with open(path, "rb") as f:
+                    shutil.copyfileobj(f, self.sink)
+            finally:
+                os.remove(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def available_formats():
+    """Export formats usable in this environment"""
+    try:
+        import pyogrio.raw  # noqa: F401
+    except ImportError:
+        return [fmt for fmt in FORMATS if fmt != "flatgeobuf"]
+    return list(FORMATS)
+
+
+def export_bytes(kind, results, fmt="geoparquet", elevation=False):
+    """Whole export of a few in-memory results, for download buttons"""
+    buffer = io.BytesIO()
+    with ExportWriter(buffer, kind, fmt, elevation=elevation) as writer:
+        for result in results:
+            writer.write(result)
+    return buffer.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export ORS responses (one JSON per line) to GIS formats")
+    parser.add_argument("responses", help="JSONL file of raw ORS responses, '-' for stdin")
+    parser.add_argument("--kind", choices=KINDS, required=True)
+    parser.add_argument("--format", choices=list(FORMATS), default="geoparquet")
+    parser.add_argument("--elevation", action="store_true", help="directions polylines carry elevation")
+    parser.add_argument("--row-group-size", type=int, default=ROW_GROUP_SIZE)
+    parser.add_argument("-o", "--output", required=True)
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.responses == "-" else open(args.responses)
+    with source, ExportWriter(args.output, args.kind, args.format, args.row_group_size, args.elevation) as writer:
+        for line in source:
+            if line.strip():
+                writer.write(json.loads(line))
+    print(f"Wrote {writer.rows_written} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Geometry helpers shared by the client-side planners and solvers.
+
+Coordinates follow the ORS convention of [lon, lat] pairs.
+"""
+import numpy as np
+
+EARTH_RADIUS = 6371008.8  # metres, mean radius as used by ORS
+
+
+def as_lonlat_array(coordinates):
+    """Coordinates as an (n, 2) float array"""
+    return np.asarray(coordinates, dtype=float).reshape(-1, 2)
+
+
+def haversine(a, b):
+    """Great-circle distance in metres between broadcastable [lon, lat] arrays"""
+    a = np.radians(np.asarray(a, dtype=float))
+    b = np.radians(np.asarray(b, dtype=float))
+    dlon = b[..., 0] - a[..., 0]
+    dlat = b[..., 1] - a[..., 1]
+    h = np.sin(dlat / 2) ** 2 + np.cos(a[..., 1]) * np.cos(b[..., 1]) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+
+def leg_distances(coordinates):
+    """Great-circle length of each consecutive leg of a waypoint list"""
+    points = as_lonlat_array(coordinates)
+    return haversine(points[:-1], points[1:])
+
+
+def haversine_matrix(sources, destinations=None):
+    """All-pairs great-circle distances between two coordinate lists"""
+    sources = as_lonlat_array(sources)
+    destinations = sources if destinations is None else as_lonlat_array(destinations)
+    return haversine(sources[:, None, :], destinations[None, :, :])
+
+
+def decode_polyline(encoded, precision=5, elevation=False):
+    """Decode a Google encoded polyline into [[lat, lon(, ele)], ...] (like polyline.decode)
+
+    ORS appends elevation as a third value scaled by 100 when it was requested.
+    """
+    coordinates = []
+    index = 0
+    factor = 10 ** precision
+    dims = 3 if elevation else 2
+    values = [0] * dims
+    length = len(encoded)
+    while index < length:
+        for axis in range(dims):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            values[axis] += ~(result >> 1) if result & 1 else result >> 1
+        point = [values[0] / factor, values[1] / factor]
+        if elevation:
+            point.append(values[2] / 100)
+        coordinates.append(point)
+    return coordinates
+
+
+def encode_polyline(latlons, precision=5, elevation=False):
+    """Encode [[lat, lon(, ele)], ...] as a Google encoded polyline"""
+    factor = 10 ** precision
+    output = []
+    previous = [0, 0, 0]
+    for point in latlons:
+        current = [int(round(point[0] * factor)), int(round(point[1] * factor))]
+        if elevation:
+            current.append(int(round(point[2] * 100)))
+        for axis, value in enumerate(current):
+            delta = value - previous[axis]
+            delta = ~(delta << 1) if delta < 0 else delta << 1
+            while delta >= 0x20:
+                output.append(chr((0x20 | (delta & 0x1F)) + 63))
+                delta >>= 5
+            output.append(chr(delta + 63))
+            previous[axis] = value
+    return "".join(output)
+
+
+def simplify_line(coordinates, tolerance):
+    """Douglas-Peucker simplification of a [lon, lat(, ...)] line
+
+    tolerance is in coordinate units (degrees); only the first two columns
+    are used for the distance test, other columns are carried along.
+    """
+    points = np.asarray(coordinates, dtype=float)
+    if len(points) < 3:
+        return points
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = points[first, :2], points[last, :2]
+        inner = points[first + 1:last, :2]
+        direction = end - start
+        length = np.hypot(*direction)
+        if length == 0:
+            distances = np.hypot(*(inner - start).T)
+        else:
+            # Perpendicular distance to the chord
+            distances = np.abs(direction[0] * (inner[:, 1] - start[1]) - direction[1] * (inner[:, 0] - start[0])) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return points[keep]
+
+
+def union_bbox(bboxes):
+    """Smallest [min_lon, min_lat, max_lon, max_lat] covering all given bboxes"""
+    bboxes = [b for b in bboxes if b]
+    if not bboxes:
+        return []
+    # 3D bboxes (with elevation) keep their layout
+    half = len(bboxes[0]) // 2
+    mins = [min(b[i] for b in bboxes) for i in range(half)]
+    maxs = [max(b[half + i] for b in bboxes) for i in range(half)]
+    return mins + maxs
@@ -0,0 +1,358 @@
+"""Graph lifecycle: rebuild only what changed, and watch builds as they run.
+
+Building the Java graphs takes 1-3 hours, but they only need rebuilding
+when their inputs change: the PBF, the engine settings shared by all
+profiles (source file, elevation, profile defaults) or the profile's own
+section of ors-config.yml. This tool fingerprints those inputs per profile
+and compares them with the fingerprints the existing graphs were built
+from (a manifest in graphs_root_path):
+
+    prepare   delete the graph folders of profiles whose inputs changed and
+              keep the rest; with REBUILD_GRAPHS=False the container then
+              only builds what is missing, so an unchanged restart is back
+              in minutes
+    status    show the per-profile decision without touching anything
+    monitor   follow ors.log while the container starts: current phase and
+              profile, ETA from previous builds of the same inputs; once
+              the build finishes, record duration and memory per profile
+              in the build history and mark the graphs as current
+    history   past builds per profile, for capacity planning
+
+Only a recorded fingerprint that differs from the current one gets a folder
+deleted. Complete graphs without a record (built before this tool was used,
+or built while monitor was not watching) are adopted as current, and
+incomplete ones are left alone; --force deletes both.
+
+Paths in ors-config.yml are container paths; they are mapped to the host
+through the ./ors-docker:/home/ors mount of docker-compose.yml.
+
+    python ors_graphs.py prepare && docker compose up -d && python ors_graphs.py monitor
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+
+import yaml
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_FILE = os.environ.get("ORS_CONFIG_FILE", os.path.join(BASE_DIR, "ors-docker", "config", "ors-config.yml"))
+HOST_ROOT = os.path.join(BASE_DIR, "ors-docker")
+CONTAINER_ROOT = "/home/ors"
+MANIFEST_NAME = ".graph_fingerprints.json"
+HISTORY_FILE = os.path.join(HOST_ROOT, "graph_builds.jsonl")
+LOG_FILE = os.path.join(HOST_ROOT, "logs", "ors.log")
+GRAPH_COMPLETE_FILE = "properties"  # GraphHopper writes it when the graph has been stored
+HASH_CHUNK = 8 * 1024 * 1024
+MONITOR_INTERVAL = 30  # seconds between progress lines
+
+LOG_LINE = re.compile(r"^(?P<time>\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2})\S*\s+(?P<message>.*)$")
+# ORS 8 RoutingProfileManager messages, in build order
+START = re.compile(r"====> Initializing profiles from '(?P<source>[^']*)'")
+PROFILE = re.compile(r"\[(?P<index>\d+)\] Profiles?: '(?P<profile>[^']+)'.*location: '(?P<location>[^']+)'")
+PROFILE_TIME = re.compile(r"\[(?P<index>\d+)\] Total time: (?P<seconds>[\d.]+)\s*s")
+PHASES = [
+    ("import", re.compile(r"start creating graph from|Start creating graph|creating graph\.", re.I)),
+    ("preparation", re.compile(r"prepar(e|ing|ation)|contraction|landmark", re.I)),
+    ("loading", re.compile(r"loaded graph|Loading graph|graph loaded", re.I)),
+]
+MEMORY_HEADER = re.compile(r"====> Memory usage by profiles")
+PROFILE_MEMORY = re.compile(r"\[(?P<index>\d+)\] (?P<mb>[\d.]+) MB")
+FINISHED = re.compile(r"Total time: (?P<seconds>[\d.]+)\s*s")
+
+
+def host_path(path, host_root=HOST_ROOT, container_root=CONTAINER_ROOT):
+    """Host location of a container path under the ors-docker mount"""
+    if path.startswith(container_root):
+        return os.path.join(host_root, os.path.relpath(path, container_root))
+    return path
+
+
+def load_engine(path=CONFIG_FILE):
+    with open(path) as f:
+        return yaml.safe_load(f)["ors"]["engine"]
+
+
+def file_digest(path, previous=None):
+    """sha256 of a file; reuses the previous digest when size and mtime are unchanged"""
+    stat = os.stat(path)
+    if previous and previous.get("size") == stat.st_size and previous.get("mtime_ns") == stat.st_mtime_ns:
+        return previous
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return {"sha256": digest.hexdigest(), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def profile_fingerprints(engine, source):
+    """Enabled profile key -> fingerprint of everything its graph is built from"""
+    shared = {k: v for k, v in engine.items() if k not in ("profiles", "graphs_root_path")}
+    fingerprints = {}
+    for name, section in (engine.get("profiles") or {}).items():
+        if not section or not section.get("enabled", False):
+            continue
+        fingerprints[name] = _digest({"source": source["sha256"], "shared": shared, "profile": section})
+    return fingerprints
+
+
+def load_manifest(graphs_root):
+    try:
+        with open(os.path.join(graphs_root, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_manifest(graphs_root, manifest):
+    os.makedirs(graphs_root, exist_ok=True)
+    path = os.path.join(graphs_root, MANIFEST_NAME)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def decide(fingerprint, graph_dir, built=None, pending=None, force=False):
+    """What to do with one profile's graph folder
+
+    built is the manifest's record of the graph in the folder, pending the
+    fingerprint prepare expected the last build to use. Returns one of
+    build (nothing there), reuse, adopt (complete but unrecorded: keep it
+    and record it as current), rebuild (delete it) or incomplete (partial
+    and unrecorded: kept, ORS decides).
+    """
+    if not os.path.isdir(graph_dir) or not os.listdir(graph_dir):
+        return "build"
+    if built is not None:
+        return "reuse" if built.get("fingerprint") == fingerprint else "rebuild"
+    if force:
+        return "rebuild"
+    if pending is not None and pending != fingerprint:
+        return "rebuild"  # built for inputs that have changed since
+    if os.path.exists(os.path.join(graph_dir, GRAPH_COMPLETE_FILE)):
+        return "adopt"
+    return "incomplete"
+
+
+def plan(config_file=CONFIG_FILE, host_root=HOST_ROOT, force=False):
+    """Per-profile reuse/rebuild decision and the inputs it was made from"""
+    engine = load_engine(config_file)
+    graphs_root = host_path(engine["graphs_root_path"], host_root)
+    manifest = load_manifest(graphs_root)
+    source_path = host_path(engine["source_file"], host_root)
+    source = file_digest(source_path, manifest.get("source"))
+    fingerprints = profile_fingerprints(engine, source)
+    built = manifest.get("profiles", {})
+    pending = manifest.get("pending", {})
+    decisions = {name: decide(fingerprint, os.path.join(graphs_root, name), built.get(name), pending.get(name), force)
+                 for name, fingerprint in fingerprints.items()}
+    return {"graphs_root": graphs_root, "source_path": source_path, "source": source,
+            "fingerprints": fingerprints, "decisions": decisions, "manifest": manifest}
+
+
+def prepare(current):
+    """Remove stale profile graphs and record what the next build is expected to produce"""
+    manifest = current["manifest"]
+    profiles = manifest.setdefault("profiles", {})
+    now = int(time.time())
+    for name, decision in current["decisions"].items():
+        graph_dir = os.path.join(current["graphs_root"], name)
+        if decision == "rebuild":
+            shutil.rmtree(graph_dir)
+            profiles.pop(name, None)
+        elif decision == "adopt":
+            profiles[name] = {"fingerprint": current["fingerprints"][name], "built": None, "adopted": now}
+    manifest["source"] = current["source"]
+    manifest["pending"] = {name: current["fingerprints"][name]
+                           for name, decision in current["decisions"].items() if decision not in ("reuse", "adopt")}
+    manifest["prepared"] = now
+    save_manifest(current["graphs_root"], manifest)
+    return manifest
+
+
+def parse_build_log(lines):
+    """State of the last profile initialization found in ors.log lines"""
+    state = None
+    in_memory = False
+    for line in lines:
+        match = LOG_LINE.match(line)
+        if not match:
+            continue
+        message = match["message"]
+        ts = time.mktime(time.strptime(match["time"].replace("T", " "), "%Y-%m-%d %H:%M:%S"))
+        start = START.search(message)
+        if start:
+            state = {"started": ts, "updated": ts, "source": start["source"], "phase": "starting",
+                     "profiles": {}, "current": None, "finished": None, "total_s": None}
+            in_memory = False
+            continue
+        if state is None:
+            continue
+        state["updated"] = ts
+        profile = PROFILE.search(message)
+        if profile:
+            name = os.path.basename(profile["location"].rstrip("/"))
+            state["profiles"][profile["index"]] = {"profile": name, "encoder": profile["profile"],
+                                                   "started": ts, "seconds": None, "memory_mb": None}
+            state["current"] = profile["index"]
+            state["phase"] = "import"
+            continue
+        done = PROFILE_TIME.search(message)
+        if done:
+            if done["index"] in state["profiles"]:
+                state["profiles"][done["index"]]["seconds"] = float(done["seconds"])
+            continue
+        if MEMORY_HEADER.search(message):
+            in_memory = True
+            continue
+        memory = PROFILE_MEMORY.search(message)
+        if in_memory and memory and memory["index"] in state["profiles"]:
+            state["profiles"][memory["index"]]["memory_mb"] = float(memory["mb"])
+            continue
+        finished = FINISHED.search(message)
+        if finished:
+            state["finished"] = ts
+            state["total_s"] = float(finished["seconds"])
+            state["phase"] = "done"
+            continue
+        for phase, pattern in PHASES:
+            if pattern.search(message):
+                state["phase"] = phase
+                break
+    return state
+
+
+def load_history(path=HISTORY_FILE):
+    try:
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def expected_seconds(history, profiles, source_size):
+    """Build time to expect for these profiles, scaled from past builds by PBF size"""
+    total = 0.0
+    for name in profiles:
+        past = [b for b in history if b["profile"] == name and b.get("seconds")]
+        if not past:
+            return None
+        last = past[-1]
+        total += last["seconds"] * source_size / max(last.get("source_size") or source_size, 1)
+    return total
+
+
+def eta(state, history, pending, source_size, now=None):
+    """Seconds left for the running build, or None without history"""
+    if state is None or state["finished"]:
+        return None
+    expected = expected_seconds(history, pending, source_size)
+    if expected is None:
+        return None
+    return max(0.0, expected - ((now or time.time()) - state["started"]))
+
+
+def record_build(state, current, history_file=HISTORY_FILE):
+    """Append finished per-profile builds to the history and mark their graphs current"""
+    manifest = load_manifest(current["graphs_root"])
+    pending = manifest.get("pending", {})
+    built = []
+    with open(history_file, "a") as f:
+        for entry in state["profiles"].values():
+            name = entry["profile"]
+            if name not in pending:
+                continue  # loaded from existing graphs, nothing was built
+            record = {"ts": state["finished"], "profile": name, "encoder": entry["encoder"],
+                      "seconds": entry["seconds"], "memory_mb": entry["memory_mb"],
+                      "source_sha256": current["source"]["sha256"], "source_size": current["source"]["size"],
+                      "fingerprint": pending[name]}
+            f.write(json.dumps(record) + "\n")
+            manifest.setdefault("profiles", {})[name] = {"fingerprint": pending.pop(name), "built": state["finished"]}
+            built.append(name)
+    manifest["pending"] = pending
+    save_manifest(current["graphs_root"], manifest)
+    return built
+
+
+def _read_lines(path):
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return f.readlines()
+    except FileNotFoundError:
+        return []
+
+
+def _format_duration(seconds):
+    if seconds is None:
+        return "unknown"
+    return f"{int(seconds // 3600)}h{int(seconds % 3600 // 60):02d}m"
+
+
+def monitor(current, log_file=LOG_FILE, history_file=HISTORY_FILE, interval=MONITOR_INTERVAL):
+    """Follow ors.log until the profile initialization started after `prepare` finishes"""
+    history = load_history(history_file)
+    manifest = load_manifest(current["graphs_root"])
+    pending = list(manifest.get("pending", {}))
+    since = manifest.get("prepared")
+    while True:
+        state = parse_build_log(_read_lines(log_file))
+        if state is not None and (since is None or state["started"] >= since):
+            if state["finished"]:
+                built = record_build(state, current, history_file)
+                print(f"Finished in {_format_duration(state['total_s'])}; built: {', '.join(built) or 'nothing'}")
+                for entry in state["profiles"].values():
+                    print(f"  {entry['profile']:<16}{_format_duration(entry['seconds']):>10}"
+                          f"{entry['memory_mb'] or 0:>10.0f} MB")
+                return state
+            running = state["profiles"].get(state["current"], {}).get("profile", "-")
+            print(f"{time.strftime('%H:%M:%S')}  phase {state['phase']:<12} profile {running:<12}"
+                  f" elapsed {_format_duration(time.time() - state['started'])}"
+                  f"  ETA {_format_duration(eta(state, history, pending, current['source']['size']))}")
+        else:
+            print(f"{time.strftime('%H:%M:%S')}  waiting for ORS to start initializing profiles")
+        time.sleep(interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decide graph rebuilds and monitor ORS graph builds")
+    parser.add_argument("command", choices=["prepare", "status", "monitor", "history"])
+    parser.add_argument("--config", default=CONFIG_FILE)
+    parser.add_argument("--host-root", default=HOST_ROOT, help="Host directory mounted at /home/ors")
+    parser.add_argument("--log", default=LOG_FILE)
+    parser.add_argument("--history", default=HISTORY_FILE)
+    parser.add_argument("--interval", type=float, default=MONITOR_INTERVAL)
+    parser.add_argument("--force", action="store_true",
+                        help="Also delete graphs that have no fingerprint record (prepare)")
+    args = parser.parse_args(argv)
+
+    if args.command == "history":
+        for record in load_history(args.history):
+            print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(record['ts']))}  {record['profile']:<16}"
+                  f"{_format_duration(record['seconds']):>10}{record['memory_mb'] or 0:>10.0f} MB"
+                  f"{record['source_size'] / 1e6:>10.0f} MB pbf")
+        return
+
+    current = plan(args.config, args.host_root, args.force)
+    if args.command == "monitor":
+        monitor(current, args.log, args.history, args.interval)
+        return
+    for name, decision in current["decisions"].items():
+        print(f"{name:<16}{decision}")
+    if args.command == "prepare":
+        manifest = prepare(current)
+        if manifest["pending"]:
+            expected = expected_seconds(load_history(args.history), manifest["pending"], current["source"]["size"])
+            print(f"Graphs to build: {', '.join(manifest['pending'])} (expected {_format_duration(expected)})")
+        else:
+            print("All graphs are current; start with REBUILD_GRAPHS=False")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Road geometry for optimized tours.
+
+/optimization answers with the order of stops per vehicle, and only carries
+route geometry when ORS was asked to route the solution itself (and then as
+an encoded polyline). Solutions without it show bare markers on the map.
+
+hydrate_routes() asks /directions for every vehicle's stop sequence (start,
+jobs in order, end) and attaches to each route:
+
+- geometry: the decoded GeoJSON LineString of the whole tour,
+- legs: distance and duration from each stop to the next,
+- hydrated: the directions summary (distance, duration) of the tour.
+
+Vehicles are independent, so their requests run concurrently and a plan
+hydrates in about the time of its slowest vehicle rather than the sum of
+all. Each request goes through send_directions, so tours longer than
+maximum_waypoints are split by the planner and legs already routed (by the
+Directions tab, an earlier plan, or another vehicle sharing a depot) come
+from the leg cache instead of ORS.
+
+    result, error = hydrate_routes(result, request_body, send, limits, base_url=base_url)
+"""
+import concurrent.futures
+
+from ors_legs import get_leg_cache, send_directions
+from ors_planner import MAX_PARALLEL_SUBREQUESTS
+
+DEFAULT_PROFILE = "driving-car"  # as /optimization assumes for vehicles without one
+
+
+def route_coordinates(route, jobs=None):
+    """[lon, lat] of every step of an optimized route, in visiting order
+
+    ORS puts a location on each step; for solvers that only give job ids,
+    jobs (the request's job list) supplies them. Steps without either
+    (breaks) are skipped.
+    """
+    by_id = {job["id"]: job["location"] for job in jobs or []}
+    coordinates = []
+    for step in route.get("steps", []):
+        location = step.get("location") or by_id.get(step.get("job", step.get("id")))
+        if location is not None and step.get("type") != "break":
+            coordinates.append(list(location[:2]))
+    return coordinates
+
+
+def hydrate_route(route, profile, send, limits, cache=None, jobs=None, base_url=None):
+    """A copy of route with geometry, legs and hydrated summary; returns (route, error)"""
+    coordinates = route_coordinates(route, jobs)
+    if len(coordinates) < 2:
+        return route, None  # an unused vehicle, nothing to draw
+    # The Directions tab's default options, so both share cached legs
+    body = {"coordinates": coordinates, "format": "geojson", "instructions": True, "geometry": True,
+            "elevation": False}
+    result, error = send_directions(f"directions/{profile}", body, send, limits, cache, base_url=base_url)
+    if result is None:
+        return route, error
+    feature = result["features"][0]
+    segments = feature["properties"].get("segments", [])
+    hydrated = dict(route, geometry=feature["geometry"],
+                    legs=[{"distance": segment.get("distance", 0), "duration": segment.get("duration", 0)}
+                          for segment in segments],
+                    hydrated=feature["properties"].get("summary", {}))
+    return hydrated, None
+
+
+def hydrate_routes(result, body, send, limits, cache=None, max_workers=MAX_PARALLEL_SUBREQUESTS, base_url=None):
+    """A copy of an /optimization result with every route hydrated; returns (result, error)
+
+    body is the /optimization request: each route is routed with its
+    vehicle's profile, and job locations fill in steps that lack one.
+    base_url is the instance send talks to, for the leg cache.
+    Routes whose directions request fails are kept as they were; error then
+    names them, and is None when every route got its geometry.
+    """
+    routes = result.get("routes") or []
+    if not routes:
+        return result, None
+    cache = get_leg_cache() if cache is None else cache
+    profiles = {vehicle["id"]: vehicle.get("profile", DEFAULT_PROFILE) for vehicle in body.get("vehicles", [])}
+
+    def hydrate(route):
+        return hydrate_route(route, profiles.get(route.get("vehicle"), DEFAULT_PROFILE), send, limits, cache,
+                             body.get("jobs"), base_url)
+
+    with concurrent.futures.ThreadPoolExecutor(min(max_workers, len(routes))) as pool:
+        outcomes = list(pool.map(hydrate, routes))
+    failed = [f"vehicle {route.get('vehicle', i)}: {error}"
+              for i, (route, (_, error)) in enumerate(zip(routes, outcomes)) if error]
+    hydrated = dict(result, routes=[route for route, _ in outcomes])
+    if failed:
+        return hydrated, f"{len(failed)} of {len(routes)} routes without geometry ({'; '.join(failed[:3])})"
+    return hydrated, None
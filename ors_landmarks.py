@@ -0,0 +1,204 @@
+"""Landmark (ALT) travel-time bounds over a fixed location universe.
+
+Many questions only need to know whether a pair is near or far: which depot
+is nearest, whether a stop can possibly be reached inside its time window,
+which candidates can be among a stop's k nearest. For those an exact ORS
+matrix cell per pair is wasted work.
+
+A few landmarks are chosen spread over the universe (farthest-point
+sampling on great-circle distance), and the landmark -> all and all ->
+landmark matrices are fetched once (2 x L x N cells). Road travel times obey
+the triangle inequality, so for any pair (u, v) and landmark l:
+
+    d(u, v) >= d(l, v) - d(l, u)      d(u, v) >= d(u, l) - d(v, l)
+    d(u, v) <= d(u, l) + d(l, v)
+
+The best bound over all landmarks is computed with NumPy for whole blocks
+of pairs. Bounds are exact inequalities, so anything they rule out never
+needs an exact request (up to ORS's rounding of matrix cells, which
+ROUNDING_SLACK absorbs). Directed durations are kept as is (one-way
+streets). Lower bounds are tight for far-apart pairs; upper bounds through
+a landmark are loose for near ones, so pruning works best against an
+exact threshold (e.g. the k-th nearest value already fetched).
+
+So far the only caller is the optional second pass of ors_sparse.py, which
+prunes extra neighbour candidates with prune(); the planner, dispatch and
+optimization paths still work on exact matrices.
+
+    python ors_landmarks.py --base-url http://localhost:8080/ors/v2 \\
+        --locations stops.csv --landmarks 16 --output landmarks.npz
+"""
+import argparse
+import json
+import time
+import warnings
+
+import numpy as np
+
+from ors_client import send_request
+from ors_geometry import as_lonlat_array, haversine
+from ors_planner import get_limits, send_planned
+
+DEFAULT_LANDMARKS = 16
+ROUNDING_SLACK = 0.1  # ORS rounds matrix cells, so bounds can be off by that much
+PAIR_CHUNK = 65536  # pairs per block, bounds L x chunk temporaries
+
+
+def select_landmarks(coordinates, count):
+    """Farthest-point sample of `count` indices, spread evenly over the points"""
+    points = as_lonlat_array(coordinates)
+    count = min(count, len(points))
+    # Start from the point farthest from the centre; landmarks near the edges give the tightest bounds
+    chosen = [int(np.argmax(haversine(points, points.mean(axis=0))))]
+    nearest = haversine(points, points[chosen[0]])
+    while len(chosen) < count:
+        chosen.append(int(np.argmax(nearest)))
+        nearest = np.minimum(nearest, haversine(points, points[chosen[-1]]))
+    return np.array(chosen, dtype=np.int64)
+
+
+class Landmarks:
+    """Landmark matrices over a universe of N locations, with vectorized pair bounds"""
+
+    def __init__(self, coordinates, landmarks, from_landmark, to_landmark, metric="duration", stats=None):
+        self.coordinates = as_lonlat_array(coordinates)
+        self.landmarks = np.asarray(landmarks, dtype=np.int64)
+        self.from_landmark = np.asarray(from_landmark, dtype=float)  # (L, N): d(l, v)
+        self.to_landmark = np.asarray(to_landmark, dtype=float)  # (N, L): d(u, l)
+        self.metric = metric
+        self.stats = stats or {}
+
+    def __len__(self):
+        return len(self.coordinates)
+
+    @classmethod
+    def build(cls, coordinates, profile, send, limits=None, count=DEFAULT_LANDMARKS, metric="duration"):
+        """Pick landmarks and fetch their matrices; returns (Landmarks, error)"""
+        started = time.perf_counter()
+        points = as_lonlat_array(coordinates)
+        landmarks = select_landmarks(points, count)
+        locations = points.tolist()
+        outward, error = send_planned(f"matrix/{profile}", {
+            "locations": locations, "sources": landmarks.tolist(), "destinations": list(range(len(points))),
+            "metrics": [metric]}, send, limits or {}, arrays=True)
+        if outward is None:
+            return None, error
+        inward, error = send_planned(f"matrix/{profile}", {
+            "locations": locations, "sources": list(range(len(points))), "destinations": landmarks.tolist(),
+            "metrics": [metric]}, send, limits or {}, arrays=True)
+        if inward is None:
+            return None, error
+        stats = {"locations": len(points), "landmarks": len(landmarks),
+                 "cells_fetched": 2 * len(landmarks) * len(points),
+                 "build_s": round(time.perf_counter() - started, 3)}
+        return cls(points, landmarks, np.array(outward[f"{metric}s"], dtype=float),
+                   np.array(inward[f"{metric}s"], dtype=float), metric, stats), None
+
+    def pair_bounds(self, sources, destinations):
+        """(lower, upper) bounds for the elementwise pairs sources[i] -> destinations[i]"""
+        sources = np.asarray(sources, dtype=np.int64)
+        destinations = np.asarray(destinations, dtype=np.int64)
+        shape = np.broadcast_shapes(sources.shape, destinations.shape)
+        sources = np.broadcast_to(sources, shape).reshape(-1)
+        destinations = np.broadcast_to(destinations, shape).reshape(-1)
+        lower = np.empty(len(sources))
+        upper = np.empty(len(sources))
+        for start in range(0, len(sources), PAIR_CHUNK):
+            u = sources[start:start + PAIR_CHUNK]
+            v = destinations[start:start + PAIR_CHUNK]
+            from_l = self.from_landmark
+            to_l = self.to_landmark.T
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN columns fall back below
+                below = np.nanmax(np.maximum(from_l[:, v] - from_l[:, u], to_l[:, u] - to_l[:, v]), axis=0)
+                above = np.nanmin(to_l[:, u] + from_l[:, v], axis=0)
+            lower[start:start + len(u)] = np.where(np.isnan(below), 0.0, np.maximum(below, 0.0))
+            upper[start:start + len(u)] = np.where(np.isnan(above), np.inf, above)
+        same = sources == destinations
+        lower[same] = upper[same] = 0.0
+        return lower.reshape(shape), upper.reshape(shape)
+
+    def bounds(self, sources, destinations=None):
+        """(lower, upper) |sources| x |destinations| bound matrices"""
+        sources = np.asarray(sources, dtype=np.int64)
+        destinations = sources if destinations is None else np.asarray(destinations, dtype=np.int64)
+        return self.pair_bounds(sources[:, None], destinations[None, :])
+
+    def prune(self, sources, candidates, threshold=None, k=None):
+        """Per source, only the candidates whose lower bound is within its threshold
+
+        candidates is an (n, m) array of universe indices, one row per
+        source. threshold is a known value per source (say the exact k-th
+        nearest so far); without one, the k-th smallest upper bound in the
+        row is used, so one of threshold or k is required. Returns a list
+        of index arrays.
+        """
+        if threshold is None and k is None:
+            raise ValueError("prune needs a threshold per source or k")
+        if threshold is None and k < 1:
+            raise ValueError(f"k must be at least 1, got {k}")
+        sources = np.asarray(sources, dtype=np.int64)
+        candidates = np.asarray(candidates, dtype=np.int64)
+        if candidates.shape[1] == 0:
+            return list(candidates)
+        lower, upper = self.pair_bounds(sources[:, None], candidates)
+        if threshold is None:
+            k = min(k, candidates.shape[1])
+            threshold = np.partition(upper, k - 1, axis=1)[:, k - 1]
+        keep = lower <= np.asarray(threshold, dtype=float)[:, None] + ROUNDING_SLACK
+        return [row[mask] for row, mask in zip(candidates, keep)]
+
+    def nearest(self, source, targets, exact, k=1):
+        """The k targets nearest to source, calling exact(source, subset) only for those not ruled out
+
+        exact returns the true values for a list of target indices (e.g. one
+        matrix row); returns (targets, values) sorted nearest first.
+        """
+        targets = np.asarray(targets, dtype=np.int64)
+        lower, upper = self.pair_bounds(source, targets)
+        if len(targets) > k:
+            kth_upper = np.partition(upper, k - 1)[k - 1]
+            targets = targets[lower <= kth_upper + ROUNDING_SLACK]
+        values = np.asarray(exact(source, targets.tolist()), dtype=float)
+        order = np.argsort(values, kind="stable")[:k]
+        return targets[order], values[order]
+
+    def save(self, path):
+        np.savez_compressed(path, coordinates=self.coordinates, landmarks=self.landmarks,
+                            from_landmark=self.from_landmark, to_landmark=self.to_landmark,
+                            metric=self.metric, stats=json.dumps(self.stats))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(f["coordinates"], f["landmarks"], f["from_landmark"], f["to_landmark"],
+                       str(f["metric"]), json.loads(str(f["stats"])))
+
+
+def main(argv=None):
+    from ors_sparse import load_locations
+
+    parser = argparse.ArgumentParser(description="Precompute landmark travel-time bounds for a location universe")
+    parser.add_argument("--base-url", required=True)
+    parser.add_argument("--locations", required=True, help="JSON list of [lon, lat] or CSV with lon,lat")
+    parser.add_argument("--profile", default="driving-car")
+    parser.add_argument("--landmarks", type=int, default=DEFAULT_LANDMARKS)
+    parser.add_argument("--metric", choices=("duration", "distance"), default="duration")
+    parser.add_argument("--output", required=True, help="Output .npz file")
+    args = parser.parse_args(argv)
+
+    def send(endpoint, body, arrays=False):
+        return send_request(args.base_url, endpoint, data=body, method="POST", priority="batch", arrays=arrays)
+
+    landmarks, error = Landmarks.build(load_locations(args.locations), args.profile, send,
+                                       get_limits(args.base_url), args.landmarks, args.metric)
+    if error:
+        parser.exit(1, f"Landmark matrices failed: {error}\n")
+    landmarks.save(args.output)
+    stats = landmarks.stats
+    print(f"{stats['landmarks']} landmarks over {stats['locations']} locations: "
+          f"{stats['cells_fetched']:,} cells in {stats['build_s']:.1f}s -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
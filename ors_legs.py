@@ -0,0 +1,211 @@
+"""Leg-level caching for multi-waypoint directions.
+
+A route through N waypoints is N - 1 legs, and ORS routes each leg on its
+own: the answer for waypoints [a, b, c] is the answer for [a, b] followed
+by the one for [b, c]. Editing one stop of a 50-waypoint route therefore
+only changes two legs, yet a plain directions call recomputes all 49.
+
+send_directions() keeps every leg of the routes it has seen, keyed by the
+leg's own request (its two waypoints plus every route option). On the next
+request it looks each leg up, groups the missing ones into runs of
+consecutive legs, sends each run as one request through the planner
+(concurrently), splits the answers back into legs for the cache and splices
+cached and fresh legs into one response of the usual shape with
+merge_directions. A first request is a single run, i.e. exactly today's
+call.
+
+Splitting needs the per-leg segments, which ORS only returns with
+instructions on; without them routes are still served, just not cached.
+Alternative routes, skip_segments and extra_info describe the route as a
+whole and bypass the leg cache.
+"""
+import concurrent.futures
+import threading
+import time
+from collections import OrderedDict
+
+from ors_cache import CACHE_TTL, cache_key
+from ors_geometry import decode_polyline, encode_polyline
+from ors_planner import MAX_PARALLEL_SUBREQUESTS, _slice_per_waypoint, merge_directions, send_planned
+
+MAX_LEGS = 20000  # cached legs per process; least recently used are dropped first
+WHOLE_ROUTE_KEYS = ("alternative_routes", "skip_segments", "extra_info")
+
+
+def eligible(body):
+    """Whether a directions body can be answered leg by leg"""
+    return (len(body.get("coordinates") or []) >= 3 and body.get("geometry", True) is not False
+            and not any(body.get(key) for key in WHOLE_ROUTE_KEYS))
+
+
+def leg_key(endpoint, body, index, base_url=None):
+    """Cache key of leg `index` (waypoints index and index + 1) of a directions body on base_url"""
+    return cache_key(endpoint, "POST", None, _slice_per_waypoint(body, index, index + 2), base_url)
+
+
+def _bbox(lonlats):
+    dims = len(lonlats[0])
+    return [min(p[i] for p in lonlats) for i in range(dims)] + [max(p[i] for p in lonlats) for i in range(dims)]
+
+
+def split_directions(result, body):
+    """Cut a directions response into one response per leg; None if it has no per-leg segments"""
+    geojson = "features" in result
+    part = result["features"][0] if geojson else result["routes"][0]
+    properties = part["properties"] if geojson else part
+    segments = properties.get("segments") or []
+    way_points = properties.get("way_points") or []
+    if len(segments) != len(body["coordinates"]) - 1 or len(way_points) != len(segments) + 1 \
+            or "geometry" not in part:
+        return None
+
+    elevation = bool(body.get("elevation"))
+    if geojson:
+        coordinates = part["geometry"]["coordinates"]
+        lonlats = coordinates
+    else:
+        coordinates = decode_polyline(part["geometry"], elevation=elevation)
+        lonlats = [[p[1], p[0]] + p[2:] for p in coordinates]
+
+    legs = []
+    common = {k: v for k, v in properties.items() if k not in ("segments", "summary", "way_points", "extras")}
+    for i, segment in enumerate(segments):
+        start, end = way_points[i], way_points[i + 1]
+        segment = dict(segment)
+        if "steps" in segment:
+            segment["steps"] = [dict(s, way_points=[w - start for w in s.get("way_points", [])])
+                                for s in segment["steps"]]
+        summary = {key: segment[key] for key in ("distance", "duration", "ascent", "descent") if key in segment}
+        leg_properties = dict(common, summary=summary, segments=[segment], way_points=[0, end - start])
+        bbox = _bbox(lonlats[start:end + 1])
+        if geojson:
+            geometry = dict(part["geometry"], coordinates=coordinates[start:end + 1])
+            feature = dict(part, properties=leg_properties, geometry=geometry, bbox=bbox)
+            legs.append({"type": result.get("type", "FeatureCollection"), "features": [feature], "bbox": bbox,
+                         "metadata": result.get("metadata", {})})
+        else:
+            route = dict(leg_properties, geometry=encode_polyline(coordinates[start:end + 1], elevation=elevation),
+                         bbox=bbox)
+            legs.append({"routes": [route], "bbox": bbox, "metadata": result.get("metadata", {})})
+    return legs
+
+
+class LegCache:
+    """In-memory LRU of leg key -> single-leg directions response"""
+
+    def __init__(self, max_legs=MAX_LEGS, ttl=CACHE_TTL):
+        self.max_legs = max_legs
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._legs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._legs)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._legs.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self.misses += 1
+                return None
+            self._legs.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, leg):
+        with self._lock:
+            self._legs[key] = (time.monotonic(), leg)
+            self._legs.move_to_end(key)
+            while len(self._legs) > self.max_legs:
+                self._legs.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._legs.clear()
+
+
+def _runs(missing):
+    """Group sorted leg indices into (first, last) runs of consecutive legs"""
+    runs = []
+    for index in missing:
+        if runs and runs[-1][1] == index - 1:
+            runs[-1][1] = index
+        else:
+            runs.append([index, index])
+    return runs
+
+
+def send_directions(endpoint, body, send, limits, cache, max_workers=MAX_PARALLEL_SUBREQUESTS, base_url=None):
+    """Like send_planned for directions, but only requests legs that are not cached
+
+    The cache is shared across sessions; base_url (the ORS instance send
+    talks to) keeps legs of different instances and graph builds apart.
+    """
+    if cache is None or not eligible(body):
+        return send_planned(endpoint, body, send, limits)
+
+    count = len(body["coordinates"]) - 1
+    keys = [leg_key(endpoint, body, i, base_url) for i in range(count)]
+    legs = [cache.get(key) for key in keys]
+    missing = [i for i, leg in enumerate(legs) if leg is None]
+    if not missing:
+        return _splice(legs, body, fetched=0, cached=count)
+
+    runs = _runs(missing)
+
+    def fetch(run):
+        first, last = run
+        return send_planned(endpoint, _slice_per_waypoint(body, first, last + 2), send, limits)
+
+    with concurrent.futures.ThreadPoolExecutor(min(max_workers, len(runs))) as pool:
+        outcomes = list(pool.map(fetch, runs))
+    for (first, last), (result, error) in zip(runs, outcomes):
+        if result is None:
+            if len(runs) == 1:
+                return None, error
+            return None, f"Legs {first + 1}-{last + 1} failed: {error}"
+
+    if len(runs) == 1 and runs[0] == [0, count - 1]:
+        # Nothing was cached: the answer is exactly the single request's
+        result = outcomes[0][0]
+        pieces = split_directions(result, body)
+        if pieces is not None:
+            for key, leg in zip(keys, pieces):
+                cache.put(key, leg)
+        return result, None
+
+    parts = []
+    run_at = {first: (last, result) for (first, last), (result, _) in zip(runs, outcomes)}
+    index = 0
+    while index < count:
+        if index in run_at:
+            last, result = run_at[index]
+            pieces = split_directions(result, _slice_per_waypoint(body, index, last + 2))
+            if pieces is None:
+                parts.append(result)
+            else:
+                for key, leg in zip(keys[index:last + 1], pieces):
+                    cache.put(key, leg)
+                parts.extend(pieces)
+            index = last + 1
+        else:
+            parts.append(legs[index])
+            index += 1
+    return _splice(parts, body, fetched=len(runs), cached=count - len(missing))
+
+
+def _splice(parts, body, fetched, cached):
+    merged = merge_directions(parts, body)
+    merged["metadata"]["split_requests"] = fetched
+    merged["metadata"]["cached_legs"] = cached
+    return merged, None
+
+
+_leg_cache = LegCache()
+
+
+def get_leg_cache():
+    """Process-wide leg cache shared by every session"""
+    return _leg_cache
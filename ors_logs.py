@@ -0,0 +1,337 @@
+"""Turn ORS logs into a workload model that benchmarks can sample from.
+
+Three kinds of input are understood and can be mixed:
+
+* the Tomcat access log ORS writes to ors-docker/logs/access_log*.log
+  (enabled in ors-config.yml): method, path, profile, status and
+  processing time of every request, and coordinates for GET directions;
+* the ORS application log (ors-docker/logs/ors.log): warnings and errors,
+  including the coordinates ORS could not route from;
+* traffic recordings from ors_recorder.py, which carry full POST bodies and
+  are the only source of coordinates for matrix, isochrone and snap calls.
+
+The model holds, per endpoint/profile: share of traffic, request rate and
+hourly profile, latency percentiles, status counts, waypoint counts, trip
+lengths, isochrone ranges, and a grid histogram of the coordinates used.
+WorkloadModel.sample_requests() draws (endpoint, body) pairs that follow
+those distributions, so synthetic benchmarks hit the places and trip
+lengths real users ask for instead of uniform random points.
+
+    python ors_logs.py ors-docker/logs/access_log*.log traffic.jsonl.gz -o workload.json
+    python benchmarks/bench_regions.py --workload workload.json
+"""
+import argparse
+import collections
+import datetime
+import glob
+import gzip
+import json
+import math
+import re
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from ors_geometry import haversine, leg_distances
+from ors_regions import request_points
+
+SERVICES = ("directions", "isochrones", "matrix", "snap")
+GRID_CELL = 0.01  # degrees, about 1.1 km around Jakarta
+TRIP_QUANTILES = np.linspace(0, 100, 21)
+
+# '%t "%r" %s %b %{ms}T' from ors-config.yml; common/combined format lines match too (without latency)
+ACCESS_LINE = re.compile(
+    r'\[(?P<time>[^\]]+)\] "(?P<method>[A-Z]+) (?P<path>\S+)[^"]*" (?P<status>\d{3}) (?P<bytes>\S+)'
+    r'(?: (?P<ms>\d+(?:\.\d+)?)(?:\s|$))?'
+)
+# '%d{yyyy-MM-dd HH:mm:ss} %p [%-40.40c{1.}] - %m%n'
+APP_LINE = re.compile(r"^(?P<time>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\s+(?P<level>[A-Z]+)\s+\[\s*(?P<logger>[^\]]*?)\s*\] - (?P<message>.*)$")
+LONLAT = re.compile(r"(-?\d{1,3}\.\d+)[ ,]+(-?\d{1,2}\.\d+)")
+
+
+def _open(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, encoding="utf-8", errors="replace")
+
+
+def split_endpoint(path):
+    """(service, profile) of an ORS URL path or client endpoint, (None, None) if it is not one"""
+    parts = [p for p in urlsplit(path).path.split("/") if p]
+    for i, part in enumerate(parts):
+        if part in SERVICES:
+            return part, parts[i + 1] if i + 1 < len(parts) else None
+    return None, None
+
+
+def parse_access_line(line):
+    """Request record from one access log line, or None"""
+    match = ACCESS_LINE.search(line)
+    if not match:
+        return None
+    service, profile = split_endpoint(match["path"])
+    if service is None:
+        return None
+    points = None
+    query = parse_qs(urlsplit(match["path"]).query)
+    if service == "directions" and "start" in query and "end" in query:
+        # GET /directions/{profile}?start=lon,lat&end=lon,lat
+        try:
+            points = [[float(v) for v in query[key][0].split(",")[:2]] for key in ("start", "end")]
+        except ValueError:
+            points = None
+    return {
+        "ts": datetime.datetime.strptime(match["time"], "%d/%b/%Y:%H:%M:%S %z").timestamp(),
+        "service": service,
+        "profile": profile,
+        "method": match["method"],
+        "status": int(match["status"]),
+        "latency": float(match["ms"]) / 1000 if match["ms"] else None,
+        "points": points,
+        "data": None,
+    }
+
+
+def parse_recorded_line(line):
+    """Request record from one ors_recorder.py log line, or None"""
+    entry = json.loads(line)
+    service, profile = split_endpoint(entry.get("endpoint", ""))
+    if service is None:
+        return None
+    points, _ = request_points(f"{service}/{profile}", entry.get("data"))
+    return {
+        "ts": entry["ts"],
+        "service": service,
+        "profile": profile,
+        "method": entry.get("method"),
+        "status": entry.get("status"),
+        "latency": entry.get("latency"),
+        "points": points.tolist() if points is not None and len(points) else None,
+        "data": entry.get("data"),
+    }
+
+
+def parse_app_line(line):
+    """Warning/error record from one ors.log line, or None"""
+    match = APP_LINE.match(line)
+    if not match or match["level"] not in ("WARN", "ERROR"):
+        return None
+    points = [[float(lon), float(lat)] for lon, lat in LONLAT.findall(match["message"])]
+    return {
+        "ts": datetime.datetime.strptime(match["time"], "%Y-%m-%d %H:%M:%S").timestamp(),
+        "level": match["level"],
+        "logger": match["logger"],
+        "points": points or None,
+    }
+
+
+def read_logs(paths):
+    """(requests, problems) parsed from any mix of access logs, ors.log and recordings"""
+    requests, problems = [], []
+    for pattern in paths:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            with _open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    if line.startswith("{"):
+                        record = parse_recorded_line(line)
+                    elif APP_LINE.match(line):
+                        problem = parse_app_line(line)
+                        if problem is not None:
+                            problems.append(problem)
+                        continue
+                    else:
+                        record = parse_access_line(line)
+                    if record is not None:
+                        requests.append(record)
+    return requests, problems
+
+
+def _grid(points, cell):
+    """Sparse [[ix, iy, count], ...] histogram of [lon, lat] points"""
+    counts = collections.Counter()
+    for lon, lat in points:
+        counts[(math.floor(lon / cell), math.floor(lat / cell))] += 1
+    return [[ix, iy, n] for (ix, iy), n in counts.most_common()]
+
+
+def _percentiles_ms(values):
+    if not values:
+        return None
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": round(p50 * 1000, 1), "p95": round(p95 * 1000, 1), "p99": round(p99 * 1000, 1)}
+
+
+def build_model(requests, problems=(), cell=GRID_CELL):
+    """Workload model dict from parsed request and problem records"""
+    by_key = collections.defaultdict(list)
+    for record in requests:
+        by_key[f"{record['service']}/{record['profile']}"].append(record)
+    times = [r["ts"] for r in requests]
+    span = (max(times) - min(times)) if len(times) > 1 else 0.0
+
+    endpoints = {}
+    for key, records in sorted(by_key.items()):
+        hours = np.bincount([datetime.datetime.fromtimestamp(r["ts"]).hour for r in records], minlength=24)
+        with_points = [r["points"] for r in records if r["points"]]
+        trip_km = [float(leg_distances(p).sum()) / 1000 for p in with_points if len(p) > 1]
+        range_sets = collections.Counter(
+            json.dumps({"range": r["data"].get("range"), "range_type": r["data"].get("range_type", "time")})
+            for r in records if r["data"] and "range" in r["data"]
+        )
+        endpoints[key] = {
+            "requests": len(records),
+            "share": len(records) / len(requests),
+            "rate_per_s": len(records) / span if span else None,
+            "hourly": (hours / hours.sum()).round(4).tolist(),
+            "status": dict(collections.Counter(str(r["status"]) for r in records)),
+            "latency_ms": _percentiles_ms([r["latency"] for r in records if r["latency"] is not None]),
+            "points_per_request": dict(collections.Counter(str(len(p)) for p in with_points)),
+            "trip_km_quantiles": np.percentile(trip_km, TRIP_QUANTILES).round(3).tolist() if trip_km else None,
+            "range_sets": dict(range_sets.most_common(50)),
+            "grid": _grid([point for p in with_points for point in p], cell),
+        }
+    return {
+        "version": 1,
+        "cell": cell,
+        "span_s": span,
+        "requests": len(requests),
+        "endpoints": endpoints,
+        "problems": {
+            "count": len(problems),
+            "by_logger": dict(collections.Counter(p["logger"] for p in problems).most_common(20)),
+            "grid": _grid([point for p in problems if p["points"] for point in p["points"]], cell),
+        },
+    }
+
+
+class WorkloadModel:
+    """Sampler over a model produced by build_model()"""
+
+    def __init__(self, model):
+        self.model = model
+        self.cell = model["cell"]
+        self.endpoints = model["endpoints"]
+        # Endpoints whose requests carried no coordinates borrow the pooled grid
+        pooled = collections.Counter()
+        for stats in self.endpoints.values():
+            for ix, iy, n in stats["grid"]:
+                pooled[(ix, iy)] += n
+        self._pooled = self._cells([[ix, iy, n] for (ix, iy), n in pooled.items()])
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.model, f, indent=1)
+
+    def _cells(self, grid):
+        if not grid:
+            return None
+        grid = np.asarray(grid, dtype=float)
+        centers = (grid[:, :2] + 0.5) * self.cell
+        return centers, grid[:, 2] / grid[:, 2].sum()
+
+    def _sample_point(self, rng, cells, weights=None):
+        centers, probabilities = cells
+        if weights is not None:
+            probabilities = weights / weights.sum()
+        i = rng.choice(len(centers), p=probabilities)
+        # Uniform inside the cell
+        return (centers[i] + rng.uniform(-0.5, 0.5, 2) * self.cell).round(6).tolist()
+
+    def _sample_count(self, rng, histogram, default):
+        if not histogram:
+            return default
+        values = np.array([int(k) for k in histogram])
+        counts = np.array(list(histogram.values()), dtype=float)
+        return int(rng.choice(values, p=counts / counts.sum()))
+
+    def _sample_route(self, rng, stats, cells, n_points):
+        points = [self._sample_point(rng, cells)]
+        quantiles = stats["trip_km_quantiles"]
+        centers, probabilities = cells
+        for _ in range(n_points - 1):
+            if quantiles is None:
+                points.append(self._sample_point(rng, cells))
+                continue
+            # Leg length from the recorded trip lengths, destination from cells at about that distance
+            target = np.interp(rng.uniform(0, 100), TRIP_QUANTILES, quantiles) * 1000 / (n_points - 1)
+            distances = haversine(np.asarray(points[-1]), centers)
+            weights = probabilities * np.exp(-((distances - target) / (0.25 * target + 500)) ** 2)
+            if weights.sum() <= 0:
+                weights = None
+            points.append(self._sample_point(rng, cells, weights))
+        return points
+
+    def sample_requests(self, n, seed=0):
+        """n (endpoint, body) pairs following the recorded mix and distributions"""
+        rng = np.random.default_rng(seed)
+        keys = list(self.endpoints)
+        if not keys:
+            raise ValueError("Workload model has no requests")
+        shares = np.array([self.endpoints[k]["share"] for k in keys])
+        workload = []
+        for index in rng.choice(len(keys), size=n, p=shares / shares.sum()):
+            key = keys[index]
+            stats = self.endpoints[key]
+            cells = self._cells(stats["grid"]) or self._pooled
+            if cells is None:
+                raise ValueError("No coordinates in the logs; add a traffic recording from ors_recorder.py")
+            service = key.split("/")[0]
+            if service == "directions":
+                points = self._sample_route(rng, stats, cells, self._sample_count(rng, stats["points_per_request"], 2))
+                workload.append((key, {"coordinates": points}))
+            elif service == "isochrones":
+                count = self._sample_count(rng, stats["points_per_request"], 1)
+                body = {"locations": [self._sample_point(rng, cells) for _ in range(count)], "range": [300]}
+                if stats["range_sets"]:
+                    sets = list(stats["range_sets"])
+                    weights = np.array(list(stats["range_sets"].values()), dtype=float)
+                    body.update(json.loads(sets[rng.choice(len(sets), p=weights / weights.sum())]))
+                workload.append((key, body))
+            elif service == "matrix":
+                count = self._sample_count(rng, stats["points_per_request"], 5)
+                workload.append((key, {"locations": [self._sample_point(rng, cells) for _ in range(count)],
+                                       "metrics": ["duration"]}))
+            else:
+                count = self._sample_count(rng, stats["points_per_request"], 1)
+                workload.append((key, {"locations": [self._sample_point(rng, cells) for _ in range(count)],
+                                       "radius": 350}))
+        return workload
+
+    def sample_arrivals(self, n, seed=0, speed=1.0):
+        """Poisson send offsets (seconds) at the recorded overall rate times speed"""
+        rng = np.random.default_rng(seed)
+        rate = self.model["requests"] / self.model["span_s"] if self.model["span_s"] else 1.0
+        return np.cumsum(rng.exponential(1.0 / (rate * speed), size=n))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a benchmark workload model from ORS logs")
+    parser.add_argument("logs", nargs="+", help="Access logs, ors.log and/or ors_recorder.py recordings (globs ok)")
+    parser.add_argument("-o", "--output", default="workload.json")
+    parser.add_argument("--cell", type=float, default=GRID_CELL, help="Grid cell size in degrees")
+    args = parser.parse_args(argv)
+
+    requests, problems = read_logs(args.logs)
+    model = WorkloadModel(build_model(requests, problems, cell=args.cell))
+    model.save(args.output)
+
+    print(f"{len(requests)} requests, {len(problems)} warnings/errors over {model.model['span_s'] / 3600:.1f} h")
+    print(f"{'endpoint':<28}{'share':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'cells':>7}")
+    for key, stats in model.endpoints.items():
+        latency = stats["latency_ms"] or {}
+        rate = f"{stats['rate_per_s']:.3g}" if stats["rate_per_s"] else "-"
+        print(f"{key:<28}{stats['share']:>8.1%}{rate:>9}{latency.get('p50', '-'):>9}"
+              f"{latency.get('p95', '-'):>9}{len(stats['grid']):>7}")
+    print(f"Model written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
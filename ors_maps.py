@@ -0,0 +1,52 @@
+"""Folium map helpers used by the Streamlit app (and its benchmarks).
+
+ORS returns [lon, lat]; folium wants [lat, lon].
+"""
+import folium
+
+from ors_profiling import timed
+
+
+def to_latlon(coordinates):
+    """[[lon, lat(, ele)], ...] -> [[lat, lon], ...]"""
+    return [[coord[1], coord[0]] for coord in coordinates]
+
+
+@timed
+def create_map(center=[52.520008, 13.404954], zoom=14):
+    """Create a folium map"""
+    m = folium.Map(location=center, zoom_start=zoom)
+    return m
+
+
+@timed
+def add_markers_to_map(m, coordinates, labels=None, colors=None):
+    """Add markers to map"""
+    if not labels:
+        labels = [f"Point {i+1}" for i in range(len(coordinates))]
+    if not colors:
+        colors = ['red', 'blue', 'green', 'purple', 'orange'] * (len(coordinates) // 5 + 1)
+
+    for i, (coord, label) in enumerate(zip(coordinates, labels)):
+        folium.Marker(
+            location=[coord[1], coord[0]],  # lat, lon
+            popup=label,
+            icon=folium.Icon(color=colors[i % len(colors)])
+        ).add_to(m)
+    return m
+
+
+@timed
+def add_route_to_map(m, route_geometry):
+    """Add route line to map"""
+    if route_geometry and route_geometry.get("type") == "LineString":
+        # Convert to lat,lon format for folium
+        route_coords = to_latlon(route_geometry["coordinates"])
+        folium.PolyLine(
+            route_coords,
+            color='blue',
+            weight=5,
+            opacity=0.8,
+            popup="Route"
+        ).add_to(m)
+    return m
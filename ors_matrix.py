@@ -0,0 +1,157 @@
+"""Duration/distance matrices over a changing set of locations.
+
+The TSP and VRP forms edit their stops one at a time. Asking ORS for the
+full N x N matrix after every edit costs N^2 cells (90,000 for a 300-stop
+plan) although only one row and one column changed. LocationMatrix keeps
+the matrix of the current location set and, when the set changes, keeps
+the cells between unchanged locations, drops removed rows/columns and
+fetches only what is new: k new locations against all N (k x N) plus the
+old ones against the new (N x k). An edited location counts as removed
+plus added. Requests go through the planner, so large updates are still
+tiled within maximum_routes.
+
+The result can be handed to /optimization as a custom matrix (see
+vroom_matrices), so VROOM does not ask ORS for the full matrix again.
+"""
+import numpy as np
+
+from ors_coalesce import COALESCE_RADIUS, coalesce
+from ors_planner import send_planned
+
+COORDINATE_DECIMALS = 6  # locations equal to this precision share a row
+
+
+def _key(location):
+    return (round(float(location[0]), COORDINATE_DECIMALS), round(float(location[1]), COORDINATE_DECIMALS))
+
+
+class LocationMatrix:
+    """Matrix of one profile over an ordered list of [lon, lat] locations"""
+
+    def __init__(self, profile, metrics=("duration", "distance")):
+        self.profile = profile
+        self.metrics = tuple(metrics)
+        self.locations = []
+        self.matrices = {metric: np.empty((0, 0)) for metric in self.metrics}
+        self.requests = 0
+        self.cells_fetched = 0
+        self.last_cells = 0
+
+    def __len__(self):
+        return len(self.locations)
+
+    def __getitem__(self, metric):
+        return self.matrices[metric]
+
+    @property
+    def complete(self):
+        """No missing cells (ORS answers null for unroutable pairs)"""
+        return all(not np.isnan(m).any() for m in self.matrices.values())
+
+    def _fetch(self, locations, sources, destinations, send, limits):
+        body = {"locations": locations, "sources": sources, "destinations": destinations,
+                "metrics": list(self.metrics)}
+        result, error = send_planned(f"matrix/{self.profile}", body, send, limits or {}, arrays=True)
+        if result is None:
+            return None, error
+        self.requests += 1
+        self.cells_fetched += len(sources) * len(destinations)
+        return {metric: np.array(result[f"{metric}s"], dtype=float) for metric in self.metrics}, None
+
+    def update(self, locations, send, limits=None):
+        """Bring the matrix in line with `locations`; returns an error string or None
+
+        send(endpoint, body, arrays=False) -> (result, error) as used by the
+        planner; matrices are requested with arrays=True. On error the
+        previous matrix is kept unchanged.
+        """
+        locations = [list(location) for location in locations]
+        available = {}
+        for index, location in enumerate(self.locations):
+            available.setdefault(_key(location), []).append(index)
+        old_index = []
+        for location in locations:
+            indices = available.get(_key(location))
+            old_index.append(indices.pop(0) if indices else None)
+        kept = [i for i, old in enumerate(old_index) if old is not None]
+        added = [i for i, old in enumerate(old_index) if old is None]
+        kept_old = [old_index[i] for i in kept]
+
+        n = len(locations)
+        matrices = {}
+        for metric in self.metrics:
+            matrix = np.full((n, n), np.nan)
+            matrix[np.ix_(kept, kept)] = self.matrices[metric][np.ix_(kept_old, kept_old)]
+            matrices[metric] = matrix
+
+        self.last_cells = 0
+        if added:
+            cells_before = self.cells_fetched
+            rows, error = self._fetch(locations, added, list(range(n)), send, limits)
+            if error:
+                return error
+            cols = None
+            if kept:
+                cols, error = self._fetch(locations, kept, added, send, limits)
+                if error:
+                    return error
+            for metric in self.metrics:
+                matrices[metric][added, :] = rows[metric]
+                if cols is not None:
+                    matrices[metric][np.ix_(kept, added)] = cols[metric]
+            self.last_cells = self.cells_fetched - cells_before
+
+        self.locations = locations
+        self.matrices = matrices
+        return None
+
+    def index_of(self, location):
+        """Row of a location in the current matrix"""
+        key = _key(location)
+        for index, candidate in enumerate(self.locations):
+            if _key(candidate) == key:
+                return index
+        raise KeyError(f"{location} is not in the matrix")
+
+    def vroom_matrices(self):
+        """{"profile": {"durations": ..., "distances": ...}} for an /optimization body
+
+        VROOM wants whole seconds and metres; returns None while cells are
+        missing so callers fall back to letting VROOM route by coordinates.
+        """
+        if not self.complete:
+            return None
+        return {self.profile: {f"{metric}s": np.rint(matrix).astype(int).tolist()
+                               for metric, matrix in self.matrices.items()}}
+
+
+def attach_matrices(body, matrix_for, send, limits=None, radius=COALESCE_RADIUS):
+    """Copy of an /optimization body that routes on incrementally kept matrices
+
+    Every job location and vehicle start/end gets an index into one shared
+    location list, where stops within `radius` metres of each other share
+    an index (see ors_coalesce.py), and each vehicle profile's
+    LocationMatrix (from matrix_for(profile)) is updated to that list.
+    Returns (body, error); on error or missing cells the body is returned
+    unchanged so VROOM routes by coordinates as before.
+    """
+    vehicles = [dict(vehicle) for vehicle in body.get("vehicles", [])]
+    jobs = [dict(job) for job in body.get("jobs", [])]
+    places = [(vehicle, end) for vehicle in vehicles for end in ("start", "end") if vehicle.get(end) is not None]
+    places += [(job, "location") for job in jobs]
+    groups = coalesce([item[field] for item, field in places], radius)
+    for (item, field), label in zip(places, groups.labels):
+        item["location_index" if field == "location" else f"{field}_index"] = int(label)
+    locations = groups.representatives.tolist()
+
+    matrices = {}
+    for profile in sorted({vehicle.get("profile", "driving-car") for vehicle in vehicles}):
+        matrix = matrix_for(profile)
+        error = matrix.update(locations, send, limits)
+        if error:
+            return body, error
+        custom = matrix.vroom_matrices()
+        if custom is None:
+            return body, f"Some locations cannot be routed with {profile}"
+        matrices.update(custom)
+    return dict(body, jobs=jobs, vehicles=vehicles, matrices=matrices), None
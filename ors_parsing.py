@@ -0,0 +1,126 @@
+"""Fast parsing of ORS responses, with large matrices decoded straight into NumPy.
+
+response.json() turns a large matrix into hundreds of thousands of small
+float objects that callers then copy again into arrays. For large /matrix
+responses the durations and distances members are cut out of the raw body
+and decoded one at a time into contiguous float64 arrays (null, for
+unroutable pairs, becomes NaN), so only one array's worth of temporary
+objects is ever alive; the small remainder of the document is parsed
+normally. Small responses keep the plain dict path, and so does every
+other endpoint: only the matrix senders ask for arrays.
+
+orjson is used when installed; otherwise the arrays are read with NumPy's
+text parser and the rest with the standard json module.
+"""
+import json
+import warnings
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+FAST_PATH_BYTES = 256 * 1024  # responses smaller than this use the dict path
+ARRAY_KEYS = (b'"durations":', b'"distances":')
+# Matrix members hold only numbers, null, brackets and commas, so the first
+# quote or closing brace after the key marks where the array ends
+_ARRAY_END = (b'"', b'}')
+
+
+def loads(content):
+    """Generic JSON decode of bytes or str"""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def json_default(value):
+    """json.dumps default= hook for request bodies built from NumPy (planner tiles, coalesced matrices)"""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def parse_response(content, arrays=False):
+    """Decode an ORS response body; arrays=True enables the NumPy fast path"""
+    if not arrays or len(content) < FAST_PATH_BYTES:
+        return loads(content)
+    return parse_with_arrays(content)
+
+
+def _find_array_spans(content):
+    """(key, start, end) byte spans of every array-valued member we decode"""
+    spans = []
+    for key in ARRAY_KEYS:
+        position = content.find(key)
+        while position != -1:
+            start = position + len(key)
+            end = min((i for i in (content.find(marker, start) for marker in _ARRAY_END) if i != -1),
+                      default=len(content))
+            # Back up over the separator before the next member
+            while content[end - 1:end] in (b",", b" ", b"\n", b"\r", b"\t"):
+                end -= 1
+            spans.append((key, start, end))
+            position = content.find(key, end)
+    return sorted(spans, key=lambda span: span[1])
+
+
+def decode_numeric_array(raw):
+    """JSON array of numbers, or of rows of numbers, -> float64 array; null becomes NaN"""
+    raw = raw.strip()
+    if orjson is not None:
+        # None (null, e.g. unreachable matrix cells) becomes NaN under dtype=float
+        return np.array(orjson.loads(raw), dtype=float)
+    raw = raw.translate(None, b" \n\r\t")
+    depth = len(raw) - len(raw.lstrip(b"["))
+    text = raw.replace(b"null", b"nan").translate(None, b"[]").decode()
+    with warnings.catch_warnings():
+        # NumPy only warns when it cannot read the text to its end; that is malformed input here
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            values = np.fromstring(text, sep=",") if text else np.empty(0)
+        except DeprecationWarning as exc:
+            raise ValueError(f"Malformed numeric array: {exc}") from None
+    if depth == 2:
+        rows = raw.count(b"[") - 1
+        return values.reshape(rows, -1) if rows else values.reshape(0, 0)
+    return values
+
+
+def parse_with_arrays(content):
+    """Parse a response, decoding matrix durations and distances into NumPy arrays"""
+    if isinstance(content, str):
+        content = content.encode()
+    spans = _find_array_spans(content)
+    if not spans:
+        return loads(content)
+
+    # Parse the skeleton with placeholders, then put the arrays in place
+    pieces = []
+    arrays = []
+    previous = 0
+    for key, start, end in spans:
+        pieces.append(content[previous:start])
+        pieces.append(b'{"__array__":%d}' % len(arrays))
+        arrays.append(decode_numeric_array(content[start:end]))
+        previous = end
+    pieces.append(content[previous:])
+    skeleton = loads(b"".join(pieces))
+    return _restore(skeleton, arrays)
+
+
+def _restore(node, arrays):
+    if isinstance(node, dict):
+        if len(node) == 1 and "__array__" in node:
+            return arrays[node["__array__"]]
+        for key, value in node.items():
+            if isinstance(value, (dict, list)):
+                node[key] = _restore(value, arrays)
+        return node
+    if isinstance(node, list):
+        for i, value in enumerate(node):
+            if isinstance(value, (dict, list)):
+                node[i] = _restore(value, arrays)
+    return node
@@ -0,0 +1,379 @@
+"""Limits-aware planning of ORS requests before they are sent.
+
+ORS rejects requests that exceed the limits in ors-config.yml (route
+distance and waypoint count per profile, isochrone locations, intervals and
+ranges, matrix size), but only after the request has travelled to the
+backend and taken a worker thread. The planner checks the same limits
+locally: requests that can never succeed are rejected instantly, and
+requests that are legal once split (long multi-waypoint routes, too many
+isochrone locations or intervals, oversized matrices) are cut into compliant
+sub-requests that run concurrently and are merged back into one response of
+the usual shape.
+
+ORS checks route length as the sum of great-circle distances between
+consecutive waypoints, so the vectorized haversine lower bound used here is
+exactly the server-side test.
+"""
+import concurrent.futures
+import copy
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from ors_client import send_request
+from ors_geometry import decode_polyline, encode_polyline, leg_distances, union_bbox
+
+CONFIG_FILE = os.environ.get(
+    "ORS_CONFIG_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "ors-docker", "config", "ors-config.yml")
+)
+LIMITS_TTL = 300  # seconds before limits are re-read from /status
+MAX_PARALLEL_SUBREQUESTS = 8
+
+# ORS defaults, overridden by /status and ors-config.yml when available
+DEFAULT_PROFILE_LIMITS = {"maximum_distance": 100000, "maximum_waypoints": 50}
+DEFAULT_ENDPOINT_LIMITS = {
+    "isochrones": {
+        "maximum_locations": 5,
+        "maximum_intervals": 10,
+        "maximum_range_distance_default": 50000,
+        "maximum_range_distance": {},
+        "maximum_range_time_default": 18000,
+        "maximum_range_time": {},
+    },
+    "matrix": {"maximum_routes": 2500},
+}
+
+
+def load_endpoint_limits(path=CONFIG_FILE):
+    """Isochrone and matrix limits from ors-config.yml (falls back to ORS defaults)"""
+    limits = copy.deepcopy(DEFAULT_ENDPOINT_LIMITS)
+    try:
+        import yaml
+        with open(path) as f:
+            endpoints = yaml.safe_load(f)["ors"]["endpoints"]
+    except Exception:
+        return limits
+
+    isochrones = endpoints.get("isochrones", {})
+    for key in ("maximum_locations", "maximum_intervals",
+                "maximum_range_distance_default", "maximum_range_time_default"):
+        if key in isochrones:
+            limits["isochrones"][key] = isochrones[key]
+    for key in ("maximum_range_distance", "maximum_range_time"):
+        for entry in isochrones.get(key) or []:
+            for profile in str(entry["profiles"]).split(","):
+                limits["isochrones"][key][profile.strip()] = entry["value"]
+    if "maximum_routes" in endpoints.get("matrix", {}):
+        limits["matrix"]["maximum_routes"] = endpoints["matrix"]["maximum_routes"]
+    return limits
+
+
+def profile_limits_from_status(status):
+    """Per-profile routing limits advertised by /status"""
+    limits = {}
+    for profile_data in (status or {}).get("profiles", {}).values():
+        if "profiles" in profile_data:
+            limits[profile_data["profiles"]] = dict(DEFAULT_PROFILE_LIMITS, **profile_data.get("limits", {}))
+    return limits
+
+
+_limits_cache = {}
+_limits_lock = threading.Lock()
+
+
+def get_limits(base_url):
+    """Cached limits for a backend: {"profiles": {...}, "isochrones": {...}, "matrix": {...}}"""
+    with _limits_lock:
+        cached = _limits_cache.get(base_url)
+        if cached and time.monotonic() - cached[0] < LIMITS_TTL:
+            return cached[1]
+
+    status, error = send_request(base_url, "status", timeout=5)
+    limits = load_endpoint_limits()
+    limits["profiles"] = profile_limits_from_status(status)
+    if status is not None:
+        with _limits_lock:
+            _limits_cache[base_url] = (time.monotonic(), limits)
+    return limits
+
+
+def _profile(endpoint):
+    parts = endpoint.split("/")
+    return parts[1] if len(parts) > 1 else None
+
+
+def _slice_per_waypoint(body, start, end):
+    """Copy of a directions body restricted to waypoints start..end-1"""
+    sub = dict(body)
+    count = len(body["coordinates"])
+    for key in ("coordinates", "bearings", "radiuses", "skip_segments"):
+        if key == "skip_segments" and key in body:
+            sub[key] = [s - start for s in body[key] if start < s < end]
+        elif isinstance(body.get(key), list) and len(body[key]) == count:
+            sub[key] = body[key][start:end]
+    return sub
+
+
+def plan_directions(profile, body, limits):
+    """Split a directions body into compliant sub-bodies; returns (bodies, error)"""
+    coordinates = body.get("coordinates") or []
+    profile_limits = limits.get("profiles", {}).get(profile, DEFAULT_PROFILE_LIMITS)
+    max_distance = profile_limits.get("maximum_distance")
+    max_waypoints = profile_limits.get("maximum_waypoints")
+    if len(coordinates) < 2:
+        return [body], None
+
+    legs = leg_distances(coordinates)
+    if max_distance:
+        too_long = (legs > max_distance).nonzero()[0]
+        if len(too_long):
+            i = int(too_long[0])
+            return None, (f"Rejected locally: waypoints {i + 1} and {i + 2} are at least "
+                          f"{legs[i] / 1000:.1f} km apart, over the {max_distance / 1000:.0f} km "
+                          f"limit for {profile}")
+
+    cuts = [0]
+    travelled = 0.0
+    for i, leg in enumerate(legs):
+        waypoints = i + 2 - cuts[-1]
+        if (max_waypoints and waypoints > max_waypoints) or (max_distance and travelled + leg > max_distance):
+            cuts.append(i)
+            travelled = 0.0
+        travelled += leg
+    cuts.append(len(coordinates) - 1)
+
+    if len(cuts) == 2:
+        return [body], None
+    if body.get("alternative_routes"):
+        return None, ("Rejected locally: alternative routes are only available for routes that fit in "
+                      f"a single request ({max_waypoints} waypoints, {max_distance / 1000:.0f} km)")
+    return [_slice_per_waypoint(body, start, end + 1) for start, end in zip(cuts, cuts[1:])], None
+
+
+def plan_isochrones(profile, body, limits):
+    """Split an isochrones body by locations and intervals; returns (bodies, error)"""
+    iso = limits.get("isochrones", DEFAULT_ENDPOINT_LIMITS["isochrones"])
+    range_type = body.get("range_type", "time")
+    ranges = list(body.get("range") or [])
+    if not ranges:
+        return [body], None
+
+    key = "maximum_range_time" if range_type == "time" else "maximum_range_distance"
+    max_range = iso[key].get(profile, iso[f"{key}_default"])
+    if max(ranges) > max_range:
+        unit = f"{max_range // 60} min" if range_type == "time" else f"{max_range / 1000:.1f} km"
+        return None, f"Rejected locally: range {max(ranges)} exceeds the {unit} {range_type} limit for {profile}"
+
+    # range [max] + interval expands server-side into several isochrones
+    if body.get("interval") and len(ranges) == 1:
+        ranges = [min(ranges[0], body["interval"] * k)
+                  for k in range(1, math.ceil(ranges[0] / body["interval"]) + 1)]
+        body = dict(body, range=ranges)
+        body.pop("interval")
+
+    locations = body.get("locations") or []
+    max_locations = iso["maximum_locations"]
+    max_intervals = iso["maximum_intervals"]
+    if len(locations) <= max_locations and len(ranges) <= max_intervals:
+        return [body], None
+
+    bodies = []
+    for start in range(0, len(locations), max_locations):
+        for range_start in range(0, len(ranges), max_intervals):
+            sub = dict(body, locations=locations[start:start + max_locations],
+                       range=ranges[range_start:range_start + max_intervals])
+            sub["_location_offset"] = start
+            bodies.append(sub)
+    return bodies, None
+
+
+def plan_matrix(profile, body, limits):
+    """Tile a matrix body so sources x destinations stays within maximum_routes
+
+    Each tile carries only the locations its sources and destinations use,
+    with indices renumbered, so a tile's payload does not grow with the
+    full location list.
+    """
+    max_routes = limits.get("matrix", DEFAULT_ENDPOINT_LIMITS["matrix"])["maximum_routes"]
+    locations = body.get("locations") or []
+    count = len(locations)
+    sources = body.get("sources")
+    destinations = body.get("destinations")
+    sources = list(range(count)) if sources in (None, "all", ["all"]) else list(sources)
+    destinations = list(range(count)) if destinations in (None, "all", ["all"]) else list(destinations)
+    if len(sources) * len(destinations) <= max_routes:
+        return [body], None
+
+    dest_chunk = min(len(destinations), max_routes)
+    source_chunk = max(1, max_routes // dest_chunk)
+    bodies = []
+    for s in range(0, len(sources), source_chunk):
+        for d in range(0, len(destinations), dest_chunk):
+            tile_sources = sources[s:s + source_chunk]
+            tile_destinations = destinations[d:d + dest_chunk]
+            used = sorted(set(tile_sources) | set(tile_destinations))
+            local = {index: position for position, index in enumerate(used)}
+            sub = dict(body, locations=[locations[i] for i in used], sources=[local[i] for i in tile_sources],
+                       destinations=[local[i] for i in tile_destinations])
+            sub["_tile"] = (s, d)
+            bodies.append(sub)
+    return bodies, None
+
+
+def _merge_geometry(geometries, elevation):
+    """Concatenate leg geometries, dropping the duplicated join points"""
+    if all(isinstance(g, dict) for g in geometries):
+        coordinates = list(geometries[0]["coordinates"])
+        for geometry in geometries[1:]:
+            coordinates.extend(geometry["coordinates"][1:])
+        return dict(geometries[0], coordinates=coordinates)
+    decoded = [decode_polyline(g, elevation=elevation) for g in geometries]
+    merged = list(decoded[0])
+    for part in decoded[1:]:
+        merged.extend(part[1:])
+    return encode_polyline(merged, elevation=elevation)
+
+
+def _offset_step(step, offset):
+    return dict(step, way_points=[w + offset for w in step.get("way_points", [])])
+
+
+def _last_way_point(properties):
+    """Index of a part's final point, from its way_points (present with geometry off too)"""
+    if properties.get("way_points"):
+        return properties["way_points"][-1]
+    steps = [step for segment in properties.get("segments", []) for step in segment.get("steps", [])]
+    if steps and steps[-1].get("way_points"):
+        return steps[-1]["way_points"][-1]
+    return 0
+
+
+def merge_directions(results, body):
+    """Splice split directions responses into a single route response"""
+    geojson = "features" in results[0]
+    parts = [r["features"][0] if geojson else r["routes"][0] for r in results]
+    properties = [p["properties"] if geojson else p for p in parts]
+
+    geometry = None
+    if all("geometry" in p for p in parts):
+        geometry = _merge_geometry([p["geometry"] for p in parts], bool(body.get("elevation")))
+
+    summary = {}
+    for key in ("distance", "duration", "ascent", "descent"):
+        values = [p.get("summary", {}).get(key) for p in properties]
+        if any(v is not None for v in values):
+            summary[key] = round(sum(v or 0 for v in values), 1)
+
+    segments, way_points = [], []
+    offset = 0
+    for i, props in enumerate(properties):
+        for segment in props.get("segments", []):
+            segment = dict(segment)
+            if "steps" in segment:
+                segment["steps"] = [_offset_step(s, offset) for s in segment["steps"]]
+            segments.append(segment)
+        part_way_points = [w + offset for w in props.get("way_points", [])]
+        way_points.extend(part_way_points if i == 0 else part_way_points[1:])
+        # Parts share their join point, so the next part starts at this one's last index
+        offset += _last_way_point(props)
+
+    merged_props = dict(properties[0], summary=summary, way_points=way_points)
+    if segments:
+        merged_props["segments"] = segments
+    merged_props.pop("extras", None)  # per-part extras summaries cannot be combined
+    bbox = union_bbox([p.get("bbox") for p in parts])
+
+    metadata = copy.deepcopy(results[0].get("metadata", {}))
+    metadata.setdefault("query", {})["coordinates"] = body.get("coordinates")
+    metadata["split_requests"] = len(results)
+
+    if geojson:
+        feature = dict(parts[0], properties=merged_props, bbox=bbox)
+        if geometry is not None:
+            feature["geometry"] = geometry
+        return dict(results[0], features=[feature], bbox=bbox, metadata=metadata)
+    route = dict(merged_props, bbox=bbox)
+    if geometry is not None:
+        route["geometry"] = geometry
+    return dict(results[0], routes=[route], bbox=bbox, metadata=metadata)
+
+
+def merge_isochrones(results, bodies):
+    """Combine isochrone responses, restoring each feature's global group_index"""
+    features = []
+    for result, body in zip(results, bodies):
+        offset = body.get("_location_offset", 0)
+        for feature in result.get("features", []):
+            properties = dict(feature.get("properties", {}))
+            properties["group_index"] = properties.get("group_index", 0) + offset
+            features.append(dict(feature, properties=properties))
+    merged = dict(results[0], features=features, bbox=union_bbox([r.get("bbox") for r in results]))
+    merged.setdefault("metadata", {})["split_requests"] = len(results)
+    return merged
+
+
+def merge_matrix(results, bodies, body):
+    """Reassemble matrix tiles into the full sources x destinations response"""
+    row_starts = sorted({b["_tile"][0] for b in bodies})
+    col_starts = sorted({b["_tile"][1] for b in bodies})
+    tiles = {b["_tile"]: r for b, r in zip(bodies, results)}
+    merged = {"metadata": dict(results[0].get("metadata", {}), split_requests=len(results))}
+    for key in ("durations", "distances"):
+        if key not in results[0]:
+            continue
+        bands = [[tiles[(s, d)][key] for d in col_starts] for s in row_starts]
+        if any(isinstance(cells, np.ndarray) for band in bands for cells in band):
+            # Tiles parsed into NumPy (send(..., arrays=True)); small ones may still be lists
+            merged[key] = np.vstack([np.hstack([np.asarray(cells, dtype=float) for cells in band])
+                                     for band in bands])
+            continue
+        rows = []
+        for band in bands:
+            rows.extend(sum(cells, []) for cells in zip(*band))
+        merged[key] = rows
+    merged["sources"] = sum((tiles[(s, col_starts[0])].get("sources", []) for s in row_starts), [])
+    merged["destinations"] = sum((tiles[(row_starts[0], d)].get("destinations", []) for d in col_starts), [])
+    return merged
+
+
+def send_planned(endpoint, body, send, limits, max_workers=MAX_PARALLEL_SUBREQUESTS, arrays=False):
+    """Plan, send and merge a POST request; send(endpoint, body) -> (result, error)
+
+    arrays=True calls send(endpoint, body, arrays=True) so large matrices
+    come back as NumPy arrays (see ors_parsing.py); the merge keeps them.
+    """
+    options = {"arrays": True} if arrays else {}
+    service = endpoint.split("/")[0]
+    profile = _profile(endpoint)
+    if service == "directions":
+        bodies, error = plan_directions(profile, body, limits)
+    elif service == "isochrones":
+        bodies, error = plan_isochrones(profile, body, limits)
+    elif service == "matrix":
+        bodies, error = plan_matrix(profile, body, limits)
+    else:
+        bodies, error = [body], None
+    if error:
+        return None, error
+    if len(bodies) == 1:
+        return send(endpoint, {k: v for k, v in bodies[0].items() if not k.startswith("_")}, **options)
+
+    def run(sub):
+        return send(endpoint, {k: v for k, v in sub.items() if not k.startswith("_")}, **options)
+
+    with concurrent.futures.ThreadPoolExecutor(min(max_workers, len(bodies))) as pool:
+        outcomes = list(pool.map(run, bodies))
+    for i, (result, error) in enumerate(outcomes):
+        if result is None:
+            return None, f"Sub-request {i + 1}/{len(bodies)} failed: {error}"
+
+    results = [result for result, _ in outcomes]
+    if service == "directions":
+        return merge_directions(results, body), None
+    if service == "isochrones":
+        return merge_isochrones(results, bodies), None
+    return merge_matrix(results, bodies, body), None
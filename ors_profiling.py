@@ -0,0 +1,236 @@
+"""Per-rerun profiling of the Streamlit script.
+
+A rerun is split into sections by mark("directions/results/map") calls;
+each mark closes the previous section, and "/" in the name gives the
+hierarchy the sidebar draws as an icicle (flame-style) chart. Helpers
+decorated with @timed are timed as children of whatever section is open
+when they are called.
+
+Modes, cheapest first:
+
+    off       marks and @timed are a single attribute check
+    timing    perf_counter per mark/call; meant to stay on in production
+    cprofile  cProfile over the whole rerun, with a top-functions table
+              and a .pstats file
+    memory    tracemalloc: allocated and peak memory per section plus the
+              top allocation sites (tracemalloc is process-wide, so
+              concurrent sessions show up in each other's numbers)
+
+ORS_PROFILE_SAMPLE_RATE (default 0) puts that fraction of sessions in
+timing mode from the start. With ORS_PROFILE_DIR set, every profiled
+rerun is appended to <dir>/reruns.jsonl and cProfile runs are dumped
+there as .pstats files.
+"""
+import cProfile
+import functools
+import json
+import marshal
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+PROFILE_MODES = ("off", "timing", "cprofile", "memory")
+SAMPLE_RATE = float(os.environ.get("ORS_PROFILE_SAMPLE_RATE", 0))
+PROFILE_DIR = os.environ.get("ORS_PROFILE_DIR")
+TOP_FUNCTIONS = 25
+TOP_ALLOCATIONS = 15
+
+_current = threading.local()
+
+
+def should_sample(session_id, rate=SAMPLE_RATE):
+    """Stable per-session decision, so a sampled session stays sampled across reruns"""
+    if rate <= 0:
+        return False
+    return int(session_id[:8], 16) / 0xFFFFFFFF < rate
+
+
+class RerunProfiler:
+    """Collects section timings (and optionally cProfile/tracemalloc data) for one rerun"""
+
+    def __init__(self, mode="off", label=None):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profiling mode '{mode}'")
+        self.mode = mode
+        self.active = mode != "off"
+        self.label = label
+        self.started = time.time()
+        self.sections = {}
+        self._section = None
+        self._section_start = None
+        self._profile = None
+        self._started_tracing = False
+        if not self.active:
+            return
+        if mode == "memory":
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            tracemalloc.reset_peak()
+        elif mode == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self._rerun_start = time.perf_counter()
+        self.mark("script")
+
+    def _stats(self, path):
+        return self.sections.setdefault(path, {"path": path, "seconds": 0.0, "calls": 0,
+                                               "alloc_kb": 0.0, "peak_kb": 0.0})
+
+    def _memory(self):
+        return tracemalloc.get_traced_memory() if self.mode == "memory" else (0, 0)
+
+    def mark(self, name):
+        """Close the open section and start `name`"""
+        if not self.active:
+            return
+        now = time.perf_counter()
+        self._close(now)
+        self._section = name
+        self._section_start = now
+        self._section_memory = self._memory()[0]
+        if self.mode == "memory":
+            tracemalloc.reset_peak()
+
+    def _close(self, now):
+        if self._section is None:
+            return
+        stats = self._stats(self._section)
+        stats["seconds"] += now - self._section_start
+        stats["calls"] += 1
+        if self.mode == "memory":
+            current, peak = tracemalloc.get_traced_memory()
+            stats["alloc_kb"] += (current - self._section_memory) / 1024
+            stats["peak_kb"] = max(stats["peak_kb"], (peak - self._section_memory) / 1024)
+
+    def call(self, name, fn, *args, **kwargs):
+        """Time fn as a child of the open section"""
+        path = f"{self._section}/{name}" if self._section else name
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            stats = self._stats(path)
+            stats["seconds"] += time.perf_counter() - start
+            stats["calls"] += 1
+
+    def finish(self):
+        """Stop collecting and return the rerun's profile as a dict (None when off)"""
+        if not self.active:
+            return None
+        now = time.perf_counter()
+        self._close(now)
+        self._section = None
+        profile = {
+            "ts": round(self.started, 3),
+            "label": self.label,
+            "mode": self.mode,
+            "total_s": now - self._rerun_start,
+            "sections": sorted(self.sections.values(), key=lambda s: s["path"]),
+        }
+        if self._profile is not None:
+            self._profile.disable()
+            stats = pstats.Stats(self._profile)
+            profile["top_functions"] = top_functions(stats)
+            if PROFILE_DIR:
+                path = os.path.join(PROFILE_DIR, f"rerun-{int(self.started * 1000)}.pstats")
+                try:
+                    os.makedirs(PROFILE_DIR, exist_ok=True)
+                    stats.dump_stats(path)
+                    profile["pstats_path"] = path
+                except OSError:
+                    pass
+            profile["pstats"] = pstats_bytes(self._profile)
+        if self.mode == "memory":
+            snapshot = tracemalloc.take_snapshot()
+            profile["top_allocations"] = [
+                {"site": str(stat.traceback[0]), "size_kb": round(stat.size / 1024, 1), "blocks": stat.count}
+                for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+            ]
+            if self._started_tracing:
+                tracemalloc.stop()
+        if PROFILE_DIR:
+            _append_rerun(profile)
+        if getattr(_current, "profiler", None) is self:
+            _current.profiler = None
+        return profile
+
+
+def top_functions(stats, limit=TOP_FUNCTIONS):
+    """Most expensive functions by cumulative time"""
+    rows = []
+    for (filename, line, name), (calls, _, total, cumulative, _) in stats.stats.items():
+        rows.append({
+            "function": f"{name} ({os.path.basename(filename)}:{line})",
+            "calls": calls,
+            "own_ms": round(total * 1000, 2),
+            "cumulative_ms": round(cumulative * 1000, 2),
+        })
+    rows.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    return rows[:limit]
+
+
+def pstats_bytes(profile):
+    """Marshalled stats as written by dump_stats, for a download button"""
+    profile.create_stats()
+    return marshal.dumps(profile.stats)
+
+
+def _append_rerun(profile):
+    entry = {k: v for k, v in profile.items() if k != "pstats"}
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(os.path.join(PROFILE_DIR, "reruns.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+    except OSError:
+        pass
+
+
+def start_rerun(mode="off", label=None):
+    """Profiler for the rerun running on this thread"""
+    profiler = RerunProfiler(mode, label)
+    _current.profiler = profiler if profiler.active else None
+    return profiler
+
+
+def mark(name):
+    profiler = getattr(_current, "profiler", None)
+    if profiler is not None:
+        profiler.mark(name)
+
+
+def timed(fn):
+    """Decorator: time calls of fn under the open section when profiling is on"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        profiler = getattr(_current, "profiler", None)
+        if profiler is None:
+            return fn(*args, **kwargs)
+        return profiler.call(fn.__name__, fn, *args, **kwargs)
+    return wrapper
+
+
+def flame_rows(profile):
+    """id/parent/label/ms rows for an icicle chart of a rerun's sections"""
+    values = {"rerun": profile["total_s"] * 1000}
+    for section in profile["sections"]:
+        values[f"rerun/{section['path']}"] = section["seconds"] * 1000
+    for path in list(values):
+        parts = path.split("/")
+        for depth in range(1, len(parts)):
+            values.setdefault("/".join(parts[:depth]), 0.0)
+    # Deepest first, so every parent is at least as long as its children
+    # (sections that were never marked themselves, helpers timed inside one)
+    children = {}
+    for path in sorted(values, key=lambda p: -p.count("/")):
+        values[path] = max(values[path], children.get(path, 0.0))
+        if "/" in path:
+            parent = path.rsplit("/", 1)[0]
+            children[parent] = children.get(parent, 0.0) + values[path]
+    return [
+        {"id": path, "parent": path.rsplit("/", 1)[0] if "/" in path else "",
+         "label": path.rsplit("/", 1)[-1], "ms": round(ms, 2)}
+        for path, ms in sorted(values.items())
+    ]
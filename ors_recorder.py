@@ -0,0 +1,272 @@
+"""Record and replay of upstream ORS traffic.
+
+Recording is opt-in: with ORS_RECORD_FILE set, every upstream HTTP call the
+client makes (including each attempt of a hedged request) is appended to
+that file as one JSON line with its request, response body, status and
+timing. A path ending in .gz is written gzip-compressed. Response bodies
+can be left out with ORS_RECORD_RESPONSES=false; their size and hash are
+always kept so a replay can still tell whether answers changed (the
+volatile "metadata" block is left out of the hash).
+
+The replayer re-issues a captured workload open-loop at the original
+inter-arrival times (or scaled by --speed) against any base URL, e.g. a new
+ORS version, another config, or the local stand-in:
+
+    ORS_RECORD_FILE=traffic.jsonl.gz streamlit run ors_streamlit_app.py
+    python ors_recorder.py replay traffic.jsonl.gz --base-url http://localhost:8080/ors/v2 --speed 2
+    python ors_recorder.py summary traffic.jsonl.gz
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from ors_parsing import json_default, loads
+
+RECORD_RESPONSES = os.environ.get("ORS_RECORD_RESPONSES", "true").lower() in ("1", "true", "yes")
+REPLAY_WORKERS = 64  # upper bound on replayed requests in flight
+
+
+def _open_log(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def body_digest(content):
+    """Hash of a response body that ignores the per-request metadata block
+
+    ORS stamps every answer with a timestamp and query echo under
+    "metadata", so raw bytes never match between two runs.
+    """
+    try:
+        body = loads(content)
+    except ValueError:
+        return hashlib.sha1(content).hexdigest()
+    if isinstance(body, dict):
+        body.pop("metadata", None)
+    return hashlib.sha1(json.dumps(body, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+class Recorder:
+    """Thread-safe append-only JSONL log of upstream calls"""
+
+    def __init__(self, path, record_responses=RECORD_RESPONSES):
+        self.path = path
+        self.record_responses = record_responses
+        self.count = 0
+        self._lock = threading.Lock()
+        # Every record is flushed, so a crash loses at most the line being written
+        self._file = _open_log(path, "a")
+
+    def record(self, base_url, endpoint, method, params, data, started, latency, status_code,
+               content=None, error=None, priority=None, session_id=None):
+        entry = {
+            "ts": round(started, 6),
+            "latency": round(latency, 6),
+            "base_url": base_url,
+            "endpoint": endpoint,
+            "method": method,
+            "params": params,
+            "data": data,
+            "status": status_code,
+            "priority": priority,
+            "session": session_id,
+        }
+        if content is not None:
+            entry["bytes"] = len(content)
+            entry["sha1"] = body_digest(content)
+            if self.record_responses:
+                entry["response"] = content.decode("utf-8", errors="replace")
+        if error is not None and status_code is None:
+            entry["error"] = error
+        line = json.dumps(entry, separators=(",", ":"), default=json_default) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+_recorder = None
+_recorder_path = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder():
+    """Recorder writing to ORS_RECORD_FILE, or None when recording is off"""
+    global _recorder, _recorder_path
+    path = os.environ.get("ORS_RECORD_FILE")
+    if not path:
+        return None
+    with _recorder_lock:
+        if _recorder is None or _recorder_path != path:
+            if _recorder is not None:
+                _recorder.close()
+            _recorder = Recorder(path)
+            _recorder_path = path
+        return _recorder
+
+
+def load_log(path):
+    """Recorded entries in file order"""
+    with _open_log(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def replay(entries, base_url, speed=1.0, workers=REPLAY_WORKERS, timeout=120, on_result=None):
+    """Re-issue recorded calls against base_url at the recorded pacing divided by speed
+
+    speed=0 sends as fast as the worker pool allows. Returns one result dict
+    per entry: recorded vs replayed status/latency, whether the body matched,
+    and how late the request left compared to its schedule.
+    """
+    entries = sorted(entries, key=lambda e: e["ts"])
+    if not entries:
+        return []
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    first = entries[0]["ts"]
+    results = [None] * len(entries)
+
+    def issue(index, entry, scheduled):
+        sent = time.monotonic()
+        url = f"{base_url.rstrip('/')}/{entry['endpoint']}"
+        headers = {"Content-Type": "application/json"}
+        status_code = content = None
+        try:
+            if entry["method"] == "GET":
+                response = session.get(url, params=entry.get("params"), headers=headers, timeout=timeout)
+            else:
+                response = session.post(url, json=entry.get("data"), headers=headers, timeout=timeout)
+            status_code = response.status_code
+            content = response.content
+        except Exception:
+            pass
+        latency = time.monotonic() - sent
+        result = {
+            "index": index,
+            "endpoint": entry["endpoint"],
+            "recorded_status": entry.get("status"),
+            "status": status_code,
+            "recorded_latency": entry.get("latency"),
+            "latency": latency,
+            "lag": sent - scheduled,
+            "body_match": (content is not None and "sha1" in entry and body_digest(content) == entry["sha1"]),
+        }
+        results[index] = result
+        if on_result is not None:
+            on_result(result)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for index, entry in enumerate(entries):
+            scheduled = start + ((entry["ts"] - first) / speed if speed > 0 else 0)
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(issue, index, entry, scheduled)
+    return results
+
+
+def summarize(results):
+    """Per-endpoint recorded vs replayed latency percentiles and mismatch counts"""
+    by_endpoint = {}
+    for result in results:
+        by_endpoint.setdefault(result["endpoint"].split("/")[0], []).append(result)
+    summary = {}
+    for endpoint, rows in sorted(by_endpoint.items()):
+        replayed = np.array([r["latency"] for r in rows if r["status"] is not None])
+        recorded = np.array([r["recorded_latency"] for r in rows if r["recorded_latency"] is not None])
+        summary[endpoint] = {
+            "requests": len(rows),
+            "recorded_p50_ms": _percentile_ms(recorded, 50),
+            "recorded_p95_ms": _percentile_ms(recorded, 95),
+            "replay_p50_ms": _percentile_ms(replayed, 50),
+            "replay_p95_ms": _percentile_ms(replayed, 95),
+            "replay_p99_ms": _percentile_ms(replayed, 99),
+            "status_mismatches": sum(r["status"] != r["recorded_status"] for r in rows),
+            "body_mismatches": sum(not r["body_match"] for r in rows if r["status"] == 200),
+            "max_lag_ms": round(max(r["lag"] for r in rows) * 1000, 1),
+        }
+    return summary
+
+
+def _percentile_ms(values, q):
+    return round(float(np.percentile(values, q)) * 1000, 1) if len(values) else None
+
+
+def log_summary(entries):
+    """What a log contains: calls, duration and rate per endpoint"""
+    entries = list(entries)
+    if not entries:
+        return {}
+    span = max(e["ts"] for e in entries) - min(e["ts"] for e in entries)
+    summary = {}
+    for entry in entries:
+        stats = summary.setdefault(entry["endpoint"], {"requests": 0, "errors": 0, "bytes": 0})
+        stats["requests"] += 1
+        stats["errors"] += entry.get("status") != 200
+        stats["bytes"] += entry.get("bytes", 0)
+    for stats in summary.values():
+        stats["rate_per_s"] = round(stats["requests"] / span, 3) if span else None
+    return summary
+
+
+def _print_table(summary):
+    if not summary:
+        print("No requests")
+        return
+    columns = list(next(iter(summary.values())))
+    width = max(len(name) for name in summary) + 2
+    print(f"{'endpoint':<{width}}" + "".join(f"{c:>18}" for c in columns))
+    for name, stats in summary.items():
+        print(f"{name:<{width}}" + "".join(f"{str(stats[c]):>18}" for c in columns))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay or inspect recorded ORS traffic")
+    commands = parser.add_subparsers(dest="command", required=True)
+    replay_parser = commands.add_parser("replay", help="Re-issue a recorded workload")
+    replay_parser.add_argument("log")
+    replay_parser.add_argument("--base-url", required=True, help="e.g. http://localhost:8080/ors/v2")
+    replay_parser.add_argument("--speed", type=float, default=1.0,
+                               help="Timing scale: 2 replays twice as fast, 0 as fast as possible")
+    replay_parser.add_argument("--workers", type=int, default=REPLAY_WORKERS)
+    replay_parser.add_argument("--endpoint", help="Only replay endpoints starting with this")
+    replay_parser.add_argument("--output", help="Write per-request results as JSONL")
+    summary_parser = commands.add_parser("summary", help="Show what a log contains")
+    summary_parser.add_argument("log")
+    args = parser.parse_args(argv)
+
+    entries = load_log(args.log)
+    if args.command == "summary":
+        _print_table(log_summary(entries))
+        return
+    if args.endpoint:
+        entries = (e for e in entries if e["endpoint"].startswith(args.endpoint))
+    results = replay(list(entries), args.base_url, speed=args.speed, workers=args.workers)
+    if args.output:
+        with open(args.output, "w") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+    _print_table(summarize(results))
+
+
+if __name__ == "__main__":
+    main()
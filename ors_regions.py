@@ -0,0 +1,140 @@
+"""Region-sharded ORS backends and the dispatcher that picks one per request.
+
+Several ORS instances can be built from different extracts, e.g. a small
+Jakarta metro graph that fits in cache and a full Java graph. Each region is
+described by its base URL (or comma-separated replica URLs) and a coverage
+bbox, optionally refined by a polygon. The dispatcher sends a directions,
+matrix or isochrone request to the smallest region that fully contains the
+request's coordinates, padded by how far an isochrone can reach, and falls
+back to the largest region otherwise.
+
+Regions are configured in a JSON (or YAML, if PyYAML is installed) file,
+see ors-docker/config/example-ors-regions.json, and picked up by the client
+when ORS_REGIONS_FILE points at it.
+"""
+import json
+import math
+import os
+import threading
+
+import numpy as np
+
+# Upper bound on travel speed (km/h) per profile, used to turn an isochrone
+# time range into the distance it can possibly cover
+MAX_SPEED_KMH = {"driving-car": 130.0, "driving-hgv": 90.0, "cycling-regular": 35.0, "cycling-road": 50.0,
+                 "cycling-mountain": 35.0, "cycling-electric": 45.0, "foot-walking": 7.0,
+                 "foot-hiking": 7.0, "wheelchair": 7.0}
+METRES_PER_DEGREE = 111320.0
+
+
+class Region:
+    """One ORS instance and the area its graph covers"""
+
+    def __init__(self, name, base_url, bbox, polygon=None):
+        self.name = name
+        self.base_url = base_url
+        self.bbox = [float(v) for v in bbox]
+        self.polygon = np.asarray(polygon, dtype=float) if polygon else None
+        mid_lat = math.radians((self.bbox[1] + self.bbox[3]) / 2)
+        self.area = (self.bbox[2] - self.bbox[0]) * math.cos(mid_lat) * (self.bbox[3] - self.bbox[1])
+
+    def contains(self, lons, lats):
+        """True if every point lies inside the coverage bbox (and polygon)"""
+        inside = ((lons >= self.bbox[0]) & (lons <= self.bbox[2]) &
+                  (lats >= self.bbox[1]) & (lats <= self.bbox[3]))
+        if not inside.all():
+            return False
+        if self.polygon is not None:
+            return bool(points_in_polygon(lons, lats, self.polygon).all())
+        return True
+
+
+def points_in_polygon(lons, lats, polygon):
+    """Vectorized even-odd ray casting of many points against one ring"""
+    x0, y0 = polygon[:, 0], polygon[:, 1]
+    x1, y1 = np.roll(x0, -1), np.roll(y0, -1)
+    px, py = lons[:, None], lats[:, None]
+    crosses = (y0 > py) != (y1 > py)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_cross = x0 + (py - y0) * (x1 - x0) / (y1 - y0)
+    return ((crosses & (px < x_cross)).sum(axis=1) % 2) == 1
+
+
+def request_points(endpoint, data):
+    """Coordinates a request touches and how far (metres) results may extend"""
+    data = data or {}
+    service, _, profile = endpoint.partition("/")
+    profile = profile.split("/")[0]
+    if service == "directions":
+        points = data.get("coordinates", [])
+        reach = 0.0
+    elif service in ("matrix", "snap"):
+        points = data.get("locations", [])
+        reach = 0.0
+    elif service == "isochrones":
+        points = data.get("locations", [])
+        ranges = data.get("range") or [0]
+        if data.get("range_type", "time") == "distance":
+            reach = float(max(ranges))
+        else:
+            reach = float(max(ranges)) * MAX_SPEED_KMH.get(profile, 130.0) / 3.6
+    else:
+        return None, 0.0
+    return np.asarray(points, dtype=float).reshape(-1, 2), reach
+
+
+class RegionDispatcher:
+    """Pick the smallest region that fully contains a request"""
+
+    def __init__(self, regions):
+        # Smallest first, so the first match is the tightest graph
+        self.regions = sorted(regions, key=lambda r: r.area)
+        self.counts = {r.name: 0 for r in self.regions}
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            if path.endswith((".yml", ".yaml")):
+                import yaml
+                config = yaml.safe_load(f)
+            else:
+                config = json.load(f)
+        return cls([Region(r["name"], r["base_url"], r["bbox"], r.get("polygon"))
+                    for r in config["regions"]])
+
+    def resolve(self, endpoint, data):
+        """Region for this request; the largest region if none contains it"""
+        points, reach = request_points(endpoint, data)
+        region = self.regions[-1]
+        if points is not None and len(points):
+            lons, lats = points[:, 0], points[:, 1]
+            if reach:
+                # Pad each point by the reach as an axis-aligned box
+                dlat = reach / METRES_PER_DEGREE
+                dlon = dlat / np.maximum(0.01, np.cos(np.radians(lats)))
+                lons = np.concatenate([lons - dlon, lons + dlon, lons - dlon, lons + dlon])
+                lats = np.concatenate([lats - dlat, lats - dlat, lats + dlat, lats + dlat])
+            for candidate in self.regions:
+                if candidate.contains(lons, lats):
+                    region = candidate
+                    break
+        self.counts[region.name] += 1
+        return region
+
+
+_dispatcher = None
+_dispatcher_path = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """Dispatcher configured by ORS_REGIONS_FILE, or None when unset"""
+    global _dispatcher, _dispatcher_path
+    path = os.environ.get("ORS_REGIONS_FILE")
+    if not path:
+        return None
+    with _dispatcher_lock:
+        if _dispatcher is None or _dispatcher_path != path:
+            _dispatcher = RegionDispatcher.from_file(path)
+            _dispatcher_path = path
+        return _dispatcher
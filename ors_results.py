@@ -0,0 +1,145 @@
+"""Pure helpers that turn stored ORS results into display rows.
+
+They never copy a whole response: tables are produced one page at a time
+and the JSON browser only ever looks at one level of one node, so what the
+Streamlit app sends to the browser per rerun stays bounded no matter how
+large the stored result is.
+"""
+import itertools
+
+MAX_STRING_CHARS = 200  # longer strings are truncated in the JSON browser
+
+
+def normalize_routes(result):
+    """Routes of a directions response and the layout they came in"""
+    if "routes" in result:
+        return result["routes"], "routes"
+    if "features" in result:
+        return result["features"], "features"
+    if isinstance(result, dict):
+        return [result], "single"
+    return [], None
+
+
+def route_parts(route):
+    """(summary, segments, geometry) of a JSON route or GeoJSON feature"""
+    if "properties" in route:
+        properties = route["properties"]
+        return properties.get("summary", {}), properties.get("segments", []), route.get("geometry", {})
+    return route.get("summary", {}), route.get("segments", []), route.get("geometry", {})
+
+
+def count_instruction_rows(segments):
+    return sum(len(segment.get("steps", [])) for segment in segments)
+
+
+def instruction_rows(segments, start=0, stop=None):
+    """Turn-by-turn rows start..stop-1, numbered across all segments"""
+    steps = (step for segment in segments for step in segment.get("steps", []))
+    rows = []
+    for number, step in enumerate(itertools.islice(steps, start, stop), start=start + 1):
+        rows.append({
+            "Step": number,
+            "Instruction": step.get("instruction", "Continue"),
+            "Distance": f"{step.get('distance', 0)/1000:.2f} km",
+            "Duration": f"{step.get('duration', 0)/60:.1f} min"
+        })
+    return rows
+
+
+def isochrone_rows(features, range_type, area_units, start=0, stop=None):
+    """Isochrone summary rows ordered by range value"""
+    ordered = sorted(features, key=lambda f: f["properties"].get("value", 0))
+    rows = []
+    for feature in ordered[start:stop]:
+        props = feature["properties"]
+        range_value = props.get("value", 0)
+        if range_type == "time":
+            range_display = f"{range_value//60} minutes"
+        else:
+            range_display = f"{range_value/1000:.1f} km"
+        center = props.get("center", [0, 0])
+        rows.append({
+            "Range": range_display,
+            "Area": f"{props.get('area', 0):.2f} {area_units}²",
+            "Center": f"({center[1]:.4f}, {center[0]:.4f})"
+        })
+    return rows
+
+
+def format_seconds(seconds):
+    return f"{seconds//3600:02d}:{(seconds%3600)//60:02d}"
+
+
+def vrp_step_rows(steps, vehicle, jobs, start=0, stop=None):
+    """Stop-by-stop rows of one optimized vehicle route"""
+    rows = []
+    for j, step in enumerate(steps[start:stop], start=start):
+        step_type = step.get("type", "unknown")
+        arrival_time = step.get("arrival", 0)
+        departure_time = step.get("departure", arrival_time)
+
+        if step_type == "start":
+            description = "Start from depot"
+            location = vehicle["start"]
+        elif step_type == "job":
+            job_id = step.get("job", 0)
+            description = f"Job {job_id + 1}"
+            location = jobs[job_id]["location"] if job_id < len(jobs) else [0, 0]
+        elif step_type == "end":
+            description = "Return to depot"
+            location = vehicle["end"]
+        else:
+            description = f"Step {j+1}"
+            location = [0, 0]
+
+        rows.append({
+            "Stop": j + 1,
+            "Description": description,
+            "Arrival": format_seconds(arrival_time),
+            "Departure": format_seconds(departure_time),
+            "Location": f"({location[1]:.4f}, {location[0]:.4f})"
+        })
+    return rows
+
+
+def resolve_json_path(root, path):
+    """Node reached by following a list of keys/indices from root"""
+    node = root
+    for key in path:
+        node = node[key]
+    return node
+
+
+def is_container(node):
+    # NumPy arrays from the fast parser count as lists
+    return isinstance(node, (dict, list)) or getattr(node, "ndim", 0) > 0
+
+
+def json_len(node):
+    return len(node) if is_container(node) else 0
+
+
+def json_summary(node):
+    """One-line description of a node without serializing it"""
+    if isinstance(node, dict):
+        return f"{{…}} {len(node)} keys"
+    if isinstance(node, list):
+        return f"[…] {len(node)} items"
+    if getattr(node, "ndim", 0) > 0:
+        return f"array {'×'.join(str(n) for n in node.shape)}"
+    if hasattr(node, "item"):
+        return node.item()
+    if isinstance(node, str) and len(node) > MAX_STRING_CHARS:
+        return node[:MAX_STRING_CHARS] + f"… ({len(node)} chars)"
+    return node
+
+
+def json_children(node, start=0, stop=None):
+    """(key, display value) for one page of a node's children, nested nodes summarized"""
+    if isinstance(node, dict):
+        items = itertools.islice(node.items(), start, stop)
+    else:
+        end = json_len(node) if stop is None else min(stop, json_len(node))
+        items = ((i, node[i]) for i in range(start, end))
+    return [(key, json_summary(value)) for key, value in items]
@@ -0,0 +1,241 @@
+"""Priority scheduling and per-session fairness in front of the ORS client.
+
+Requests are tagged with a priority class and the id of the session (or
+batch job) that issued them. Whenever the concurrency limiter has a free
+slot, the scheduler hands it to the next waiter chosen by weighted fair
+queueing: first across classes (interactive clicks get most of the capacity
+but batch and prefetch work is never starved), then round-robin across the
+sessions inside that class. Sessions that exceed their token bucket are only
+served when no other session in the class is waiting, so one analyst's
+10k-route job cannot crowd out everyone else.
+
+Per-session state (virtual time, token bucket) of sessions with nothing
+queued for SESSION_IDLE_TTL seconds is dropped, so a long-running server
+does not keep an entry for every session it has ever seen. By then the
+bucket would be full again anyway, and a returning session starts at the
+current virtual time like any newcomer.
+"""
+import collections
+import threading
+import time
+
+from ors_concurrency import get_limiter
+
+PRIORITY_CLASSES = ("interactive", "batch", "prefetch")
+DEFAULT_CLASS_WEIGHTS = {"interactive": 16, "batch": 4, "prefetch": 1}
+# Requests per second (and burst) each session may issue before being deprioritized
+DEFAULT_SESSION_RATES = {"interactive": (5.0, 20), "batch": (10.0, 20), "prefetch": (2.0, 10)}
+
+WAIT_SAMPLES = 1000  # recent wait times kept per class for the metrics
+SESSION_IDLE_TTL = 600  # seconds without requests before a session's state is dropped
+PRUNE_INTERVAL = 60  # seconds between sweeps for idle sessions
+
+
+class TokenBucket:
+    """Classic token bucket refilled at `rate` tokens per second"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def has_token(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens >= 1
+
+    def take(self, now):
+        if self.has_token(now):
+            self.tokens -= 1
+            return True
+        return False
+
+
+class _Waiter:
+    __slots__ = ("priority", "session_id", "enqueued", "token", "event")
+
+    def __init__(self, priority, session_id):
+        self.priority = priority
+        self.session_id = session_id
+        self.enqueued = time.monotonic()
+        self.token = None
+        self.event = threading.Event()
+
+
+class RequestScheduler:
+    """Weighted fair queue of ORS requests feeding the concurrency limiter"""
+
+    def __init__(self, limiter=None, class_weights=None, session_rates=None):
+        self.limiter = limiter or get_limiter()
+        self.class_weights = dict(DEFAULT_CLASS_WEIGHTS, **(class_weights or {}))
+        self.session_rates = dict(DEFAULT_SESSION_RATES, **(session_rates or {}))
+
+        self._lock = threading.Lock()
+        # class -> session_id -> deque of waiters, in arrival order
+        self._queues = {cls: collections.OrderedDict() for cls in PRIORITY_CLASSES}
+        self._class_vtime = {cls: 0.0 for cls in PRIORITY_CLASSES}
+        self._session_vtime = {cls: {} for cls in PRIORITY_CLASSES}
+        self._buckets = {}
+        self._last_seen = {}  # (class, session_id) -> monotonic time of its last request
+        self._last_prune = time.monotonic()
+        self._stats = {
+            cls: {"enqueued": 0, "served": 0, "timeouts": 0,
+                  "waits": collections.deque(maxlen=WAIT_SAMPLES)}
+            for cls in PRIORITY_CLASSES
+        }
+
+    def acquire(self, priority="interactive", session_id=None, timeout=None):
+        """Block until this request may be sent; returns a limiter token"""
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority class: {priority}")
+        waiter = _Waiter(priority, session_id or "anonymous")
+        deadline = None if timeout is None else waiter.enqueued + timeout
+
+        with self._lock:
+            self._enqueue(waiter)
+        self._dispatch()
+
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                with self._lock:
+                    if waiter.token is None:
+                        self._remove(waiter)
+                        self._stats[priority]["timeouts"] += 1
+                        raise TimeoutError("Timed out waiting for an ORS request slot")
+                return waiter.token
+            # Wake up periodically in case capacity grew without a release
+            if waiter.event.wait(0.5 if remaining is None else min(0.5, remaining)):
+                return waiter.token
+            self._dispatch()
+
+    def release(self, token, status_code=None, failed=False):
+        """Return the slot to the limiter and hand it to the next waiter"""
+        latency = self.limiter.release(token, status_code=status_code, failed=failed)
+        self._dispatch()
+        return latency
+
+    def _enqueue(self, waiter):
+        sessions = self._queues[waiter.priority]
+        if not any(sessions.values()):
+            # A class (re)joining the competition starts at the current virtual
+            # time instead of cashing in credit from when it was idle
+            active = [self._class_vtime[c] for c in PRIORITY_CLASSES if any(self._queues[c].values())]
+            if active:
+                self._class_vtime[waiter.priority] = max(self._class_vtime[waiter.priority], min(active))
+        if not sessions.get(waiter.session_id):
+            vtimes = self._session_vtime[waiter.priority]
+            active = [vtimes[s] for s, q in sessions.items() if q]
+            vtimes[waiter.session_id] = max(vtimes.get(waiter.session_id, 0.0), min(active) if active else 0.0)
+        sessions.setdefault(waiter.session_id, collections.deque()).append(waiter)
+        self._stats[waiter.priority]["enqueued"] += 1
+        self._last_seen[(waiter.priority, waiter.session_id)] = waiter.enqueued
+        if waiter.enqueued - self._last_prune > PRUNE_INTERVAL:
+            self._prune_idle(waiter.enqueued)
+
+    def _prune_idle(self, now):
+        """Forget sessions that have been idle (nothing queued) for SESSION_IDLE_TTL"""
+        self._last_prune = now
+        for key, seen in list(self._last_seen.items()):
+            cls, session_id = key
+            if now - seen > SESSION_IDLE_TTL and not self._queues[cls].get(session_id):
+                del self._last_seen[key]
+                self._session_vtime[cls].pop(session_id, None)
+                self._buckets.pop(key, None)
+
+    def _remove(self, waiter):
+        queue = self._queues[waiter.priority].get(waiter.session_id)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[waiter.priority][waiter.session_id]
+
+    def _bucket(self, priority, session_id):
+        key = (priority, session_id)
+        if key not in self._buckets:
+            rate, burst = self.session_rates[priority]
+            self._buckets[key] = TokenBucket(rate, burst)
+        return self._buckets[key]
+
+    def _next_waiter(self):
+        active = [c for c in PRIORITY_CLASSES if any(self._queues[c].values())]
+        if not active:
+            return None
+        cls = min(active, key=lambda c: (self._class_vtime[c], PRIORITY_CLASSES.index(c)))
+        self._class_vtime[cls] += 1.0 / self.class_weights[cls]
+
+        now = time.monotonic()
+        sessions = [s for s, q in self._queues[cls].items() if q]
+        vtimes = self._session_vtime[cls]
+        within_budget = [s for s in sessions if self._bucket(cls, s).has_token(now)]
+        session_id = min(within_budget or sessions, key=lambda s: vtimes[s])
+        self._bucket(cls, session_id).take(now)
+        vtimes[session_id] += 1.0
+
+        queue = self._queues[cls][session_id]
+        waiter = queue.popleft()
+        if not queue:
+            del self._queues[cls][session_id]
+        return waiter
+
+    def _dispatch(self):
+        with self._lock:
+            while any(any(q.values()) for q in self._queues.values()):
+                token = self.limiter.try_acquire()
+                if token is None:
+                    break
+                waiter = self._next_waiter()
+                waiter.token = token
+                stats = self._stats[waiter.priority]
+                stats["served"] += 1
+                stats["waits"].append(time.monotonic() - waiter.enqueued)
+                waiter.event.set()
+
+    def metrics(self):
+        """Queue depth and wait-time statistics per priority class"""
+        with self._lock:
+            result = {}
+            for cls in PRIORITY_CLASSES:
+                stats = self._stats[cls]
+                waits = sorted(stats["waits"])
+                result[cls] = {
+                    "queue_depth": sum(len(q) for q in self._queues[cls].values()),
+                    "waiting_sessions": sum(1 for q in self._queues[cls].values() if q),
+                    "enqueued": stats["enqueued"],
+                    "served": stats["served"],
+                    "timeouts": stats["timeouts"],
+                    "wait_mean_ms": round(1000 * sum(waits) / len(waits), 1) if waits else 0.0,
+                    "wait_p95_ms": round(1000 * waits[int(0.95 * (len(waits) - 1))], 1) if waits else 0.0,
+                }
+            return result
+
+    def prometheus_metrics(self):
+        """Render metrics() in the Prometheus text exposition format"""
+        lines = []
+        for name, help_text in [
+            ("queue_depth", "Requests waiting for a slot"),
+            ("served", "Requests granted a slot"),
+            ("timeouts", "Requests that gave up waiting"),
+            ("wait_mean_ms", "Mean queue wait over recent requests"),
+            ("wait_p95_ms", "95th percentile queue wait over recent requests"),
+        ]:
+            metric = f"ors_client_scheduler_{name}"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {'counter' if name in ('served', 'timeouts') else 'gauge'}")
+            for cls, values in self.metrics().items():
+                lines.append(f'{metric}{{priority="{cls}"}} {values[name]}')
+        return "\n".join(lines) + "\n"
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Return the process-wide scheduler"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+        return _scheduler
@@ -0,0 +1,152 @@
+"""Per-request timing waterfall and the slow-query log.
+
+Every upstream call made through ors_client gets a RequestTrace with the
+time spent in each phase:
+
+    queue     waiting for a scheduler/limiter slot
+    connect   opening the TCP (and TLS) connection; 0 on a reused one
+    ttfb      request sent until response headers arrive (server compute)
+    transfer  reading the response body
+    parse     decoding the body (dict or NumPy path)
+    render    drawing the result in the app, when there is one
+
+Traces whose total exceeds ORS_SLOW_QUERY_MS (default 2000) are kept in
+memory for the diagnostics panel and, when ORS_SLOW_LOG_FILE is set,
+appended with the full request and the waterfall to that file. Request
+bodies carry coordinates, so nothing is written to disk by default. A slow
+ttfb points at the backend (CH preparation, graph size); slow transfer or
+parse at response size; slow render at the app.
+"""
+import collections
+import json
+import os
+import threading
+import time
+import uuid
+
+from ors_parsing import json_default
+
+PHASES = ("queue", "connect", "ttfb", "transfer", "parse", "render")
+SLOW_QUERY_MS = float(os.environ.get("ORS_SLOW_QUERY_MS", 2000))
+SLOW_LOG_FILE = os.environ.get("ORS_SLOW_LOG_FILE") or None  # None keeps slow queries in memory only
+RECENT_ENTRIES = 200  # slow queries kept in memory for the panel
+
+
+class RequestTrace:
+    """Timing of one client request, filled in phase by phase"""
+
+    def __init__(self, endpoint, method, params=None, data=None, priority=None, session_id=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self.endpoint = endpoint
+        self.method = method
+        self.params = params
+        self.data = data
+        self.priority = priority
+        self.session_id = session_id
+        self.base_url = None
+        self.status = None
+        self.error = None
+        self.bytes = None
+        self.phases = dict.fromkeys(PHASES, 0.0)
+
+    def add_attempt(self, base_url, phases, status, error, size):
+        """Network phases of one upstream attempt; the first answer wins under hedging"""
+        if self.base_url is not None and self.status == 200:
+            return
+        self.base_url = base_url
+        self.status = status
+        self.error = error
+        self.bytes = size
+        self.phases.update(phases)
+
+    @property
+    def total(self):
+        return sum(self.phases.values())
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "ts": round(self.started, 3),
+            "endpoint": self.endpoint,
+            "method": self.method,
+            "base_url": self.base_url,
+            "status": self.status,
+            "error": self.error,
+            "bytes": self.bytes,
+            "priority": self.priority,
+            "session": self.session_id,
+            "total_ms": round(self.total * 1000, 1),
+            "phases_ms": {phase: round(seconds * 1000, 1) for phase, seconds in self.phases.items()},
+            "params": self.params,
+            "data": self.data,
+        }
+
+
+class SlowQueryLog:
+    """Append-only JSONL log of traces slower than a threshold"""
+
+    def __init__(self, path=SLOW_LOG_FILE, threshold_ms=SLOW_QUERY_MS):
+        self.path = path
+        self.threshold_ms = threshold_ms
+        self.observed = 0
+        self.recent = collections.deque(maxlen=RECENT_ENTRIES)
+        self._lock = threading.Lock()
+
+    def observe(self, trace):
+        """Log the trace if it was slow; returns whether it was"""
+        self.observed += 1
+        if trace.total * 1000 < self.threshold_ms:
+            return False
+        entry = trace.to_dict()
+        line = json.dumps(entry, separators=(",", ":"), default=json_default) + "\n"
+        with self._lock:
+            self.recent.append(entry)
+            if self.path is None:
+                return True
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError:
+                # The in-memory copy still reaches the panel
+                pass
+        return True
+
+    def finish(self, traces, render=0.0):
+        """Attribute render time to the traces behind one displayed result and log them"""
+        for trace in traces:
+            trace.phases["render"] = render
+            self.observe(trace)
+
+    def entries(self):
+        """Recent slow queries, newest first"""
+        with self._lock:
+            return list(reversed(self.recent))
+
+
+def load_slow_log(path=SLOW_LOG_FILE):
+    """Entries of a slow-query log file in file order"""
+    entries = []
+    if path is None:
+        return entries
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entries.append(json.loads(line))
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+_slow_log = None
+_slow_log_lock = threading.Lock()
+
+
+def get_slow_log():
+    """Return the process-wide slow-query log"""
+    global _slow_log
+    with _slow_log_lock:
+        if _slow_log is None:
+            _slow_log = SlowQueryLog()
+        return _slow_log
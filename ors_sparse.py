@@ -0,0 +1,289 @@
+"""Sparse k-nearest-neighbour duration/distance matrices for very large VRPs.
+
+A full matrix over a 20,000-stop day is 400 million cells, far beyond what
+ORS (or memory) can take. Good routes almost never jump between far-apart
+stops, so the solvers only need each stop's k nearest candidates:
+
+1. the k nearest stops by great-circle distance are found with a KD-tree
+   over unit vectors on the sphere (chord length orders points exactly like
+   haversine distance), using SciPy's cKDTree when installed and a chunked
+   NumPy search otherwise,
+2. stops are ordered along a space-filling curve and grouped so that each
+   group's sources times the union of their neighbours stays within the
+   matrix endpoint's maximum_routes; each group is one legal
+   sources x destinations request, sent concurrently,
+3. the k cells per stop are kept in compressed sparse row (CSR) form:
+   row i's neighbours are indices[indptr[i]:indptr[i + 1]], nearest first,
+   with the matching durations and distances in the same slice.
+
+Upstream cells grow as N x k times a small overlap factor instead of N^2.
+
+Straight-line neighbours are not always the nearest by road (rivers, toll
+roads, one-way grids). With landmark bounds (see ors_landmarks.py) a second
+pass looks further, at CANDIDATE_FACTOR x k straight-line neighbours: the
+ones whose lower bound already exceeds the stop's k-th nearest travel time
+from the first pass cannot get in and are dropped without a request, and
+the k nearest by travel time over both passes are kept.
+
+    python ors_sparse.py --base-url http://localhost:8080/ors/v2 \\
+        --locations stops.csv --k 20 --output stops_k20.npz
+"""
+import argparse
+import concurrent.futures
+import json
+import time
+
+import numpy as np
+
+from ors_client import send_request
+from ors_geometry import as_lonlat_array
+from ors_planner import DEFAULT_ENDPOINT_LIMITS, MAX_PARALLEL_SUBREQUESTS, get_limits, send_planned
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # optional speed-up
+    cKDTree = None
+
+DEFAULT_K = 20
+CANDIDATE_FACTOR = 3  # straight-line pool per stop, as a multiple of k, when pruning with landmarks
+KNN_CHUNK = 2048  # rows per block in the NumPy neighbour search
+CURVE_BITS = 16  # resolution of the Hilbert ordering per axis
+
+
+def unit_vectors(coordinates):
+    """[lon, lat] points as (n, 3) unit vectors on the sphere"""
+    points = np.radians(as_lonlat_array(coordinates))
+    lon, lat = points[:, 0], points[:, 1]
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def nearest_neighbours(coordinates, k):
+    """(n, k) indices of each point's k nearest other points, nearest first"""
+    xyz = unit_vectors(coordinates)
+    n = len(xyz)
+    k = min(k, n - 1)
+    if k <= 0:
+        return np.empty((n, 0), dtype=np.int64)
+    if cKDTree is not None:
+        _, neighbours = cKDTree(xyz).query(xyz, k=k + 1)
+        neighbours = np.asarray(neighbours).reshape(n, k + 1)
+    else:
+        neighbours = np.empty((n, k + 1), dtype=np.int64)
+        for start in range(0, n, KNN_CHUNK):
+            block = xyz[start:start + KNN_CHUNK]
+            # Largest dot product = smallest chord = nearest
+            similarity = block @ xyz.T
+            top = np.argpartition(-similarity, k, axis=1)[:, :k + 1]
+            order = np.argsort(-np.take_along_axis(similarity, top, axis=1), axis=1)
+            neighbours[start:start + len(block)] = np.take_along_axis(top, order, axis=1)
+    # Drop each point itself (usually column 0, but duplicates can reorder ties)
+    rows = []
+    for i, row in enumerate(neighbours):
+        row = row[row != i]
+        rows.append(row[:k])
+    return np.asarray(rows, dtype=np.int64)
+
+
+def hilbert_order(coordinates, bits=CURVE_BITS):
+    """Indices that visit the points along a Hilbert curve over their bbox"""
+    points = as_lonlat_array(coordinates)
+    span = np.maximum(points.max(axis=0) - points.min(axis=0), 1e-12)
+    scaled = ((points - points.min(axis=0)) / span * ((1 << bits) - 1)).astype(np.int64)
+    x, y = scaled[:, 0], scaled[:, 1]
+    side = 1 << bits
+    d = np.zeros(len(points), dtype=np.int64)
+    s = side >> 1
+    while s > 0:
+        rx = ((x & s) > 0).astype(np.int64)
+        ry = ((y & s) > 0).astype(np.int64)
+        d += s * s * ((3 * rx) ^ ry)
+        # Rotate the quadrant so the curve stays continuous
+        flip = ry == 0
+        mirror = flip & (rx == 1)
+        x = np.where(mirror, side - 1 - x, x)
+        y = np.where(mirror, side - 1 - y, y)
+        x, y = np.where(flip, y, x), np.where(flip, x, y)
+        s >>= 1
+    return np.argsort(d, kind="stable")
+
+
+def plan_tiles(candidates, order, max_routes):
+    """Group sources (in curve order) into (sources, destinations) tiles within max_routes"""
+    tiles = []
+    sources, destinations = [], set()
+    for i in order:
+        merged = destinations.union(candidates[i].tolist())
+        if sources and (len(sources) + 1) * len(merged) > max_routes:
+            tiles.append((sources, sorted(destinations)))
+            sources, merged = [], set(candidates[i].tolist())
+        sources.append(int(i))
+        destinations = merged
+    if sources:
+        tiles.append((sources, sorted(destinations)))
+    return tiles
+
+
+class SparseMatrix:
+    """k-nearest-neighbour matrix in CSR form (indptr, indices, one data array per metric)"""
+
+    def __init__(self, indptr, indices, data, stats=None):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.stats = stats or {}
+
+    @property
+    def shape(self):
+        return (len(self.indptr) - 1, len(self.indptr) - 1)
+
+    @property
+    def nnz(self):
+        return len(self.indices)
+
+    def row(self, i, metric="duration"):
+        """(neighbour indices, values) of one stop"""
+        span = slice(self.indptr[i], self.indptr[i + 1])
+        return self.indices[span], self.data[metric][span]
+
+    def get(self, i, j, metric="duration"):
+        """Value of cell (i, j), or NaN when it is not among i's neighbours"""
+        indices, values = self.row(i, metric)
+        hit = np.nonzero(indices == j)[0]
+        return float(values[hit[0]]) if len(hit) else np.nan
+
+    def to_scipy(self, metric="duration"):
+        """scipy.sparse.csr_matrix of one metric (needs SciPy)"""
+        from scipy.sparse import csr_matrix
+        return csr_matrix((self.data[metric], self.indices, self.indptr), shape=self.shape)
+
+    def save(self, path):
+        np.savez_compressed(path, indptr=self.indptr, indices=self.indices,
+                            **{f"data_{metric}": values for metric, values in self.data.items()},
+                            stats=json.dumps(self.stats))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            data = {name[len("data_"):]: f[name] for name in f.files if name.startswith("data_")}
+            return cls(f["indptr"], f["indices"], data, json.loads(str(f["stats"])))
+
+
+def _fetch_rows(points, rows, order, profile, send, limits, metrics, max_workers):
+    """Fetch the cells source -> rows[source] for every source; returns (values, tiles, error)"""
+    max_routes = (limits or {}).get("matrix", DEFAULT_ENDPOINT_LIMITS["matrix"])["maximum_routes"]
+    tiles = plan_tiles(rows, [i for i in order if len(rows[i])], max_routes)
+    values = {metric: [np.empty(0)] * len(points) for metric in metrics}
+
+    def fetch(tile):
+        sources, destinations = tile
+        ids = sorted(set(sources) | set(destinations))
+        local = {stop: index for index, stop in enumerate(ids)}
+        body = {"locations": points[ids].tolist(), "sources": [local[s] for s in sources],
+                "destinations": [local[d] for d in destinations], "metrics": list(metrics)}
+        return send_planned(f"matrix/{profile}", body, send, limits or {}, arrays=True)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as pool:
+        outcomes = list(pool.map(fetch, tiles))
+    for (sources, destinations), (result, error) in zip(tiles, outcomes):
+        if result is None:
+            return None, tiles, error
+        cells = {metric: np.array(result[f"{metric}s"], dtype=float) for metric in metrics}  # null -> NaN
+        for row, source in enumerate(sources):
+            # Every source's candidates are among the tile's (sorted) destinations
+            columns = np.searchsorted(destinations, rows[source])
+            for metric in metrics:
+                values[metric][source] = cells[metric][row, columns]
+    return values, tiles, None
+
+
+def build_sparse_matrix(coordinates, profile, send, limits=None, k=DEFAULT_K, metrics=("duration", "distance"),
+                        max_workers=MAX_PARALLEL_SUBREQUESTS, landmarks=None):
+    """Fetch each stop's k nearest cells from ORS; returns (SparseMatrix, error)
+
+    landmarks (an ors_landmarks.Landmarks over the same coordinates) adds a
+    second pass over a wider straight-line pool, fetching only candidates
+    whose lower bound beats the k-th nearest travel time found so far.
+    """
+    started = time.perf_counter()
+    points = as_lonlat_array(coordinates)
+    n = len(points)
+    pool = nearest_neighbours(points, k * CANDIDATE_FACTOR if landmarks is not None else k)
+    k = min(k, n - 1)
+    order = hilbert_order(points) if n else np.empty(0, np.int64)
+    candidates = list(pool[:, :k])
+    prefilter_s = time.perf_counter() - started
+
+    values, tiles, error = _fetch_rows(points, candidates, order, profile, send, limits, metrics, max_workers)
+    if error:
+        return None, error
+    cells_fetched = sum(len(s) * len(d) for s, d in tiles)
+    requests = len(tiles)
+
+    pruned = 0
+    if landmarks is not None and pool.shape[1] > k:
+        # The k-th nearest travel time so far bounds what the rest of the pool must beat
+        kth = np.array([np.sort(row)[k - 1] if len(row) >= k else np.inf for row in values[metrics[0]]])
+        kth = np.where(np.isnan(kth), np.inf, kth)
+        extra = landmarks.prune(np.arange(n), pool[:, k:], threshold=kth)
+        pruned = int(pool[:, k:].size - sum(len(row) for row in extra))
+        more, tiles, error = _fetch_rows(points, extra, order, profile, send, limits, metrics, max_workers)
+        if error:
+            return None, error
+        cells_fetched += sum(len(s) * len(d) for s, d in tiles)
+        requests += len(tiles)
+        candidates = [np.concatenate((candidates[i], extra[i])) for i in range(n)]
+        for metric in metrics:
+            values[metric] = [np.concatenate((values[metric][i], more[metric][i])) for i in range(n)]
+
+    # Keep the k nearest by travel time (NaN, i.e. unroutable, sorts last)
+    keep = [np.argsort(row, kind="stable")[:k] for row in values[metrics[0]]]
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(chosen) for chosen in keep])
+    indices = np.concatenate([candidates[i][chosen] for i, chosen in enumerate(keep)] or [np.empty(0, np.int64)])
+    data = {metric: np.concatenate([values[metric][i][chosen] for i, chosen in enumerate(keep)] or [np.empty(0)])
+            for metric in metrics}
+    stats = {"stops": n, "k": k, "tiles": requests, "landmarks": landmarks is not None, "pruned": pruned,
+             "cells_fetched": int(cells_fetched), "full_matrix_cells": n * n,
+             "prefilter_s": round(prefilter_s, 3), "total_s": round(time.perf_counter() - started, 3)}
+    return SparseMatrix(indptr, indices, data, stats), None
+
+
+def load_locations(path):
+    """[lon, lat] stops from a JSON list or a CSV with lon,lat columns"""
+    if path.endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            return as_lonlat_array(json.load(f))
+    return np.loadtxt(path, delimiter=",", skiprows=1, usecols=(0, 1), ndmin=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a sparse k-nearest-neighbour ORS matrix")
+    parser.add_argument("--base-url", required=True)
+    parser.add_argument("--locations", required=True, help="JSON list of [lon, lat] or CSV with lon,lat")
+    parser.add_argument("--profile", default="driving-car")
+    parser.add_argument("-k", "--k", type=int, default=DEFAULT_K, help="Neighbours kept per stop")
+    parser.add_argument("--landmarks", help="Landmarks .npz from ors_landmarks.py over the same locations, "
+                                            "to pick neighbours by travel time")
+    parser.add_argument("--output", required=True, help="Output .npz file")
+    args = parser.parse_args(argv)
+
+    def send(endpoint, body, arrays=False):
+        return send_request(args.base_url, endpoint, data=body, method="POST", priority="batch", arrays=arrays)
+
+    landmarks = None
+    if args.landmarks:
+        from ors_landmarks import Landmarks
+        landmarks = Landmarks.load(args.landmarks)
+    matrix, error = build_sparse_matrix(load_locations(args.locations), args.profile, send,
+                                        get_limits(args.base_url), k=args.k, landmarks=landmarks)
+    if error:
+        parser.exit(1, f"Matrix failed: {error}\n")
+    matrix.save(args.output)
+    stats = matrix.stats
+    print(f"{stats['stops']} stops, k={stats['k']}: {stats['cells_fetched']:,} cells in {stats['tiles']} requests "
+          f"({stats['cells_fetched'] / stats['full_matrix_cells']:.2%} of the full matrix), "
+          f"{stats['total_s']:.1f}s -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -46,6 +46,27 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import numpy as np
+import time
+import uuid
+
+from ors_backends import get_pool, parse_base_urls
+from ors_client import send_request
+from ors_concurrency import get_limiter
+from ors_export import FORMATS, available_formats, export_bytes
+from ors_hydration import hydrate_routes
+from ors_legs import get_leg_cache, send_directions
+from ors_maps import add_markers_to_map, add_route_to_map, create_map, to_latlon
+from ors_matrix import LocationMatrix, attach_matrices
+from ors_planner import get_limits, send_planned
+from ors_profiling import PROFILE_MODES, flame_rows, mark, should_sample, start_rerun, timed
+from ors_results import (
+    count_instruction_rows, instruction_rows, is_container, isochrone_rows, json_children,
+    json_len, json_summary, normalize_routes, resolve_json_path, route_parts, vrp_step_rows
+)
+from ors_regions import get_dispatcher
+from ors_scheduler import get_scheduler
+from ors_slowlog import PHASES, get_slow_log
+from ors_surrogate import get_surrogate
 
 # Page configuration
 st.set_page_config(
@@ -58,23 +79,39 @@ st.set_page_config(
 # Initialize session state
 if 'base_url' not in st.session_state:
     st.session_state.base_url = "http://localhost:8080/ors/v2"
+if 'client_session_id' not in st.session_state:
+    # Identifies this browser session to the shared request scheduler
+    st.session_state.client_session_id = uuid.uuid4().hex
+if 'profiling_mode' not in st.session_state:
+    # A sampled fraction of sessions is profiled from the start (ORS_PROFILE_SAMPLE_RATE)
+    st.session_state.profiling_mode = "timing" if should_sample(st.session_state.client_session_id) else "off"
+profiler = start_rerun(st.session_state.profiling_mode, label=st.session_state.client_session_id)
 
 # Sidebar configuration
+mark("sidebar")
 st.sidebar.title("🗺️ ORS Configuration")
 base_url = st.sidebar.text_input(
     "ORS Base URL",
     value=st.session_state.base_url,
-    help="Your local ORS instance URL"
+    help="Your local ORS instance URL. Separate several replica URLs with commas to load-balance across them."
 )
 st.session_state.base_url = base_url
+backend_urls = parse_base_urls(base_url)
+hedge_requests = False
+if len(backend_urls) > 1:
+    hedge_requests = st.sidebar.checkbox(
+        "Hedge slow requests",
+        value=False,
+        help="Re-send a request to a second replica when it takes longer than the recent p95 latency"
+    )
 
 # Function to get available profiles from ORS
+@timed
 def get_available_profiles():
     """Get available profiles from ORS backend"""
     try:
-        response = requests.get(f"{base_url}/status", timeout=5)
-        if response.status_code == 200:
-            status_data = response.json()
+        status_data, error = send_request(base_url, "status", timeout=5, session_id=st.session_state.client_session_id)
+        if status_data:
             profiles = []
             
             # Extract profile names from the status response
@@ -102,58 +139,118 @@ st.sidebar.info(f"Total: {len(PROFILES)} profile(s)")
 # Rest of your existing code continues here...
 
 # Helper functions
-def make_request(endpoint, params=None, data=None, method="GET"):
+def make_request(endpoint, params=None, data=None, method="GET", priority="interactive", traces=None):
     """Make request to ORS API"""
-    url = f"{base_url}/{endpoint}"
-    headers = {"Content-Type": "application/json"}
+    # Goes through the shared client so all sessions respect one concurrency limit
+    return send_request(
+        base_url, endpoint, params=params, data=data, method=method,
+        priority=priority, session_id=st.session_state.client_session_id, hedge=hedge_requests, traces=traces
+    )
+
+def make_sender(priority="interactive", traces=None):
+    """Request function that is safe to call from the planner's worker threads"""
+    # Session state is not available off the script thread, so capture it here
+    session_id = st.session_state.client_session_id
     
-    try:
-        if method == "GET":
-            response = requests.get(url, params=params, headers=headers)
-        else:
-            response = requests.post(url, json=data, headers=headers)
-        
-        if response.status_code == 200:
-            return response.json(), None
-        else:
-            return None, f"Error {response.status_code}: {response.text}"
-    except Exception as e:
-        return None, str(e)
+    def send(endpoint, data, arrays=False):
+        return send_request(
+            base_url, endpoint, data=data, method="POST",
+            priority=priority, session_id=session_id, hedge=hedge_requests, traces=traces, arrays=arrays
+        )
+    return send
+
+def get_location_matrix(profile):
+    """This session's matrix for a profile, shared by the TSP and VRP forms"""
+    # Kept across reruns so adding a stop only fetches its row and column
+    matrices = st.session_state.setdefault("location_matrices", {})
+    if profile not in matrices:
+        matrices[profile] = LocationMatrix(profile)
+    return matrices[profile]
+
+def finish_traces(key, render_started=None):
+    """Hand the request traces behind a freshly calculated result to the slow-query log"""
+    traces = st.session_state.pop(key, None)
+    if traces:
+        render = time.perf_counter() - render_started if render_started is not None else 0.0
+        get_slow_log().finish(traces, render)
 
-def create_map(center=[52.520008, 13.404954], zoom=14):
-    """Create a folium map"""
-    m = folium.Map(location=center, zoom_start=zoom)
-    return m
+TABLE_PAGE_SIZE = 50  # rows per page in result tables
+JSON_PAGE_SIZE = 50  # children per page in the response browser
 
-def add_markers_to_map(m, coordinates, labels=None, colors=None):
-    """Add markers to map"""
-    if not labels:
-        labels = [f"Point {i+1}" for i in range(len(coordinates))]
-    if not colors:
-        colors = ['red', 'blue', 'green', 'purple', 'orange'] * (len(coordinates) // 5 + 1)
+@timed
+def render_paginated_table(row_count, page_rows, key, page_size=TABLE_PAGE_SIZE):
+    """Show a table one page at a time; page_rows(start, stop) builds only that page"""
+    start = 0
+    if row_count > page_size:
+        pages = (row_count + page_size - 1) // page_size
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=f"{key}_page")
+        start = (page - 1) * page_size
+        st.caption(f"Rows {start + 1}-{min(start + page_size, row_count)} of {row_count}")
+    st.dataframe(pd.DataFrame(page_rows(start, start + page_size)), use_container_width=True, hide_index=True)
+
+@timed
+def render_json_lazily(data, key):
+    """Browse a response one node and one page at a time, only once asked to"""
+    if not st.checkbox("Load response", key=f"{key}_load"):
+        st.caption("The response is only sent to the browser when loaded.")
+        return
+    
+    path_key = f"{key}_path"
+    if path_key not in st.session_state:
+        st.session_state[path_key] = []
+    path = st.session_state[path_key]
+    try:
+        node = resolve_json_path(data, path)
+    except (KeyError, IndexError, TypeError):
+        path.clear()
+        node = data
     
-    for i, (coord, label) in enumerate(zip(coordinates, labels)):
-        folium.Marker(
-            location=[coord[1], coord[0]],  # lat, lon
-            popup=label,
-            icon=folium.Icon(color=colors[i % len(colors)])
-        ).add_to(m)
-    return m
+    st.caption("root" + "".join(f" › {p}" for p in path))
+    if path and st.button("⬆️ Up", key=f"{key}_up"):
+        path.pop()
+        st.rerun()
+    if not is_container(node):
+        st.write(json_summary(node))
+        return
+    
+    size = json_len(node)
+    start = 0
+    if size > JSON_PAGE_SIZE:
+        pages = (size + JSON_PAGE_SIZE - 1) // JSON_PAGE_SIZE
+        page = st.number_input(
+            f"Page (of {pages})", min_value=1, max_value=pages, value=1,
+            key=f"{key}_page_{'/'.join(map(str, path))}"
+        )
+        start = (page - 1) * JSON_PAGE_SIZE
+    children = json_children(node, start, start + JSON_PAGE_SIZE)
+    st.json({str(k): v for k, v in children})
+    
+    nested = [k for k, _ in children if is_container(node[k])]
+    if nested:
+        col_child, col_open = st.columns([3, 1])
+        with col_child:
+            child = st.selectbox("Browse into", nested, key=f"{key}_child_{len(path)}")
+        with col_open:
+            if st.button("Open", key=f"{key}_open"):
+                path.append(child)
+                st.rerun()
 
-def add_route_to_map(m, route_geometry):
-    """Add route line to map"""
-    if route_geometry and route_geometry.get("type") == "LineString":
-        coordinates = route_geometry["coordinates"]
-        # Convert to lat,lon format for folium
-        route_coords = [[coord[1], coord[0]] for coord in coordinates]
-        folium.PolyLine(
-            route_coords, 
-            color='blue', 
-            weight=5, 
-            opacity=0.8,
-            popup="Route"
-        ).add_to(m)
-    return m
+@timed
+def render_export(kind, result, key, elevation=False):
+    """Format picker and a download button that only builds the file when clicked"""
+    col_format, col_download = st.columns([1, 1])
+    with col_format:
+        fmt = st.selectbox("Export format", available_formats(), key=f"{key}_format")
+    extension, mime = FORMATS[fmt]
+    with col_download:
+        st.download_button(
+            f"💾 Export {kind}",
+            data=lambda: export_bytes(kind, [result], fmt, elevation=elevation),
+            file_name=f"ors_{kind}{extension}",
+            mime=mime,
+            key=f"{key}_download",
+            on_click="ignore"
+        )
 
 # Main interface
 st.title("🗺️ OpenRouteService API Interface")
@@ -173,6 +270,7 @@ with st.container():
                 st.error(f"❌ API Error: {error}")
 
 # API Service Selection
+mark("service")
 service = st.selectbox(
     "🎯 Select ORS Service",
     ["Directions", "Isochrones"],#"Optimization"],
@@ -612,6 +710,7 @@ service = st.selectbox(
 #                 st.json(result)
 
 if service == "Directions":
+    mark("directions/inputs")
     st.header("🧭 Directions API")
     st.markdown("Get routing directions between waypoints")
     
@@ -674,6 +773,17 @@ if service == "Directions":
                 m = create_map([coordinates[0][1], coordinates[0][0]])
                 m = add_markers_to_map(m, coordinates, [f"Waypoint {i+1}" for i in range(len(coordinates))])
                 map_data = st_folium(m, width=500, height=450, key="directions_preview_map")
+                
+                # Instant estimate from the offline-trained surrogate; the calculated route replaces it
+                surrogate = get_surrogate()
+                estimate = surrogate.route(profile, coordinates) if surrogate else None
+                if estimate and coordinates != st.session_state.directions_coordinates:
+                    st.caption(
+                        f"Estimate: ~{estimate['duration'] / 60:.0f} min, {estimate['distance'] / 1000:.1f} km "
+                        f"({'90% range' if estimate['calibrated'] else 'approx. range'} "
+                        f"{estimate['duration_low'] / 60:.0f}-{estimate['duration_high'] / 60:.0f} min, "
+                        f"{estimate['distance_low'] / 1000:.1f}-{estimate['distance_high'] / 1000:.1f} km)"
+                    )
     
     # Separate container for buttons to prevent rerun issues
     st.divider()
@@ -690,6 +800,7 @@ if service == "Directions":
     
     # Process calculation only when button is clicked
     if calculate_clicked:
+        mark("directions/request")
         # Build request body with correct parameters for ORS v8.0.0
         request_body = {
             "coordinates": coordinates,
@@ -721,7 +832,12 @@ if service == "Directions":
             request_body["alternative_routes"] = {"target_count": alternative_routes}
         
         with st.spinner("Calculating route..."):
-            result, error = make_request(f"directions/{profile}", data=request_body, method="POST")
+            # Rejects over-limit routes locally and splits long ones into parallel sub-requests;
+            # legs already routed this process (same stops and options) are reused, not re-requested
+            traces = []
+            result, error = send_directions(f"directions/{profile}", request_body, make_sender(traces=traces),
+                                            get_limits(base_url), get_leg_cache(), base_url=base_url)
+        st.session_state.directions_traces = traces
         
         if result:
             # Store results in session state
@@ -736,55 +852,44 @@ if service == "Directions":
             st.success("✅ Route calculated successfully!")
         else:
             st.error(f"❌ Error: {error}")
+            finish_traces("directions_traces")
     
     # Display results if they exist in session state
     if st.session_state.directions_results is not None:
+        mark("directions/results")
+        render_started = time.perf_counter()
         st.divider()
         
         result = st.session_state.directions_results
         coordinates = st.session_state.directions_coordinates
         params = st.session_state.directions_params
         
+        # Try different possible response structures
+        routes, layout = normalize_routes(result)
+        
         # Debug: Show what's actually in the result
         with st.expander("🔍 Debug - Response Structure"):
             st.write(f"Response type: {type(result)}")
             st.write(f"Response keys: {list(result.keys()) if isinstance(result, dict) else 'Not a dict'}")
-        
-        # Try different possible response structures
-        routes = []
-        if "routes" in result:
-            routes = result["routes"]
-            st.write(f"✅ Found 'routes' key with {len(routes)} route(s)")
-        elif "features" in result:
-            # GeoJSON format response
-            routes = result["features"]
-            st.write(f"✅ Found 'features' key with {len(routes)} feature(s)")
-        elif isinstance(result, dict):
-            # Single route response
-            routes = [result]
-            st.write("✅ Treating entire response as single route")
+            if layout == "routes":
+                st.write(f"✅ Found 'routes' key with {len(routes)} route(s)")
+            elif layout == "features":
+                st.write(f"✅ Found 'features' key with {len(routes)} feature(s)")
+            elif layout == "single":
+                st.write("✅ Treating entire response as single route")
         
         if not routes:
             st.warning("⚠️ No routes found in the response")
             with st.expander("🔍 Full Response for Debugging"):
-                st.json(result)
+                render_json_lazily(result, "directions_debug_response")
         else:
             # Display route summary
             for route_idx, route in enumerate(routes):
                 route_name = "Main Route" if route_idx == 0 else f"Alternative Route {route_idx}"
                 
                 with st.expander(f"🛣️ {route_name}", expanded=route_idx == 0):
-                    # Handle different response formats
-                    if "properties" in route:
-                        # GeoJSON feature format
-                        summary = route["properties"].get("summary", {})
-                        segments = route["properties"].get("segments", [])
-                        geometry_data = route.get("geometry", {})
-                    else:
-                        # Direct route format
-                        summary = route.get("summary", {})
-                        segments = route.get("segments", [])
-                        geometry_data = route.get("geometry", {})
+                    # Handle different response formats (GeoJSON feature or direct route)
+                    summary, segments, geometry_data = route_parts(route)
                     
                     # Debug info as toggle instead of nested expander
                     show_debug = st.checkbox(f"🔍 Show debug info for Route {route_idx + 1}", key=f"debug_{route_idx}")
@@ -853,14 +958,14 @@ if service == "Directions":
                                     coords = geometry_data["coordinates"]
                                     if coords and isinstance(coords[0], list):
                                         # Convert [lon, lat] to [lat, lon] for folium
-                                        route_coords = [[coord[1], coord[0]] for coord in coords]
+                                        route_coords = to_latlon(coords)
                                         st.success("✅ Using GeoJSON coordinates!")
                                 
                                 elif isinstance(geometry_data, list):
                                     # Direct array of coordinates
                                     if geometry_data and isinstance(geometry_data[0], list):
                                         # Convert [lon, lat] to [lat, lon] for folium
-                                        route_coords = [[coord[1], coord[0]] for coord in geometry_data]
+                                        route_coords = to_latlon(geometry_data)
                                         st.success("✅ Using direct coordinates!")
                                 
                                 # Draw the route if we have coordinates
@@ -884,7 +989,7 @@ if service == "Directions":
                                     if isinstance(geometry_data, str):
                                         st.code(geometry_data[:200] + "..." if len(geometry_data) > 200 else geometry_data)
                                     else:
-                                        st.json(geometry_data)
+                                        render_json_lazily(geometry_data, f"geometry_debug_{route_idx}")
                         else:
                             st.info("📍 No route geometry available - showing waypoints only")
                         
@@ -893,31 +998,28 @@ if service == "Directions":
                     # Show instructions if available
                     if params.get("instructions") and segments:
                         st.subheader("📋 Turn-by-turn Instructions")
-                        instructions_data = []
-                        step_number = 1
+                        instruction_count = count_instruction_rows(segments)
                         
-                        for segment_idx, segment in enumerate(segments):
-                            if "steps" in segment:
-                                for step in segment["steps"]:
-                                    instructions_data.append({
-                                        "Step": step_number,
-                                        "Instruction": step.get("instruction", "Continue"),
-                                        "Distance": f"{step.get('distance', 0)/1000:.2f} km",
-                                        "Duration": f"{step.get('duration', 0)/60:.1f} min"
-                                    })
-                                    step_number += 1
-                        
-                        if instructions_data:
-                            df_instructions = pd.DataFrame(instructions_data)
-                            st.dataframe(df_instructions, use_container_width=True, hide_index=True)
+                        if instruction_count:
+                            render_paginated_table(
+                                instruction_count,
+                                lambda start, stop: instruction_rows(segments, start, stop),
+                                key=f"instructions_{route_idx}"
+                            )
                         else:
                             st.info("No turn-by-turn instructions available for this route.")
                     elif params.get("instructions"):
                         st.info("Turn-by-turn instructions were requested but not available in the response.")
             
+            # GIS export of the routes
+            render_export("directions", result, "directions_export", elevation=params.get("elevation", False))
+            
             # Show full response in expander
             with st.expander("📄 Full API Response"):
-                st.json(result)
+                render_json_lazily(result, "directions_response")
+        
+        # Render time is only attributed on the run that fetched the result
+        finish_traces("directions_traces", render_started)
 
 # elif service == "Isochrones":
 #     st.header("⏰ Isochrones API")
@@ -1082,6 +1184,7 @@ if service == "Directions":
 #                 else:
 #                     st.error(f"❌ Error: {error}")
 elif service == "Isochrones":
+    mark("isochrones/inputs")
     st.header("⏰ Isochrones API")
     st.markdown("Generate reachability areas (isochrones) from locations")
     
@@ -1187,10 +1290,13 @@ elif service == "Isochrones":
     
     # Process generation only when button is clicked
     if generate_clicked:
+        mark("isochrones/request")
         # Sequential requests for each range to avoid interval limit
         all_features = []
         successful_requests = 0
         total_requests = len(range_list)
+        traces = []
+        st.session_state.isochrone_traces = traces
         
         # Create progress bar
         progress_container = st.container()
@@ -1219,7 +1325,8 @@ elif service == "Isochrones":
                     "area_units": area_units
                 }
                 
-                result, error = make_request(f"isochrones/{profile}", data=request_body, method="POST")
+                result, error = send_planned(f"isochrones/{profile}", request_body, make_sender(traces=traces),
+                                             get_limits(base_url))
                 
                 if result and "features" in result:
                     # Add features from this request to the collection
@@ -1254,9 +1361,12 @@ elif service == "Isochrones":
             st.success(f"✅ Successfully generated {successful_requests}/{total_requests} isochrones!")
         else:
             st.error("❌ Failed to generate any isochrones. Please check your ORS configuration and try again.")
+            finish_traces("isochrone_traces")
     
     # Display results if they exist in session state
     if st.session_state.isochrone_results is not None:
+        mark("isochrones/results")
+        render_started = time.perf_counter()
         st.divider()
         
         # Extract data from session state
@@ -1267,28 +1377,12 @@ elif service == "Isochrones":
         # Display statistics
         st.subheader(f"📊 Generated {len(all_features)} isochrone(s)")
         
-        # Create summary table
-        iso_data = []
-        for feature in all_features:
-            props = feature["properties"]
-            range_value = props.get('value', 0)
-            
-            # Format range display
-            if params["range_type"] == "time":
-                range_display = f"{range_value//60} minutes"
-            else:
-                range_display = f"{range_value/1000:.1f} km"
-            
-            iso_data.append({
-                "Range": range_display,
-                "Area": f"{props.get('area', 0):.2f} {params['area_units']}²",
-                "Center": f"({props.get('center', [0, 0])[1]:.4f}, {props.get('center', [0, 0])[0]:.4f})"
-            })
-        
-        # Sort by range value for better display
-        iso_data = sorted(iso_data, key=lambda x: float(x["Range"].split()[0]))
-        df_iso = pd.DataFrame(iso_data)
-        st.dataframe(df_iso, use_container_width=True, hide_index=True)
+        # Summary table, sorted by range value and built one page at a time
+        render_paginated_table(
+            len(all_features),
+            lambda start, stop: isochrone_rows(all_features, params["range_type"], params["area_units"], start, stop),
+            key="isochrone_table"
+        )
         
         # Visualization
         st.subheader("🗺️ Isochrone Visualization")
@@ -1312,7 +1406,7 @@ elif service == "Isochrones":
                 if feature["geometry"]["type"] == "Polygon":
                     coordinates = feature["geometry"]["coordinates"][0]
                     # Convert to lat,lon for folium
-                    polygon_coords = [[coord[1], coord[0]] for coord in coordinates]
+                    polygon_coords = to_latlon(coordinates)
                     
                     range_value = feature["properties"].get('value', 0)
                     if params["range_type"] == "time":
@@ -1333,8 +1427,13 @@ elif service == "Isochrones":
             # Use unique key for the results map to prevent conflicts
             st_folium(iso_map, width=700, height=500, key="results_map")
         
+        # GIS export of the isochrone bands
+        render_export("isochrones", st.session_state.isochrone_results, "isochrone_export")
+        
         with st.expander("📄 Full API Response"):
-            st.json(st.session_state.isochrone_results)         
+            render_json_lazily(st.session_state.isochrone_results, "isochrone_response")
+        
+        finish_traces("isochrone_traces", render_started)
 
 # elif service == "Optimization":
 #     st.header("🚛 Optimization API")
@@ -1820,6 +1919,7 @@ elif service == "Isochrones":
 #                 st.error(f"❌ Error: {error}")
 
 elif service == "Optimization":
+    mark("optimization")
     st.header("🚛 Optimization API")
     st.markdown("Solve vehicle routing problems (VRP) and traveling salesman problems (TSP)")
     
@@ -1957,9 +2057,18 @@ elif service == "Optimization":
             }
             
             with st.spinner("Optimizing TSP route..."):
-                result, error = make_request("optimization", data=request_body, method="POST")
+                request_body, matrix_error = attach_matrices(request_body, get_location_matrix,
+                                                             make_sender(priority="batch"), get_limits(base_url))
+                result, error = make_request("optimization", data=request_body, method="POST", priority="batch")
+            if matrix_error:
+                st.caption(f"Matrix not reused ({matrix_error}); ORS computed it for this run")
             
             if result:
+                with st.spinner("Routing the optimized tour..."):
+                    result, hydration_error = hydrate_routes(result, request_body, make_sender(),
+                                                             get_limits(base_url), base_url=base_url)
+                if hydration_error:
+                    st.caption(f"Route line not drawn: {hydration_error}")
                 # Store results in session state
                 st.session_state.optimization_results = result
                 st.session_state.optimization_type = optimization_type
@@ -2167,9 +2276,19 @@ elif service == "Optimization":
             }
             
             with st.spinner("Optimizing vehicle routes..."):
-                result, error = make_request("optimization", data=request_body, method="POST")
+                request_body, matrix_error = attach_matrices(request_body, get_location_matrix,
+                                                             make_sender(priority="batch"), get_limits(base_url))
+                result, error = make_request("optimization", data=request_body, method="POST", priority="batch")
+            if matrix_error:
+                st.caption(f"Matrix not reused ({matrix_error}); ORS computed it for this run")
             
             if result:
+                # One directions request per vehicle, all at once
+                with st.spinner("Routing the optimized tours..."):
+                    result, hydration_error = hydrate_routes(result, request_body, make_sender(),
+                                                             get_limits(base_url), base_url=base_url)
+                if hydration_error:
+                    st.caption(f"Some route lines not drawn: {hydration_error}")
                 # Store results in session state
                 st.session_state.optimization_results = result
                 st.session_state.optimization_type = optimization_type
@@ -2294,8 +2413,8 @@ elif service == "Optimization":
                             except ImportError:
                                 st.warning("⚠️ Install polyline library to display route: pip install polyline")
                         else:
-                            # Handle other geometry formats
-                            pass
+                            # GeoJSON LineString attached by hydrate_routes
+                            route_map = add_route_to_map(route_map, route["geometry"])
                     except Exception as e:
                         st.warning(f"⚠️ Could not display route line: {str(e)}")
                 
@@ -2338,43 +2457,13 @@ elif service == "Optimization":
                             # Route details
                             steps = route.get("steps", [])
                             if steps:
-                                route_details = []
-                                vehicles = params['vehicles']
-                                jobs = params['jobs']
-                                
-                                for j, step in enumerate(steps):
-                                    step_type = step.get("type", "unknown")
-                                    arrival_time = step.get("arrival", 0)
-                                    departure_time = step.get("departure", arrival_time)
-                                    
-                                    # Convert seconds to HH:MM format
-                                    arrival_str = f"{arrival_time//3600:02d}:{(arrival_time%3600)//60:02d}"
-                                    departure_str = f"{departure_time//3600:02d}:{(departure_time%3600)//60:02d}"
-                                    
-                                    if step_type == "start":
-                                        description = f"Start from depot"
-                                        location = vehicles[i]["start"]
-                                    elif step_type == "job":
-                                        job_id = step.get("job", 0)
-                                        description = f"Job {job_id + 1}"
-                                        location = jobs[job_id]["location"] if job_id < len(jobs) else [0, 0]
-                                    elif step_type == "end":
-                                        description = f"Return to depot"
-                                        location = vehicles[i]["end"]
-                                    else:
-                                        description = f"Step {j+1}"
-                                        location = [0, 0]
-                                    
-                                    route_details.append({
-                                        "Stop": j + 1,
-                                        "Description": description,
-                                        "Arrival": arrival_str,
-                                        "Departure": departure_str,
-                                        "Location": f"({location[1]:.4f}, {location[0]:.4f})"
-                                    })
-                                
-                                df_vehicle_route = pd.DataFrame(route_details)
-                                st.dataframe(df_vehicle_route, use_container_width=True, hide_index=True)
+                                render_paginated_table(
+                                    len(steps),
+                                    lambda start, stop, steps=steps, vehicle=params['vehicles'][i]: vrp_step_rows(
+                                        steps, vehicle, params['jobs'], start, stop
+                                    ),
+                                    key=f"vrp_steps_{i}"
+                                )
                 
                 # Route visualization
                 st.subheader("🗺️ Optimized Routes Map")
@@ -2414,18 +2503,33 @@ elif service == "Optimization":
                         icon=folium.Icon(color=color, icon=icon)
                     ).add_to(route_map)
                 
+                # Road geometry per vehicle, attached by hydrate_routes
+                route_colors = ['blue', 'purple', 'orange', 'darkgreen', 'cadetblue', 'darkred', 'black', 'pink']
+                for i, route in enumerate(result["routes"]):
+                    geometry_data = route.get("geometry")
+                    if isinstance(geometry_data, dict) and geometry_data.get("coordinates"):
+                        folium.PolyLine(
+                            to_latlon(geometry_data["coordinates"]),
+                            color=route_colors[i % len(route_colors)],
+                            weight=4,
+                            opacity=0.8,
+                            popup=f"Vehicle {i+1}"
+                        ).add_to(route_map)
+                
                 st_folium(route_map, width=700, height=500, key="vrp_result_map")
         
         # Show full response in expander
         with st.expander("📄 Full API Response"):
-            st.json(result)
+            render_json_lazily(result, "optimization_response")
 
 # Footer
+mark("footer")
 st.markdown("---")
 st.markdown("**OpenRouteService Streamlit Interface** | Routing • Isochrones • Optimization")
 st.markdown("🐳 For local ORS Docker instances | 📖 [ORS Documentation](https://openrouteservice.org/dev/)")
 
 # Sidebar - API Status and Help
+mark("diagnostics")
 with st.sidebar:
     st.markdown("---")
     st.subheader("🔧 API Status")
@@ -2445,6 +2549,64 @@ with st.sidebar:
                 st.error("❌ API Offline")
                 st.caption(f"Error: {error}")
     
+    with st.expander("⚙️ Client Concurrency"):
+        limiter_state = get_limiter().snapshot()
+        st.metric("Concurrency limit", limiter_state["limit"])
+        st.write(f"In flight: {limiter_state['in_flight']} | Queued: {limiter_state['queued']}")
+        st.caption(
+            f"Min latency: {limiter_state['rtt_noload_ms'] or 'N/A'} ms | "
+            f"Recent latency: {limiter_state['rtt_short_ms'] or 'N/A'} ms | "
+            f"Overload signals: {limiter_state['drops']}"
+        )
+    
+    if len(backend_urls) > 1:
+        with st.expander("🖧 Backend Pool"):
+            pool = get_pool(backend_urls)
+            if st.button("Re-check backends", key="pool_health"):
+                pool.check_health()
+            st.dataframe(pd.DataFrame(pool.snapshot()), use_container_width=True, hide_index=True)
+            if hedge_requests:
+                st.caption(f"Hedged requests: {pool.hedges_sent} sent, {pool.hedges_won} won")
+    
+    region_dispatcher = get_dispatcher()
+    if region_dispatcher is not None:
+        with st.expander("🗾 Region Dispatch"):
+            st.dataframe(pd.DataFrame([
+                {"Region": r.name, "Base URL": r.base_url, "BBox": ", ".join(f"{v:.2f}" for v in r.bbox),
+                 "Requests": region_dispatcher.counts[r.name]}
+                for r in region_dispatcher.regions
+            ]), use_container_width=True, hide_index=True)
+    
+    with st.expander("🚦 Request Scheduler"):
+        scheduler_metrics = get_scheduler().metrics()
+        st.dataframe(pd.DataFrame(scheduler_metrics).T, use_container_width=True)
+        st.download_button(
+            "⬇️ Prometheus metrics",
+            get_scheduler().prometheus_metrics(),
+            file_name="ors_client_metrics.txt",
+            key="download_scheduler_metrics"
+        )
+    
+    with st.expander("🐢 Slow Queries"):
+        slow_log = get_slow_log()
+        st.caption(f"Requests slower than {slow_log.threshold_ms:.0f} ms, logged to "
+                   f"{slow_log.path or 'memory only (set ORS_SLOW_LOG_FILE to keep them)'}")
+        slow_entries = slow_log.entries()
+        if slow_entries:
+            sort_phase = st.selectbox("Sort by", ("total",) + PHASES, key="slow_sort")
+            slow_rows = pd.DataFrame([
+                {"id": e["id"], "endpoint": e["endpoint"], "status": e["status"],
+                 "total": e["total_ms"], **e["phases_ms"]}
+                for e in slow_entries
+            ]).sort_values(sort_phase, ascending=False)
+            st.dataframe(slow_rows, use_container_width=True, hide_index=True)
+            slow_id = st.selectbox("Waterfall of", slow_rows["id"], key="slow_id")
+            slow_entry = next(e for e in slow_entries if e["id"] == slow_id)
+            st.bar_chart(pd.Series(slow_entry["phases_ms"], name="ms"), horizontal=True)
+            render_json_lazily({k: slow_entry[k] for k in ("params", "data")}, f"slow_body_{slow_id}")
+        else:
+            st.info("No slow queries yet")
+    
     st.markdown("---")
     st.subheader("📖 Quick Reference")
     
@@ -2535,4 +2697,29 @@ st.markdown("""
         color: #721c24;
     }
 </style>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+
+# Profiling breakdown of this rerun (drawn last so it covers everything above)
+rerun_profile = profiler.finish()
+with st.sidebar.expander("⏱️ Profiling"):
+    st.selectbox(
+        "Profiling mode", PROFILE_MODES, key="profiling_mode",
+        help="timing is cheap enough to leave on; cprofile and memory add overhead to every rerun"
+    )
+    if rerun_profile is None:
+        st.caption("Profiling is off for this session")
+    else:
+        st.caption(f"Last rerun: {rerun_profile['total_s'] * 1000:.0f} ms ({rerun_profile['mode']})")
+        flame = pd.DataFrame(flame_rows(rerun_profile))
+        st.plotly_chart(px.icicle(
+            flame, ids="id", parents="parent", names="label", values="ms", branchvalues="total"
+        ).update_layout(margin=dict(t=0, l=0, r=0, b=0), height=300), use_container_width=True)
+        sections = pd.DataFrame(rerun_profile["sections"]).assign(ms=lambda df: (df.seconds * 1000).round(2))
+        st.dataframe(sections.drop(columns="seconds").sort_values("ms", ascending=False),
+                     use_container_width=True, hide_index=True)
+        if "top_functions" in rerun_profile:
+            st.dataframe(pd.DataFrame(rerun_profile["top_functions"]), use_container_width=True, hide_index=True)
+            st.download_button("⬇️ .pstats", rerun_profile["pstats"], file_name="rerun.pstats",
+                               key="download_pstats", on_click="ignore")
+        if "top_allocations" in rerun_profile:
+            st.dataframe(pd.DataFrame(rerun_profile["top_allocations"]), use_container_width=True, hide_index=True)
@@ -0,0 +1,337 @@
+"""Learned duration/distance surrogate for instant previews.
+
+A route preview only needs a good guess with an honest error bar, not an
+exact route, so it should not wait for ORS. This model is trained offline
+on the answers already in the shared result cache (ors_cache.py): every
+directions leg and every matrix cell there is a labelled (origin,
+destination, profile) pair.
+
+Per profile, log duration and log distance are fitted by least squares on:
+
+- the log of the great-circle distance (and its square),
+- the circuity of the origin's and the destination's grid cell (the mean
+  log road/straight-line ratio of training pairs touching the cell,
+  shrunk towards the profile's mean when the cell has few samples),
+- the pace (log seconds per metre) of the coarse region around the
+  midpoint, shrunk the same way.
+
+Error bounds are split-conformal: a held-out part of the data gives the
+residual quantiles per distance band, so an interval at 90% covers about
+90% of unseen pairs of that length. That calibration holds per leg; a
+multi-waypoint route combines its legs' errors in quadrature (as if
+independent), which is an approximate range, not a calibrated one.
+
+    python ors_surrogate.py train --cache ors_cache.sqlite --output surrogate.json
+    python ors_surrogate.py evaluate --cache ors_cache.sqlite --model surrogate.json
+
+The app shows estimates from ORS_SURROGATE_FILE in the Directions preview;
+the exact route replaces them once calculated.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+from ors_geometry import haversine
+from ors_parsing import loads
+
+CELL_DEGREES = 0.05  # circuity grid, about 5.5 km at the equator
+REGION_DEGREES = 0.5  # pace regions
+PRIOR_SAMPLES = 20  # cell/region means are shrunk towards the profile mean with this weight
+MIN_METRES = 10.0  # shorter pairs are snapping noise
+MAX_PAIRS = 200000  # per profile; matrices are subsampled beyond this
+CALIBRATION_SHARE = 0.2
+COVERAGE = 0.9
+DISTANCE_BANDS = (0, 1000, 3000, 10000, 30000, 100000, float("inf"))  # metres, straight line
+SURROGATE_FILE = os.environ.get("ORS_SURROGATE_FILE")
+
+
+def pairs_from_cache(path, max_pairs=MAX_PAIRS, seed=0):
+    """{profile: (origins, destinations, durations, distances)} from a result cache file"""
+    rng = np.random.default_rng(seed)
+    collected = {}
+    db = sqlite3.connect(path)
+    try:
+        rows = db.execute("SELECT endpoint, content FROM responses").fetchall()
+    finally:
+        db.close()
+    for endpoint, content in rows:
+        # directions/driving-car, or with a format suffix: directions/driving-car/geojson
+        parts = endpoint.strip("/").split("/")
+        if len(parts) < 2:
+            continue
+        service, profile = parts[0], parts[1]
+        try:
+            result = loads(content)
+        except ValueError:
+            continue
+        bucket = collected.setdefault(profile, ([], [], [], []))
+        if service == "matrix":
+            _matrix_pairs(result, bucket, rng, max_pairs)
+        elif service == "directions":
+            _direction_pairs(result, bucket)
+    data = {}
+    for profile, (origins, destinations, durations, distances) in collected.items():
+        if origins:
+            data[profile] = (np.array(origins, dtype=float), np.array(destinations, dtype=float),
+                             np.array(durations, dtype=float), np.array(distances, dtype=float))
+    return data
+
+
+def _matrix_pairs(result, bucket, rng, max_pairs):
+    if "durations" not in result or "distances" not in result:
+        return
+    sources = [s["location"] for s in result.get("sources", [])]
+    destinations = [d["location"] for d in result.get("destinations", [])]
+    durations = np.array(result["durations"], dtype=float)
+    distances = np.array(result["distances"], dtype=float)
+    if durations.shape != (len(sources), len(destinations)):
+        return
+    rows, cols = np.nonzero(np.isfinite(durations) & np.isfinite(distances))
+    if len(rows) > max_pairs:
+        pick = rng.choice(len(rows), max_pairs, replace=False)
+        rows, cols = rows[pick], cols[pick]
+    bucket[0].extend(sources[r] for r in rows)
+    bucket[1].extend(destinations[c] for c in cols)
+    bucket[2].extend(durations[rows, cols])
+    bucket[3].extend(distances[rows, cols])
+
+
+def _direction_pairs(result, bucket):
+    coordinates = result.get("metadata", {}).get("query", {}).get("coordinates") or []
+    features = result.get("features") or result.get("routes") or []
+    if not features:
+        return
+    properties = features[0].get("properties", features[0])
+    segments = properties.get("segments") or []
+    if len(segments) == len(coordinates) - 1:
+        legs = [(segment.get("duration"), segment.get("distance")) for segment in segments]
+    elif len(coordinates) == 2:
+        summary = properties.get("summary", {})
+        legs = [(summary.get("duration"), summary.get("distance"))]
+    else:
+        return
+    for (duration, distance), origin, destination in zip(legs, coordinates, coordinates[1:]):
+        if duration is not None and distance is not None:
+            bucket[0].append(origin)
+            bucket[1].append(destination)
+            bucket[2].append(duration)
+            bucket[3].append(distance)
+
+
+def _cells(points, size):
+    return [f"{int(np.floor(lon / size))},{int(np.floor(lat / size))}" for lon, lat in points]
+
+
+def _shrunk_means(keys, values, prior):
+    sums, counts = {}, {}
+    for key, value in zip(keys, values):
+        sums[key] = sums.get(key, 0.0) + value
+        counts[key] = counts.get(key, 0) + 1
+    return {key: (sums[key] + prior * PRIOR_SAMPLES) / (counts[key] + PRIOR_SAMPLES) for key in sums}
+
+
+class ProfileModel:
+    """Fitted surrogate of one profile"""
+
+    def __init__(self, coefficients, circuity, pace, means, bands, quantiles, metrics=None):
+        self.coefficients = coefficients  # {"duration": [...], "distance": [...]}
+        self.circuity = circuity  # cell -> mean log(road / straight)
+        self.pace = pace  # region -> mean log(seconds / metre)
+        self.means = means  # {"circuity": ..., "pace": ...} for unseen cells
+        self.bands = bands
+        self.quantiles = quantiles  # {target: [[low, high] per band]} of log residuals
+        self.metrics = metrics or {}
+
+    def features(self, origins, destinations):
+        origins = np.asarray(origins, dtype=float).reshape(-1, 2)
+        destinations = np.asarray(destinations, dtype=float).reshape(-1, 2)
+        straight = np.maximum(haversine(origins, destinations), MIN_METRES)
+        log_straight = np.log(straight)
+        circuity_o = [self.circuity.get(c, self.means["circuity"]) for c in _cells(origins, CELL_DEGREES)]
+        circuity_d = [self.circuity.get(c, self.means["circuity"]) for c in _cells(destinations, CELL_DEGREES)]
+        pace = [self.pace.get(c, self.means["pace"]) for c in _cells((origins + destinations) / 2, REGION_DEGREES)]
+        X = np.column_stack((np.ones(len(straight)), log_straight, log_straight ** 2, circuity_o, circuity_d, pace))
+        return X, straight
+
+    def predict(self, origins, destinations):
+        """{"duration", "duration_low", "duration_high", "distance", ...} arrays, seconds and metres"""
+        X, straight = self.features(origins, destinations)
+        band = np.clip(np.searchsorted(self.bands, straight, side="right") - 1, 0, len(self.bands) - 2)
+        out = {}
+        for target, coefficients in self.coefficients.items():
+            log_estimate = X @ np.asarray(coefficients)
+            low, high = np.asarray(self.quantiles[target]).T
+            out[target] = np.exp(log_estimate)
+            out[f"{target}_low"] = np.exp(log_estimate + low[band])
+            out[f"{target}_high"] = np.exp(log_estimate + high[band])
+        return out
+
+    def to_dict(self):
+        return {"coefficients": self.coefficients, "circuity": self.circuity, "pace": self.pace,
+                "means": self.means, "bands": self.bands, "quantiles": self.quantiles, "metrics": self.metrics}
+
+
+def fit_profile(origins, destinations, durations, distances, coverage=COVERAGE, seed=0):
+    """Fit one profile on a random split and calibrate its intervals on the rest"""
+    straight = haversine(origins, destinations)
+    usable = (straight >= MIN_METRES) & (durations > 0) & (distances > 0)
+    origins, destinations = origins[usable], destinations[usable]
+    durations, distances, straight = durations[usable], distances[usable], straight[usable]
+    if len(straight) < 10:
+        raise ValueError(f"Only {len(straight)} usable pairs")
+
+    rng = np.random.default_rng(seed)
+    calibrate = rng.random(len(straight)) < CALIBRATION_SHARE
+    train = ~calibrate
+
+    # Cell circuity and region pace come from the training part only, so calibration stays honest
+    log_circuity = np.log(distances / straight)
+    log_pace = np.log(durations / distances)
+    means = {"circuity": float(log_circuity[train].mean()), "pace": float(log_pace[train].mean())}
+    cell_keys = _cells(np.concatenate((origins[train], destinations[train])), CELL_DEGREES)
+    circuity = _shrunk_means(cell_keys, np.concatenate((log_circuity[train], log_circuity[train])),
+                             means["circuity"])
+    pace = _shrunk_means(_cells((origins[train] + destinations[train]) / 2, REGION_DEGREES), log_pace[train],
+                         means["pace"])
+    model = ProfileModel({}, circuity, pace, means, list(DISTANCE_BANDS), {})
+
+    X, _ = model.features(origins, destinations)
+    targets = {"duration": np.log(durations), "distance": np.log(distances)}
+    band = np.clip(np.searchsorted(DISTANCE_BANDS, straight, side="right") - 1, 0, len(DISTANCE_BANDS) - 2)
+    tail = (1 - coverage) / 2
+    for target, y in targets.items():
+        coefficients, *_ = np.linalg.lstsq(X[train], y[train], rcond=None)
+        model.coefficients[target] = coefficients.tolist()
+        residuals = y - X @ coefficients
+        overall = np.quantile(residuals[calibrate], [tail, 1 - tail]) if calibrate.any() else np.zeros(2)
+        quantiles = []
+        for b in range(len(DISTANCE_BANDS) - 1):
+            in_band = residuals[calibrate & (band == b)]
+            quantiles.append(np.quantile(in_band, [tail, 1 - tail]).tolist() if len(in_band) >= 20
+                             else overall.tolist())
+        model.quantiles[target] = quantiles
+
+    model.metrics = evaluate_profile(model, origins[calibrate], destinations[calibrate],
+                                     durations[calibrate], distances[calibrate])
+    model.metrics.update(train_pairs=int(train.sum()), calibration_pairs=int(calibrate.sum()))
+    return model
+
+
+def evaluate_profile(model, origins, destinations, durations, distances):
+    """Median/90th percentile absolute percentage error and interval coverage"""
+    if len(durations) == 0:
+        return {}
+    predicted = model.predict(origins, destinations)
+    metrics = {}
+    for target, actual in (("duration", durations), ("distance", distances)):
+        error = np.abs(predicted[target] - actual) / np.maximum(actual, 1e-9)
+        inside = (predicted[f"{target}_low"] <= actual) & (actual <= predicted[f"{target}_high"])
+        metrics[target] = {"median_ape": round(float(np.median(error)), 4),
+                           "p90_ape": round(float(np.percentile(error, 90)), 4),
+                           "coverage": round(float(inside.mean()), 4)}
+    metrics["pairs"] = int(len(durations))
+    return metrics
+
+
+class Surrogate:
+    """Per-profile surrogate models"""
+
+    def __init__(self, profiles):
+        self.profiles = profiles
+
+    @classmethod
+    def train(cls, data, coverage=COVERAGE):
+        profiles = {}
+        for profile, pairs in data.items():
+            try:
+                profiles[profile] = fit_profile(*pairs, coverage=coverage)
+            except ValueError:
+                continue
+        return cls(profiles)
+
+    def predict(self, profile, origins, destinations):
+        """Estimates for origin -> destination pairs, or None for an untrained profile"""
+        model = self.profiles.get(profile)
+        return None if model is None else model.predict(origins, destinations)
+
+    def route(self, profile, coordinates):
+        """Estimated totals of a multi-waypoint route
+
+        Estimates are added up. Each leg's distance from its bounds is
+        combined in quadrature, treating leg errors as independent; the
+        result is the calibrated interval for a single leg and an
+        approximate one beyond that ("calibrated" says which).
+        """
+        if len(coordinates) < 2:
+            return None
+        legs = self.predict(profile, coordinates[:-1], coordinates[1:])
+        if legs is None:
+            return None
+        totals = {"calibrated": len(coordinates) == 2}
+        for target in ("duration", "distance"):
+            estimate = legs[target]
+            below = np.sqrt(((estimate - legs[f"{target}_low"]) ** 2).sum())
+            above = np.sqrt(((legs[f"{target}_high"] - estimate) ** 2).sum())
+            totals[target] = float(estimate.sum())
+            totals[f"{target}_low"] = totals[target] - float(below)
+            totals[f"{target}_high"] = totals[target] + float(above)
+        return totals
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({profile: model.to_dict() for profile, model in self.profiles.items()}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls({profile: ProfileModel(**fields) for profile, fields in json.load(f).items()})
+
+
+_surrogate = None
+_surrogate_lock = threading.Lock()
+
+
+def get_surrogate():
+    """Model at ORS_SURROGATE_FILE, or None when there is none"""
+    global _surrogate
+    if not SURROGATE_FILE or not os.path.exists(SURROGATE_FILE):
+        return None
+    with _surrogate_lock:
+        if _surrogate is None:
+            _surrogate = Surrogate.load(SURROGATE_FILE)
+        return _surrogate
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train and evaluate the ETA surrogate on the result cache")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train = subparsers.add_parser("train", help="Fit per-profile models and report held-out accuracy")
+    train.add_argument("--cache", default=os.environ.get("ORS_CACHE_FILE"), help="Result cache (ORS_CACHE_FILE)")
+    train.add_argument("--output", default=SURROGATE_FILE or "ors_surrogate.json")
+    train.add_argument("--coverage", type=float, default=COVERAGE, help="Target interval coverage")
+    evaluate = subparsers.add_parser("evaluate", help="Score a saved model against a result cache")
+    evaluate.add_argument("--cache", default=os.environ.get("ORS_CACHE_FILE"))
+    evaluate.add_argument("--model", default=SURROGATE_FILE or "ors_surrogate.json")
+    args = parser.parse_args(argv)
+    if not args.cache:
+        parser.error("--cache (or ORS_CACHE_FILE) is required")
+
+    data = pairs_from_cache(args.cache)
+    if args.command == "train":
+        surrogate = Surrogate.train(data, args.coverage)
+        surrogate.save(args.output)
+        report = {profile: model.metrics for profile, model in surrogate.profiles.items()}
+        print(f"Trained {len(surrogate.profiles)} profile(s) -> {args.output} (held-out metrics)")
+    else:
+        surrogate = Surrogate.load(args.model)
+        report = {profile: evaluate_profile(surrogate.profiles[profile], *pairs)
+                  for profile, pairs in data.items() if profile in surrogate.profiles}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""Warm-up driver to run after an ORS container starts.
+
+For the first few hundred requests after a start ORS is several times
+slower than steady state: the JVM is still compiling the routing code and
+the graph files are still being paged into memory. This tool:
+
+1. waits for /health to report ready (graph loading can take a while),
+2. replays a representative workload against that instance in rounds,
+   spread over every profile it serves and every endpoint, until the
+   round-to-round median latency stops changing (or --max-rounds),
+3. marks the instance warm in the state file (ORS_WARMUP_STATE, default
+   in the temp directory), which the app's backend pool reads so it
+   prefers warm replicas (see ors_backends.py),
+4. optionally fills the shared result cache (ORS_CACHE_FILE, see
+   ors_cache.py) with a list of hot queries.
+
+The workload is a traffic recording (ors_recorder.py), a workload model
+built from logs (ors_logs.py), or by default a synthetic mix of random
+points inside --bbox. Hot queries are JSONL lines with endpoint/method/
+params/data, so a recording works as a hot-query list too.
+
+    ORS_WARMUP_STATE=warmup.json ORS_CACHE_FILE=ors_cache.sqlite \\
+        python ors_warmup.py --base-url http://localhost:8080/ors/v2 \\
+        --recorded traffic.jsonl.gz --hot-queries hot_queries.jsonl
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from ors_backends import WARMUP_STATE_FILE, load_warmup_state, parse_base_urls, status_fingerprint
+from ors_cache import cache_key, cacheable, get_cache
+from ors_logs import SERVICES, WorkloadModel
+from ors_recorder import load_log, replay
+
+HEALTH_TIMEOUT = 4 * 3600  # seconds; a first start builds graphs for hours
+HEALTH_INTERVAL = 10
+ROUND_SIZE = 100  # requests per measured round
+CONVERGENCE_TOLERANCE = 0.10  # max relative spread of the last round medians
+CONVERGENCE_ROUNDS = 3
+MAX_ROUNDS = 50
+WORKERS = 8
+DEFAULT_BBOX = [106.70, -6.35, 106.95, -6.10]  # Jakarta
+
+
+def wait_for_health(base_url, timeout=HEALTH_TIMEOUT, interval=HEALTH_INTERVAL):
+    """Block until /health answers 200 with status ready; returns the seconds waited"""
+    start = time.monotonic()
+    while True:
+        try:
+            response = requests.get(f"{base_url}/health", timeout=interval)
+            if response.status_code == 200 and response.json().get("status") == "ready":
+                return time.monotonic() - start
+        except (requests.RequestException, ValueError):
+            pass
+        if time.monotonic() - start > timeout:
+            raise TimeoutError(f"{base_url} not healthy after {timeout:.0f}s")
+        time.sleep(interval)
+
+
+def profiles_of(status):
+    """Profile names served by an instance, from its /status"""
+    return sorted({p["profiles"] for p in status.get("profiles", {}).values() if "profiles" in p}) \
+        or ["driving-car"]
+
+
+def synthetic_workload(n, bbox=DEFAULT_BBOX, seed=0):
+    """n (endpoint, method, params, data) requests with random points inside bbox"""
+    rng = np.random.default_rng(seed)
+
+    def points(count):
+        lons = rng.uniform(bbox[0], bbox[2], count)
+        lats = rng.uniform(bbox[1], bbox[3], count)
+        return [[round(float(lon), 6), round(float(lat), 6)] for lon, lat in zip(lons, lats)]
+
+    workload = []
+    for i in range(n):
+        service = SERVICES[i % len(SERVICES)]
+        if service == "directions":
+            data = {"coordinates": points(2)}
+        elif service == "isochrones":
+            data = {"locations": points(1), "range": [300, 600, 900]}
+        elif service == "matrix":
+            data = {"locations": points(10), "metrics": ["duration"]}
+        else:
+            data = {"locations": points(3), "radius": 350}
+        workload.append((f"{service}/driving-car", "POST", None, data))
+    return workload
+
+
+def recorded_workload(path):
+    """ORS calls from a traffic recording, as (endpoint, method, params, data)"""
+    return [(e["endpoint"], e.get("method", "POST"), e.get("params"), e.get("data"))
+            for e in load_log(path) if cacheable(e["endpoint"])]
+
+
+def across_profiles(workload, profiles):
+    """Rewrite each request's profile round-robin so every profile gets traffic"""
+    spread = []
+    for i, (endpoint, method, params, data) in enumerate(workload):
+        parts = endpoint.split("/")
+        if len(parts) > 1:
+            parts[1] = profiles[i % len(profiles)]
+        spread.append(("/".join(parts), method, params, data))
+    return spread
+
+
+def converged(medians, tolerance=CONVERGENCE_TOLERANCE, rounds=CONVERGENCE_ROUNDS):
+    """Whether the last `rounds` round medians are within tolerance of each other"""
+    if len(medians) < rounds:
+        return False
+    recent = medians[-rounds:]
+    return (max(recent) - min(recent)) / max(min(recent), 1e-9) <= tolerance
+
+
+def warm_up(base_url, workload, round_size=ROUND_SIZE, workers=WORKERS, tolerance=CONVERGENCE_TOLERANCE,
+            max_rounds=MAX_ROUNDS, on_round=None):
+    """Replay the workload in rounds until latency converges; returns the per-round report"""
+    rounds = []
+    medians = []
+    offset = 0
+    for number in range(1, max_rounds + 1):
+        batch = [workload[(offset + i) % len(workload)] for i in range(round_size)]
+        offset += round_size
+        entries = [{"ts": 0.0, "endpoint": endpoint, "method": method, "params": params, "data": data}
+                   for endpoint, method, params, data in batch]
+        results = replay(entries, base_url, speed=0, workers=workers)
+        latencies = np.array([r["latency"] for r in results if r["status"] == 200])
+        stats = {
+            "round": number,
+            "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1) if len(latencies) else None,
+            "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 1) if len(latencies) else None,
+            "errors": sum(r["status"] != 200 for r in results),
+        }
+        rounds.append(stats)
+        if on_round is not None:
+            on_round(stats)
+        if stats["p50_ms"] is None:
+            continue
+        medians.append(stats["p50_ms"])
+        if converged(medians, tolerance):
+            return {"converged": True, "rounds": rounds}
+    return {"converged": False, "rounds": rounds}
+
+
+def _write_state(path, backends):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"backends": backends}, f, indent=2)
+    os.replace(tmp, path)
+
+
+def mark_cold(base_url, path=WARMUP_STATE_FILE):
+    """Drop an instance from the warm set (it restarted and is warming up again)"""
+    backends = load_warmup_state(path)
+    if backends.pop(base_url, None) is not None:
+        _write_state(path, backends)
+
+
+def mark_ready(base_url, fingerprint, report, path=WARMUP_STATE_FILE):
+    """Record an instance as warm for its graph build; the backend pool picks this up"""
+    backends = load_warmup_state(path)
+    last = report["rounds"][-1] if report["rounds"] else {}
+    backends[base_url] = {
+        "fingerprint": list(fingerprint),
+        "warmed_at": round(time.time(), 3),
+        "converged": report["converged"],
+        "rounds": len(report["rounds"]),
+        "p50_ms": last.get("p50_ms"),
+        "p95_ms": last.get("p95_ms"),
+    }
+    _write_state(path, backends)
+
+
+def prepopulate(base_url, queries, cache, workers=WORKERS):
+    """Fetch each hot query from base_url and store the answer in the shared cache
+
+    base_url may be a replica list: answers come from the first replica and
+    are keyed by the whole list, as the client looks them up.
+    """
+    base_urls = parse_base_urls(base_url)
+    session = requests.Session()
+    stored = failed = 0
+
+    def fetch(query):
+        endpoint, method, params, data = query
+        url = f"{base_urls[0]}/{endpoint}"
+        try:
+            if method == "GET":
+                response = session.get(url, params=params, timeout=120)
+            else:
+                response = session.post(url, json=data, headers={"Content-Type": "application/json"}, timeout=120)
+        except Exception:
+            return query, None  # one timeout or bad query should not end the whole run
+        return query, response
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for query, response in executor.map(fetch, queries):
+            if response is not None and response.status_code == 200:
+                cache.put(cache_key(*query, ",".join(base_urls)), query[0], response.content)
+                stored += 1
+            else:
+                failed += 1
+    return {"stored": stored, "failed": failed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warm up ORS instances after start and mark them ready")
+    parser.add_argument("--base-url", required=True, help="One or more comma-separated ORS base URLs")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--recorded", help="Traffic recording from ors_recorder.py to replay")
+    source.add_argument("--model", help="Workload model JSON from ors_logs.py to sample from")
+    parser.add_argument("--requests", type=int, default=1000, help="Synthetic/sampled workload size")
+    parser.add_argument("--bbox", default=",".join(map(str, DEFAULT_BBOX)),
+                        help="Synthetic points inside min_lon,min_lat,max_lon,max_lat")
+    parser.add_argument("--round-size", type=int, default=ROUND_SIZE)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--tolerance", type=float, default=CONVERGENCE_TOLERANCE)
+    parser.add_argument("--max-rounds", type=int, default=MAX_ROUNDS)
+    parser.add_argument("--health-timeout", type=float, default=HEALTH_TIMEOUT)
+    parser.add_argument("--state", default=WARMUP_STATE_FILE,
+                        help="Warm-up state file read by the backend pool (ORS_WARMUP_STATE)")
+    parser.add_argument("--hot-queries", help="JSONL of queries to pre-populate the shared cache with")
+    args = parser.parse_args(argv)
+
+    if args.recorded:
+        workload = recorded_workload(args.recorded)
+    elif args.model:
+        workload = [(endpoint, "POST", None, body)
+                    for endpoint, body in WorkloadModel.load(args.model).sample_requests(args.requests)]
+    else:
+        workload = synthetic_workload(args.requests, [float(v) for v in args.bbox.split(",")])
+    if not workload:
+        parser.error("The workload is empty")
+
+    cache = get_cache()
+    for base_url in parse_base_urls(args.base_url):
+        mark_cold(base_url, args.state)
+        print(f"{base_url}: waiting for /health")
+        waited = wait_for_health(base_url, timeout=args.health_timeout)
+        status = requests.get(f"{base_url}/status", timeout=30).json()
+        fingerprint = status_fingerprint(status)
+        profiles = profiles_of(status)
+        print(f"{base_url}: healthy after {waited:.0f}s, profiles {', '.join(profiles)}")
+        if cache is not None and cache.set_fingerprint(fingerprint):
+            print(f"{base_url}: graph build changed, shared cache cleared")
+
+        report = warm_up(base_url, across_profiles(workload, profiles), round_size=args.round_size,
+                         workers=args.workers, tolerance=args.tolerance, max_rounds=args.max_rounds,
+                         on_round=lambda r: print(f"  round {r['round']:>3}  p50 {r['p50_ms']} ms  "
+                                                  f"p95 {r['p95_ms']} ms  errors {r['errors']}"))
+        mark_ready(base_url, fingerprint, report, args.state)
+        print(f"{base_url}: {'converged' if report['converged'] else 'did not converge'} after "
+              f"{len(report['rounds'])} rounds, marked ready")
+
+    if args.hot_queries:
+        if cache is None:
+            parser.error("--hot-queries needs ORS_CACHE_FILE set")
+        queries = [(e["endpoint"], e.get("method", "POST"), e.get("params"), e.get("data"))
+                   for e in load_log(args.hot_queries)]
+        result = prepopulate(args.base_url, queries, cache, args.workers)
+        print(f"Shared cache: {result['stored']} hot queries stored, {result['failed']} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import math
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# The modules live at the repository root, next to the Streamlit app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ors_geometry import encode_polyline  # noqa: E402
+
+
+def travel_time(a, b):
+    """Stand-in road metric: planar distance between two [lon, lat] points, in seconds"""
+    return round(math.dist(a, b) * 1000, 1)
+
+
+@pytest.fixture
+def matrix_send():
+    """send(endpoint, body, arrays=False) answering /matrix locally; records every body it sees"""
+    calls = []
+
+    def send(endpoint, body, arrays=False):
+        calls.append(body)
+        locations = body["locations"]
+        sources = body.get("sources") or range(len(locations))
+        destinations = body.get("destinations") or range(len(locations))
+        durations = [[travel_time(locations[s], locations[d]) for d in destinations] for s in sources]
+        result = {"durations": np.array(durations) if arrays else durations}
+        if "distance" in body.get("metrics", ()):
+            distances = [[cell * 10 for cell in row] for row in durations]  # 36 km/h
+            result["distances"] = np.array(distances) if arrays else distances
+        result.update({"sources": [{"location": locations[s]} for s in sources],
+                       "destinations": [{"location": locations[d]} for d in destinations],
+                       "metadata": {"service": "matrix"}})
+        return result, None
+
+    send.calls = calls
+    return send
+
+
+@pytest.fixture
+def directions_send():
+    """send(endpoint, body) answering /directions locally, every leg two points long (start, midpoint, end)"""
+    calls = []
+
+    def send(endpoint, body, arrays=False):
+        calls.append(body)
+        coordinates = body["coordinates"]
+        points = [coordinates[0]]
+        segments = []
+        for i, (a, b) in enumerate(zip(coordinates, coordinates[1:])):
+            points += [[(a[0] + b[0]) / 2, (a[1] + b[1]) / 2], b]
+            segments.append({"distance": 100.0, "duration": 10.0,
+                             "steps": [{"type": 11, "way_points": [2 * i, 2 * i + 1]},
+                                       {"type": 10, "way_points": [2 * i + 1, 2 * i + 2]}]})
+        properties = {"summary": {"distance": 100.0 * len(segments), "duration": 10.0 * len(segments)},
+                      "segments": segments, "way_points": list(range(0, len(points), 2))}
+        if body.get("format") == "geojson":
+            feature = {"type": "Feature", "properties": properties}
+            if body.get("geometry", True):
+                feature["geometry"] = {"type": "LineString", "coordinates": points}
+            return {"type": "FeatureCollection", "features": [feature], "metadata": {}}, None
+        route = dict(properties)
+        if body.get("geometry", True):
+            route["geometry"] = encode_polyline([[lat, lon] for lon, lat in points])
+        return {"routes": [route], "metadata": {}}, None
+
+    send.calls = calls
+    return send
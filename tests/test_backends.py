@@ -0,0 +1,205 @@
+import socket
+import threading
+import time
+
+import pytest
+import requests
+
+import ors_backends
+from ors_backends import BackendPool, ConnectionFailure, get_pool
+from ors_client import _call
+
+
+class FakeLimiter:
+    def __init__(self, slots):
+        self.slots = slots
+        self.released = []
+
+    def try_acquire(self):
+        if self.slots <= 0:
+            return None
+        self.slots -= 1
+        return object()
+
+    def release(self, token, status_code=None, failed=False):
+        self.slots += 1
+        self.released.append(status_code)
+
+
+def make_pool(*urls):
+    pool = BackendPool(list(urls or ("http://a", "http://b", "http://c")))
+    pool._last_check = time.monotonic()  # no health probes against the fake URLs
+    return pool
+
+
+def backend(pool, url):
+    return next(b for b in pool.backends if b.base_url == url)
+
+
+def test_choose_prefers_the_fewest_outstanding_requests():
+    pool = make_pool()
+    backend(pool, "http://a").outstanding = 2
+    backend(pool, "http://b").outstanding = 1
+    backend(pool, "http://c").outstanding = 3
+    chosen = pool.choose()
+    assert chosen.base_url == "http://b" and chosen.outstanding == 2
+    # b and a now tie at 2; the lower median latency wins
+    backend(pool, "http://a").latencies.extend([0.5] * 3)
+    backend(pool, "http://b").latencies.extend([0.1] * 3)
+    assert pool.choose().base_url == "http://b"
+    assert pool.choose(exclude=(backend(pool, "http://b"),)).base_url == "http://a"
+
+
+def test_choose_skips_unavailable_and_falls_back_to_cold_replicas():
+    pool = make_pool()
+    backend(pool, "http://a").healthy = False
+    backend(pool, "http://b").consistent = False
+    backend(pool, "http://c").ready = False
+    assert pool.choose().base_url == "http://c"
+    backend(pool, "http://c").healthy = False
+    assert pool.choose() is None
+    assert pool.call(lambda url: ({}, None, 200)) == (None, "No healthy ORS backend available", None)
+
+
+@pytest.mark.parametrize("outcome, evicted", [
+    (lambda url: (None, ConnectionFailure("Connection refused"), None), True),
+    (lambda url: (_ for _ in ()).throw(requests.ConnectionError("reset")), True),
+    (lambda url: (None, "Read timed out. (read timeout=30)", None), False),
+    (lambda url: (_ for _ in ()).throw(requests.ReadTimeout("slow")), False),
+    (lambda url: (None, "Error 500: boom", 500), False),
+])
+def test_only_connection_failures_evict(outcome, evicted):
+    pool = make_pool("http://a")
+    result, error, status_code = pool.call(outcome)
+    assert result is None and error
+    assert backend(pool, "http://a").healthy is not evicted
+    assert backend(pool, "http://a").outstanding == 0
+
+
+@pytest.fixture
+def refused_url():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}/ors/v2"
+
+
+@pytest.fixture
+def silent_url():
+    """A server that accepts connections and never answers"""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(8)
+    yield f"http://127.0.0.1:{server.getsockname()[1]}/ors/v2"
+    server.close()
+
+
+def test_refused_connection_evicts_through_the_client(refused_url):
+    pool = make_pool(refused_url)
+    result, error, status_code = pool.call(lambda url: _call(url, "status", None, None, "GET", 2))
+    assert isinstance(error, ConnectionFailure)
+    assert backend(pool, refused_url).healthy is False
+
+
+def test_read_timeout_keeps_the_replica_through_the_client(silent_url):
+    pool = make_pool(silent_url)
+    result, error, status_code = pool.call(lambda url: _call(url, "status", None, None, "GET", 0.2))
+    assert result is None and not isinstance(error, ConnectionFailure)
+    assert backend(pool, silent_url).healthy is True
+
+
+def slow_primary(slow_url, delay=0.5):
+    def call(url):
+        if url == slow_url:
+            time.sleep(delay)
+            return {"from": url}, None, 200
+        return {"from": url}, None, 200
+    return call
+
+
+def hedging_pool():
+    pool = make_pool("http://a", "http://b")
+    backend(pool, "http://a").latencies.extend([0.01] * 30)  # p95 -> MIN_HEDGE_DELAY
+    backend(pool, "http://b").latencies.extend([0.02] * 30)
+    return pool
+
+
+def test_slow_request_is_hedged_to_the_other_replica():
+    pool = hedging_pool()
+    limiter = FakeLimiter(slots=1)
+    started = time.monotonic()
+    result, error, status_code = pool.call(slow_primary("http://a"), limiter=limiter, hedge=True)
+    assert result == {"from": "http://b"}
+    assert time.monotonic() - started < 0.4  # did not wait for the slow primary
+    assert (pool.hedges_sent, pool.hedges_won) == (1, 1)
+    assert limiter.slots == 1 and limiter.released == [200]  # the hedge's slot is given back
+
+
+def test_loser_of_a_hedge_is_accounted_for():
+    pool = hedging_pool()
+    pool.call(slow_primary("http://a", delay=0.2), limiter=FakeLimiter(slots=1), hedge=True)
+    deadline = time.monotonic() + 2
+    while backend(pool, "http://a").outstanding and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert backend(pool, "http://a").outstanding == 0
+    assert backend(pool, "http://b").outstanding == 0
+
+
+def test_no_hedge_unless_the_request_asks_or_there_is_capacity():
+    pool = hedging_pool()
+    result, _, _ = pool.call(slow_primary("http://a", delay=0.2), limiter=FakeLimiter(slots=1), hedge=False)
+    assert result == {"from": "http://a"} and pool.hedges_sent == 0
+    result, _, _ = pool.call(slow_primary("http://a", delay=0.2), limiter=FakeLimiter(slots=0), hedge=True)
+    assert result == {"from": "http://a"} and pool.hedges_sent == 0
+
+
+def test_shared_pool_has_no_hedge_setting():
+    urls = ["http://shared-a", "http://shared-b"]
+    assert get_pool(urls) is get_pool(list(urls))
+    assert not hasattr(get_pool(urls), "hedge")
+
+
+def test_health_check_keeps_the_majority_build_and_warm_replicas(monkeypatch, tmp_path):
+    pool = make_pool()
+    builds = {"http://a": ("2024-01-01", "8.0", "g1"), "http://b": ("2024-01-01", "8.0", "g1"),
+              "http://c": ("2023-06-01", "8.0", "g0")}
+    monkeypatch.setattr(BackendPool, "_probe", staticmethod(lambda b, timeout: (True, builds[b.base_url], None)))
+    state = tmp_path / "warmup.json"
+    state.write_text('{"backends": {"http://a": {"fingerprint": ["2024-01-01", "8.0", "g1"]}}}')
+    monkeypatch.setattr(ors_backends, "WARMUP_STATE_FILE", str(state))
+    load = ors_backends.load_warmup_state
+    monkeypatch.setattr(ors_backends, "load_warmup_state", lambda: load(str(state)))
+    pool.check_health()
+    assert [b.available for b in pool.backends] == [True, False, False]
+    assert backend(pool, "http://b").ready is False and backend(pool, "http://c").consistent is False
+    assert pool.choose().base_url == "http://a"
+
+
+def test_first_health_check_runs_before_routing(monkeypatch):
+    pool = BackendPool(["http://a", "http://b"])
+    calls = []
+    monkeypatch.setattr(BackendPool, "_probe", staticmethod(
+        lambda b, timeout: calls.append(b.base_url) or (b.base_url == "http://b", None, None)))
+    monkeypatch.setattr(ors_backends, "WARMUP_STATE_FILE", "/nonexistent/warmup.json")
+    result, _, _ = pool.call(lambda url: ({"from": url}, None, 200))
+    assert sorted(calls) == ["http://a", "http://b"]
+    assert result == {"from": "http://b"}
+
+
+def test_outstanding_counts_stay_balanced_under_concurrency():
+    pool = make_pool()
+    barrier = threading.Barrier(9)
+    in_flight = []
+
+    def call(url):
+        barrier.wait(2)
+        in_flight.append([b.outstanding for b in pool.backends])
+        return {}, None, 200
+
+    threads = [threading.Thread(target=pool.call, args=(call,)) for _ in range(9)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert in_flight[0] == [3, 3, 3]
+    assert [b.outstanding for b in pool.backends] == [0, 0, 0]
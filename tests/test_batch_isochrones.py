@@ -0,0 +1,142 @@
+import copy
+import json
+import threading
+
+import pytest
+
+import ors_batch_isochrones
+from ors_batch_isochrones import load_checkpoint, run
+from ors_planner import DEFAULT_ENDPOINT_LIMITS
+
+BODY = {"range": [600, 1200, 1800], "range_type": "time"}
+
+
+@pytest.fixture
+def limits():
+    limits = copy.deepcopy(DEFAULT_ENDPOINT_LIMITS)
+    limits["isochrones"].update(maximum_locations=3, maximum_intervals=2)
+    return limits
+
+
+@pytest.fixture
+def facilities():
+    return [(f"F{i}", [13.3 + i / 100, 52.5]) for i in range(8)]
+
+
+@pytest.fixture
+def isochrone_send():
+    """send(endpoint, body) answering /isochrones with one point feature per location and range"""
+    lock = threading.Lock()
+    calls = []
+
+    def send(endpoint, body, **options):
+        with lock:
+            calls.append(body)
+            if any(location in send.failing for location in body["locations"]):
+                return None, "HTTP 502"
+        features = [{"type": "Feature", "properties": {"group_index": g, "value": value},
+                     "geometry": {"type": "Point", "coordinates": location}}
+                    for g, location in enumerate(body["locations"]) for value in body["range"]]
+        return {"type": "FeatureCollection", "features": features, "metadata": {}}, None
+
+    send.calls = calls
+    send.failing = []
+    return send
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(ors_batch_isochrones, "RETRY_BACKOFF", 0)
+
+
+def read_features(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def feature_keys(features):
+    return sorted((f["properties"]["facility_id"], f["properties"]["value"]) for f in features)
+
+
+def expected_keys(facilities):
+    return sorted((facility_id, value) for facility_id, _ in facilities for value in BODY["range"])
+
+
+def test_tags_every_isochrone_with_its_facility(tmp_path, facilities, limits, isochrone_send):
+    output = str(tmp_path / "out.geojsonl")
+    report = run(facilities, isochrone_send, limits, BODY, output, workers=2)
+    assert report["requests"] == 3 and report["completed"] == 3 and report["features"] == 24
+    # Three ranges over maximum_intervals=2: every batch goes out as two requests
+    assert len(isochrone_send.calls) == 6
+    assert {len(call["range"]) for call in isochrone_send.calls} == {1, 2}
+    features = read_features(output)
+    assert feature_keys(features) == expected_keys(facilities)
+    locations = dict(facilities)
+    for feature in features:
+        assert feature["geometry"]["coordinates"] == locations[feature["properties"]["facility_id"]]
+
+
+def test_resume_fetches_only_unfinished_batches(tmp_path, facilities, limits, isochrone_send):
+    output = str(tmp_path / "out.geojsonl")
+    isochrone_send.failing = [facilities[4][1]]
+    report = run(facilities, isochrone_send, limits, BODY, output, workers=2)
+    assert [failure["batch"] for failure in report["failed"]] == [1]
+    assert report["failed"][0]["facilities"] == ["F3", "F4", "F5"]
+    assert load_checkpoint(output + ".checkpoint")[0] == {0, 2}
+
+    isochrone_send.failing = []
+    isochrone_send.calls.clear()
+    report = run(facilities, isochrone_send, limits, BODY, output, workers=2)
+    assert report["resumed"] == 2 and report["completed"] == 1 and not report["failed"]
+    assert {tuple(call["locations"][0]) for call in isochrone_send.calls} == {tuple(facilities[3][1])}
+    assert feature_keys(read_features(output)) == expected_keys(facilities)
+
+
+def test_resume_truncates_to_the_last_checkpoint(tmp_path, facilities, limits, isochrone_send):
+    output = str(tmp_path / "out.geojsonl")
+    run(facilities, isochrone_send, limits, BODY, output, workers=2)
+    with open(output, "rb") as f:
+        complete = f.read()
+    # A crash mid-write: a feature with no checkpoint entry, and a torn checkpoint line
+    with open(output, "ab") as f:
+        f.write(b'{"type":"Feature","properties":{"facility_id":"F0"')
+    with open(output + ".checkpoint", "a", encoding="utf-8") as f:
+        f.write('{"batch": 1, "off')
+    assert load_checkpoint(output + ".checkpoint") == ({0, 1, 2}, len(complete))
+
+    isochrone_send.calls.clear()
+    report = run(facilities, isochrone_send, limits, BODY, output, workers=2)
+    assert report["resumed"] == 3 and report["completed"] == 0 and not isochrone_send.calls
+    with open(output, "rb") as f:
+        assert f.read() == complete
+
+
+def test_torn_line_drops_only_the_unrecorded_batch(tmp_path, facilities, limits, isochrone_send):
+    output = str(tmp_path / "out.geojsonl")
+    run(facilities, isochrone_send, limits, BODY, output, workers=1)
+    with open(output + ".checkpoint", encoding="utf-8") as f:
+        entries = f.read().splitlines()
+    # The crash tore the last checkpoint entry: its batch runs again, its features are cut first
+    with open(output + ".checkpoint", "w", encoding="utf-8") as f:
+        f.write("\n".join(entries[:-1]) + "\n" + entries[-1][:5])
+    isochrone_send.calls.clear()
+    report = run(facilities, isochrone_send, limits, BODY, output, workers=1)
+    assert report["resumed"] == 2 and report["completed"] == 1
+    assert feature_keys(read_features(output)) == expected_keys(facilities)
+
+
+def test_retries_back_off_exponentially(tmp_path, facilities, limits, isochrone_send, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(ors_batch_isochrones, "RETRY_BACKOFF", 0.25)
+    monkeypatch.setattr(ors_batch_isochrones.time, "sleep", sleeps.append)
+    isochrone_send.failing = [facilities[0][1]]
+    report = run(facilities[:3], isochrone_send, limits, BODY, str(tmp_path / "out.geojsonl"), workers=1)
+    assert report["failed"][0]["error"].endswith("HTTP 502")
+    assert sleeps == [0.25, 0.5]
+
+
+def test_local_rejections_are_not_retried(tmp_path, facilities, limits, isochrone_send):
+    body = dict(BODY, range=[99999])
+    report = run(facilities[:3], isochrone_send, limits, body, str(tmp_path / "out.geojsonl"))
+    assert report["failed"][0]["error"].startswith("Rejected locally")
+    assert not isochrone_send.calls
@@ -0,0 +1,89 @@
+from ors_cache import ResultCache, cache_key
+from ors_legs import LegCache, leg_key, send_directions
+
+ENDPOINT = "directions/driving-car"
+LIMITS = {"profiles": {"driving-car": {"maximum_distance": 100000, "maximum_waypoints": 50}}}
+STOPS = [[8.68 + i * 0.01, 49.41 + (i % 2) * 0.01] for i in range(6)]
+BODY = {"coordinates": STOPS, "format": "geojson", "instructions": True, "preference": "fastest"}
+PRIMARY = "http://localhost:8080/ors/v2"
+OTHER = "http://other:8080/ors/v2"
+
+
+def test_cache_key_ignores_key_order():
+    assert (cache_key(ENDPOINT, "POST", data={"a": 1, "b": [1, 2]}, base_url=PRIMARY)
+            == cache_key(ENDPOINT, "POST", data={"b": [1, 2], "a": 1}, base_url=PRIMARY))
+
+
+def test_cache_key_tells_requests_apart():
+    key = cache_key(ENDPOINT, "POST", data=BODY, base_url=PRIMARY)
+    assert key != cache_key("directions/cycling-regular", "POST", data=BODY, base_url=PRIMARY)
+    assert key != cache_key(ENDPOINT, "GET", data=BODY, base_url=PRIMARY)
+    assert key != cache_key(ENDPOINT, "POST", data=dict(BODY, preference="shortest"), base_url=PRIMARY)
+    assert key != cache_key(ENDPOINT, "POST", {"api_key": "x"}, BODY, PRIMARY)
+
+
+def test_cache_key_keeps_backends_apart():
+    assert (cache_key(ENDPOINT, "POST", data=BODY, base_url=PRIMARY)
+            != cache_key(ENDPOINT, "POST", data=BODY, base_url=OTHER))
+    assert cache_key(ENDPOINT, "POST", data=BODY) != cache_key(ENDPOINT, "POST", data=BODY, base_url=PRIMARY)
+
+
+def test_result_cache_round_trip(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    key = cache_key(ENDPOINT, "POST", data=BODY, base_url=PRIMARY)
+    assert cache.get(key) is None
+    cache.put(key, ENDPOINT, b'{"routes": []}')
+    assert cache.get(key) == b'{"routes": []}'
+    assert cache.set_fingerprint(["build-1"]) is True
+    assert cache.get(key) is None
+    assert cache.set_fingerprint(["build-1"]) is False
+    cache.close()
+
+
+def test_leg_key_is_shared_by_routes_with_the_same_leg():
+    other_route = dict(BODY, coordinates=[[9.0, 50.0]] + STOPS[2:4] + [[9.1, 50.1]])
+    assert leg_key(ENDPOINT, BODY, 2, PRIMARY) == leg_key(ENDPOINT, other_route, 1, PRIMARY)
+    assert leg_key(ENDPOINT, BODY, 2, PRIMARY) != leg_key(ENDPOINT, BODY, 3, PRIMARY)
+
+
+def test_leg_key_covers_options_and_backend():
+    key = leg_key(ENDPOINT, BODY, 0, PRIMARY)
+    assert key != leg_key(ENDPOINT, dict(BODY, preference="shortest"), 0, PRIMARY)
+    assert key != leg_key(ENDPOINT, BODY, 0, OTHER)
+    # Per-waypoint options only count for the leg's own two waypoints
+    radiuses = [50] * len(STOPS)
+    changed = list(radiuses)
+    changed[4] = 500
+    assert leg_key(ENDPOINT, dict(BODY, radiuses=radiuses), 0, PRIMARY) \
+        == leg_key(ENDPOINT, dict(BODY, radiuses=changed), 0, PRIMARY)
+    assert leg_key(ENDPOINT, dict(BODY, radiuses=radiuses), 3, PRIMARY) \
+        != leg_key(ENDPOINT, dict(BODY, radiuses=changed), 3, PRIMARY)
+
+
+def test_send_directions_only_requests_changed_legs(directions_send):
+    cache = LegCache()
+    first, error = send_directions(ENDPOINT, BODY, directions_send, LIMITS, cache, base_url=PRIMARY)
+    assert error is None
+    assert len(cache) == len(STOPS) - 1
+
+    moved = [list(p) for p in STOPS]
+    moved[3] = [8.715, 49.43]
+    second, error = send_directions(ENDPOINT, dict(BODY, coordinates=moved), directions_send, LIMITS, cache,
+                                    base_url=PRIMARY)
+    assert error is None
+    assert directions_send.calls[-1]["coordinates"] == moved[2:5]
+    assert second["metadata"]["cached_legs"] == 3
+    whole, _ = directions_send(ENDPOINT, dict(BODY, coordinates=moved))
+    assert second["features"][0]["properties"]["way_points"] == whole["features"][0]["properties"]["way_points"]
+    assert second["features"][0]["geometry"] == whole["features"][0]["geometry"]
+
+
+def test_send_directions_does_not_share_legs_across_backends(directions_send):
+    cache = LegCache()
+    send_directions(ENDPOINT, BODY, directions_send, LIMITS, cache, base_url=PRIMARY)
+    calls = len(directions_send.calls)
+    send_directions(ENDPOINT, BODY, directions_send, LIMITS, cache, base_url=OTHER)
+    assert len(directions_send.calls) == calls + 1
+    assert directions_send.calls[-1]["coordinates"] == STOPS
+    send_directions(ENDPOINT, BODY, directions_send, LIMITS, cache, base_url=PRIMARY)
+    assert len(directions_send.calls) == calls + 1
@@ -0,0 +1,104 @@
+import math
+
+import numpy as np
+import pytest
+
+from ors_coalesce import METRES_PER_DEGREE, coalesce
+from ors_matrix import LocationMatrix, attach_matrices
+
+
+def brute_force(points, radius):
+    """Leader clustering by scanning every leader: each point joins its nearest leader within radius"""
+    leaders, labels = [], []
+    for lon, lat in points:
+        scale = math.cos(math.radians(lat)) * METRES_PER_DEGREE
+        distances = [math.hypot((lon - points[r][0]) * scale, (lat - points[r][1]) * METRES_PER_DEGREE)
+                     for r in leaders]
+        best = int(np.argmin(distances)) if distances else None
+        if best is None or distances[best] > radius:
+            best = len(leaders)
+            leaders.append(len(labels))
+        labels.append(best)
+    return labels, leaders
+
+
+def offset(point, east, north):
+    """point moved by east/north metres"""
+    lon, lat = point
+    return [lon + east / (math.cos(math.radians(lat)) * METRES_PER_DEGREE), lat + north / METRES_PER_DEGREE]
+
+
+def test_identical_points_share_the_first_occurrence():
+    points = [[106.8, -6.2], [106.9, -6.3], [106.8, -6.2], [106.8 + 1e-8, -6.2], [106.9, -6.3]]
+    groups = coalesce(points, radius=0)
+    assert groups.labels.tolist() == [0, 1, 0, 0, 1]
+    assert groups.leaders.tolist() == [0, 1]
+    assert groups.representatives.tolist() == [points[0], points[1]]
+    assert groups.reduction == pytest.approx(0.6)
+
+
+def test_radius_zero_keeps_nearby_points_apart():
+    depot = [106.8, -6.2]
+    groups = coalesce([depot, offset(depot, 2, 0)], radius=0)
+    assert len(groups) == 2
+
+
+def test_points_within_radius_of_the_leader_merge():
+    depot = [106.8, -6.2]
+    points = [depot, offset(depot, 10, 0), offset(depot, 0, -14), offset(depot, 20, 0), offset(depot, 28, 0)]
+    groups = coalesce(points, radius=15)
+    assert groups.labels.tolist() == [0, 0, 0, 1, 1]
+    assert groups.leaders.tolist() == [0, 3]
+    assert groups.representatives.tolist() == [points[0], points[3]]
+
+
+@pytest.mark.parametrize("latitude", [-6.2, 52.5, 78.2, -77.8])
+def test_grid_matches_brute_force_across_cell_borders(latitude):
+    radius = 15.0
+    cell_lat = radius / METRES_PER_DEGREE
+    cell_lon = cell_lat / math.cos(math.radians(abs(latitude) + 0.001))
+    rng = np.random.default_rng(3)
+    # Points scattered tightly around grid corners, so neighbours fall into different cells
+    corners = np.array([[(100 + i) * cell_lon, math.floor(latitude / cell_lat + j) * cell_lat]
+                        for i in range(4) for j in range(4)])
+    points = (corners[rng.integers(0, len(corners), 400)] + rng.normal(0, cell_lat / 3, (400, 2))).tolist()
+    groups = coalesce(points, radius)
+    labels, leaders = brute_force(points, radius)
+    assert groups.labels.tolist() == labels
+    assert groups.leaders.tolist() == leaders
+    assert 1 < len(groups) < len(points)
+
+
+def test_empty_input():
+    for radius in (0, 15):
+        groups = coalesce([], radius)
+        assert len(groups) == 0 and groups.labels.tolist() == [] and groups.reduction == 0.0
+
+
+def test_attach_matrices_shares_indices_between_repeated_places(matrix_send):
+    depot = [106.8, -6.2]
+    shop = [106.85, -6.25]
+    body = {"vehicles": [{"id": 1, "profile": "driving-car", "start": depot, "end": depot},
+                         {"id": 2, "profile": "driving-car", "start": shop}],
+            "jobs": [{"id": 10, "location": shop}, {"id": 11, "location": [106.9, -6.3]},
+                     {"id": 12, "location": depot}, {"id": 13, "location": offset(shop, 5, 5)}]}
+    matrices = {}
+
+    def matrix_for(profile):
+        return matrices.setdefault(profile, LocationMatrix(profile))
+
+    attached, error = attach_matrices(body, matrix_for, matrix_send, radius=0)
+    assert error is None
+    vehicles, jobs = attached["vehicles"], attached["jobs"]
+    assert vehicles[0]["start_index"] == vehicles[0]["end_index"] == jobs[2]["location_index"]
+    assert vehicles[1]["start_index"] == jobs[0]["location_index"]
+    assert jobs[3]["location_index"] not in (jobs[0]["location_index"], jobs[2]["location_index"])
+    assert len(attached["matrices"]["driving-car"]["durations"]) == 4
+    assert "location_index" not in body["jobs"][0]  # the caller's body is left as it was
+
+    attached, _ = attach_matrices(body, matrix_for, matrix_send, radius=15)
+    assert attached["jobs"][3]["location_index"] == attached["jobs"][0]["location_index"]
+    assert len(attached["matrices"]["driving-car"]["durations"]) == 3
+    for job in attached["jobs"]:
+        row = attached["matrices"]["driving-car"]["durations"][job["location_index"]]
+        assert row[job["location_index"]] == 0
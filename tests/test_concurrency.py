@@ -0,0 +1,144 @@
+import threading
+import time
+
+import pytest
+
+import ors_client
+import ors_concurrency
+from ors_concurrency import AdaptiveConcurrencyLimiter
+from ors_scheduler import RequestScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ors_concurrency, "time", clock)
+    return clock
+
+
+def sample(limiter, clock, latency, in_flight):
+    """Release one request that took latency seconds with in_flight requests out when it started"""
+    token = limiter.try_acquire()
+    clock.advance(latency)
+    return limiter.release(dict(token, in_flight=in_flight))
+
+
+def wait_until(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_latency_is_measured_on_the_clock(clock):
+    limiter = AdaptiveConcurrencyLimiter()
+    token = limiter.acquire()
+    assert token == {"start": 1000.0, "in_flight": 1}
+    clock.advance(0.25)
+    assert limiter.release(token) == 0.25
+    assert limiter.rtt_noload == limiter.rtt_short == 0.25
+    assert limiter.limit == 4  # the first sample only sets the baseline
+
+
+def test_limit_grows_while_latency_holds(clock):
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=4)
+    sample(limiter, clock, 0.1, 4)
+    sample(limiter, clock, 0.1, 4)
+    # gradient 1: limit + sqrt(limit), smoothed by 0.2
+    assert limiter.limit == pytest.approx(4 * 0.8 + (4 + 2) * 0.2)
+    for _ in range(200):
+        sample(limiter, clock, 0.1, int(limiter.limit))
+    assert limiter.limit == 64  # max_limit
+
+
+def test_limit_does_not_grow_when_unused(clock):
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8)
+    for _ in range(10):
+        sample(limiter, clock, 0.1, 3)
+    assert limiter.limit == 8 and limiter.samples == 10
+
+
+def test_limit_shrinks_when_latency_climbs(clock):
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=16)
+    sample(limiter, clock, 0.1, 16)
+    limits = []
+    for _ in range(40):
+        sample(limiter, clock, 1.0, 16)
+        limits.append(limiter.limit)
+    assert limits[-1] < 16
+    assert limits[-10:] == sorted(limits[-10:], reverse=True)
+    assert 0.1 < limiter.rtt_noload < 0.2  # the no-load RTT only creeps towards the new latency
+
+
+def test_overload_cuts_the_limit_multiplicatively(clock):
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8, min_limit=2)
+    sample(limiter, clock, 0.1, 1)
+    limiter.release(limiter.try_acquire(), status_code=503)
+    assert limiter.limit == 6 and limiter.drops == 1
+    limiter.release(limiter.try_acquire(), failed=True)
+    assert limiter.limit == 4.5 and limiter.drops == 2
+    for _ in range(5):
+        limiter.release(limiter.try_acquire(), status_code=429)
+    assert limiter.limit == 2  # min_limit
+    limiter.release(limiter.try_acquire(), status_code=404)  # a client error is an ordinary sample
+    assert limiter.drops == 7 and limiter.samples == 2
+
+
+def test_try_acquire_only_takes_free_slots(clock):
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2)
+    tokens = [limiter.try_acquire(), limiter.try_acquire()]
+    assert [token["in_flight"] for token in tokens] == [1, 2]
+    assert limiter.try_acquire() is None
+    limiter.release(tokens.pop())
+    assert limiter.try_acquire()["in_flight"] == 2
+
+
+def test_try_acquire_does_not_jump_the_queue(clock):
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1)
+    held = limiter.try_acquire()
+    served = []
+    waiter = threading.Thread(target=lambda: served.append(limiter.acquire()))
+    waiter.start()
+    wait_until(lambda: limiter.snapshot()["queued"] == 1)
+    limiter.limit = 2  # a slot is free, but the waiter was first
+    assert limiter.try_acquire() is None
+    limiter.release(held)
+    waiter.join(5)
+    assert len(served) == 1 and limiter.in_flight == 1 and limiter.queued == 0
+
+
+def test_timed_out_waiter_gives_up_its_place(clock):
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1)
+    held = limiter.acquire()
+    with pytest.raises(TimeoutError):
+        limiter.acquire(timeout=0)
+    assert limiter.queued == 0
+    limiter.release(held)
+    # With the abandoned ticket still in line, this would time out too
+    assert limiter.acquire(timeout=0)["in_flight"] == 1
+
+
+def test_client_releases_the_slot_when_a_call_raises(clock, monkeypatch):
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=4)
+    monkeypatch.setattr(ors_client, "get_scheduler", lambda: RequestScheduler(limiter))
+    monkeypatch.setattr(ors_client, "get_dispatcher", lambda: None)
+
+    def broken_call(*args):
+        raise RuntimeError("bug in the response handling")
+
+    monkeypatch.setattr(ors_client, "_call", broken_call)
+    with pytest.raises(RuntimeError):
+        ors_client.send_request("http://localhost:1/ors/v2", "matrix/driving-car", data={}, method="POST",
+                                traces=[])
+    assert limiter.in_flight == 0 and limiter.drops == 1 and limiter.limit == 3
@@ -0,0 +1,158 @@
+import threading
+
+import pytest
+
+from ors_dispatch import DispatchEngine
+
+DEPOT = [0.0, 0.0]
+
+
+def job(job_id, lon, lat=0.0, **fields):
+    return dict(fields, id=job_id, location=[lon, lat])
+
+
+@pytest.fixture
+def solutions():
+    """Routes the fake /optimization answers with, as {vehicle: [job ids]}"""
+    return {}
+
+
+@pytest.fixture
+def send(matrix_send, solutions):
+    def send(endpoint, body, arrays=False):
+        if endpoint == "optimization":
+            if solutions.get("fail"):
+                return None, "VROOM is down"
+            routes = [{"vehicle": vehicle, "steps": [{"type": "start"}] + [{"type": "job", "id": j} for j in jobs]}
+                      for vehicle, jobs in solutions.items()]
+            return {"routes": routes}, None
+        return matrix_send(endpoint, body, arrays)
+
+    send.matrix_calls = matrix_send.calls
+    return send
+
+
+def engine_for(send, *vehicles):
+    return DispatchEngine(list(vehicles) or [{"id": 1, "start": DEPOT, "end": DEPOT}], send, reoptimize_every=None)
+
+
+def test_job_goes_to_its_cheapest_position(send):
+    engine = engine_for(send, {"id": 1, "start": DEPOT})
+    assert engine.add_job(job("a", 0.01))["added_s"] == 10.0
+    assert engine.add_job(job("c", 0.03))["added_s"] == 20.0
+    outcome = engine.add_job(job("b", 0.02))
+    assert (outcome["vehicle"], outcome["position"], outcome["added_s"]) == (1, 1, 0.0)
+    assert engine.plan()["routes"][0]["jobs"] == ["a", "b", "c"]
+    assert engine.cost() == 30.0
+
+
+def test_round_trips_pay_for_the_way_back(send):
+    engine = engine_for(send)
+    assert engine.add_job(job("a", 0.01))["added_s"] == 20.0
+    assert engine.cost() == 20.0
+
+
+def test_open_ended_routes_only_pay_for_the_way_there(send):
+    engine = engine_for(send, {"id": 1, "start": DEPOT})
+    engine.add_job(job("a", 0.01))
+    assert engine.add_job(job("b", 0.03))["added_s"] == 20.0
+    assert engine.plan()["routes"][0]["jobs"] == ["a", "b"]
+
+
+def test_only_the_new_row_and_column_are_fetched(send):
+    engine = engine_for(send)
+    engine.add_job(job("a", 0.01))
+    outcome = engine.add_job(job("b", 0.02))
+    # Slots are start, end, a and b: b's row (4 cells) plus b's column for the other three
+    assert outcome["cells"] == 4 + 3
+    assert send.matrix_calls[-1]["sources"] == [0, 1, 2] and send.matrix_calls[-1]["destinations"] == [3]
+
+
+def test_capacity_moves_jobs_to_another_vehicle_or_leaves_them_unassigned(send):
+    engine = engine_for(send, {"id": 1, "start": DEPOT, "capacity": [1]},
+                        {"id": 2, "start": [0.1, 0.0], "capacity": [1]})
+    assert engine.add_job(job("a", 0.01, delivery=[1]))["vehicle"] == 1
+    assert engine.add_job(job("b", 0.02, delivery=[1]))["vehicle"] == 2
+    outcome = engine.add_job(job("c", 0.03, delivery=[1]))
+    assert outcome["vehicle"] is None
+    assert engine.plan()["unassigned"] == ["c"]
+
+
+def test_time_windows_and_shifts_are_respected(send):
+    engine = engine_for(send, {"id": 1, "start": DEPOT, "end": DEPOT, "time_window": [0, 100]})
+    assert engine.add_job(job("late", 0.01, time_windows=[[0, 5]]))["vehicle"] is None
+    assert engine.add_job(job("far", 0.2))["vehicle"] is None  # 400 s there and back, over the shift
+    assert engine.add_job(job("near", 0.01, service=30))["vehicle"] == 1
+    assert engine.add_job(job("busy", 0.02, service=60))["vehicle"] is None
+    assert engine.plan()["unassigned"] == ["late", "far", "busy"]
+
+
+def test_cancel_frees_room_for_unassigned_jobs(send):
+    engine = engine_for(send, {"id": 1, "start": DEPOT, "capacity": [1]})
+    engine.add_job(job("a", 0.01, delivery=[1]))
+    engine.add_job(job("b", 0.02, delivery=[1]))
+    calls = len(send.matrix_calls)
+    outcome = engine.cancel_job("a")
+    assert (outcome["vehicle"], outcome["reassigned"]) == (1, ["b"])
+    assert engine.plan()["routes"][0]["jobs"] == ["b"] and engine.plan()["unassigned"] == []
+    assert len(send.matrix_calls) == calls  # dropping a row fetches nothing
+    assert len(engine.matrix) == 2
+    assert engine.cancel_job("a")["error"] == "Unknown job id"
+
+
+def test_duplicate_ids_are_rejected(send):
+    engine = engine_for(send)
+    engine.add_job(job("a", 0.01))
+    assert engine.add_job(job("a", 0.02))["error"] == "Job id already in the plan"
+
+
+def test_reoptimize_adopts_only_a_cheaper_plan(send, solutions):
+    engine = engine_for(send, {"id": 1, "start": DEPOT})
+    for j in (job("a", 0.01), job("b", 0.02), job("c", 0.03)):
+        engine.add_job(j)
+    engine.routes[1] = ["c", "a", "b"]  # what arrival order can leave behind: 60 s
+    solutions[1] = ["a", "c", "b"]  # 40 s: adopted
+    assert engine.reoptimize() is True
+    assert engine.routes[1] == ["a", "c", "b"]
+    engine.routes[1] = ["a", "b", "c"]  # 30 s
+    solutions[1] = ["c", "b", "a"]  # 50 s: kept out
+    assert engine.reoptimize() is False
+    assert engine.routes[1] == ["a", "b", "c"]
+    solutions.clear()
+    solutions["fail"] = True
+    assert engine.reoptimize() is False
+    assert engine.reoptimizations == {"runs": 3, "adopted": 1, "failed": 1}
+
+
+def test_reoptimize_keeps_jobs_the_solver_did_not_know(send, solutions):
+    engine = engine_for(send, {"id": 1, "start": DEPOT})
+    for j in (job("a", 0.01), job("b", 0.02)):
+        engine.add_job(j)
+    engine.routes[1] = ["b", "a"]
+    solutions[1] = ["a"]  # e.g. b arrived while the solve was running
+    assert engine.reoptimize() is True
+    assert engine.routes[1] == ["a", "b"]
+
+
+def test_plan_is_readable_while_a_matrix_is_fetched(matrix_send):
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_send(endpoint, body, arrays=False):
+        if len(matrix_send.calls) >= 1:
+            entered.set()
+            release.wait(5)
+        return matrix_send(endpoint, body, arrays)
+
+    engine = engine_for(slow_send, {"id": 1, "start": DEPOT})
+    engine.add_job(job("a", 0.01))
+    adding = threading.Thread(target=engine.add_job, args=(job("b", 0.02),))
+    adding.start()
+    assert entered.wait(5)
+    reader = threading.Thread(target=engine.plan)
+    reader.start()
+    reader.join(1)
+    blocked = reader.is_alive()
+    release.set()
+    adding.join(5)
+    assert not blocked
+    assert engine.plan()["routes"][0]["jobs"] == ["a", "b"]
@@ -0,0 +1,142 @@
+import json
+import os
+
+import pytest
+import yaml
+
+import ors_graphs
+from ors_graphs import GRAPH_COMPLETE_FILE, MANIFEST_NAME, decide, plan, prepare
+
+
+def graph_folder(root, name, complete=True):
+    path = os.path.join(root, name)
+    os.makedirs(path)
+    with open(os.path.join(path, "edges"), "w") as f:
+        f.write("x")
+    if complete:
+        open(os.path.join(path, GRAPH_COMPLETE_FILE), "w").close()
+    return path
+
+
+@pytest.mark.parametrize("folder, built, pending, force, expected", [
+    (None, None, None, False, "build"),
+    ("empty", {"fingerprint": "new"}, None, False, "build"),
+    ("complete", {"fingerprint": "new"}, None, False, "reuse"),
+    ("complete", {"fingerprint": "new"}, None, True, "reuse"),
+    ("complete", {"fingerprint": "old"}, None, False, "rebuild"),
+    ("complete", None, None, False, "adopt"),
+    ("complete", None, "new", False, "adopt"),
+    ("complete", None, "old", False, "rebuild"),
+    ("partial", None, None, False, "incomplete"),
+    ("partial", None, "old", False, "rebuild"),
+    ("complete", None, None, True, "rebuild"),
+    ("partial", None, None, True, "rebuild"),
+])
+def test_decide(tmp_path, folder, built, pending, force, expected):
+    graph_dir = str(tmp_path / "car")
+    if folder == "empty":
+        os.makedirs(graph_dir)
+    elif folder is not None:
+        graph_folder(str(tmp_path), "car", complete=folder == "complete")
+    assert decide("new", graph_dir, built, pending, force) == expected
+
+
+@pytest.fixture
+def host(tmp_path):
+    """An ors-docker folder with a PBF and a config enabling car and bike"""
+    os.makedirs(tmp_path / "files")
+    (tmp_path / "files" / "region.osm.pbf").write_bytes(b"pbf")
+    engine = {"source_file": "/home/ors/files/region.osm.pbf", "graphs_root_path": "/home/ors/graphs",
+              "profile_default": {"elevation": False},
+              "profiles": {"car": {"enabled": True, "profile": "driving-car"},
+                           "bike": {"enabled": True, "profile": "cycling-regular"},
+                           "walk": {"enabled": False, "profile": "foot-walking"}}}
+    config = tmp_path / "ors-config.yml"
+    config.write_text(yaml.safe_dump({"ors": {"engine": engine}}))
+    return tmp_path, str(config), engine
+
+
+def rewrite(config, engine):
+    with open(config, "w") as f:
+        yaml.safe_dump({"ors": {"engine": engine}}, f)
+
+
+def test_plan_only_covers_enabled_profiles(host):
+    root, config, _ = host
+    current = plan(config, str(root))
+    assert current["graphs_root"] == os.path.join(str(root), "graphs")
+    assert current["decisions"] == {"car": "build", "bike": "build"}
+
+
+def test_prepare_then_finished_build_is_reused(host):
+    root, config, _ = host
+    current = plan(config, str(root))
+    manifest = prepare(current)
+    assert manifest["pending"] == current["fingerprints"]
+    for name in ("car", "bike"):
+        graph_folder(current["graphs_root"], name)
+    # What monitor records once the build has finished
+    manifest["profiles"] = {name: {"fingerprint": fp} for name, fp in current["fingerprints"].items()}
+    ors_graphs.save_manifest(current["graphs_root"], manifest)
+    assert plan(config, str(root))["decisions"] == {"car": "reuse", "bike": "reuse"}
+
+
+def test_changed_profile_section_only_rebuilds_that_profile(host):
+    root, config, engine = host
+    current = plan(config, str(root))
+    for name in ("car", "bike"):
+        graph_folder(current["graphs_root"], name)
+    current["manifest"]["profiles"] = {name: {"fingerprint": fp} for name, fp in current["fingerprints"].items()}
+    ors_graphs.save_manifest(current["graphs_root"], current["manifest"])
+
+    engine["profiles"]["bike"]["maximum_distance"] = 200000
+    rewrite(config, engine)
+    current = plan(config, str(root))
+    assert current["decisions"] == {"car": "reuse", "bike": "rebuild"}
+    manifest = prepare(current)
+    assert os.path.isdir(os.path.join(current["graphs_root"], "car"))
+    assert not os.path.exists(os.path.join(current["graphs_root"], "bike"))
+    assert list(manifest["pending"]) == ["bike"]
+    assert "bike" not in manifest["profiles"]
+
+
+def test_changed_shared_settings_rebuild_everything(host):
+    root, config, engine = host
+    current = plan(config, str(root))
+    for name in ("car", "bike"):
+        graph_folder(current["graphs_root"], name)
+    current["manifest"]["profiles"] = {name: {"fingerprint": fp} for name, fp in current["fingerprints"].items()}
+    ors_graphs.save_manifest(current["graphs_root"], current["manifest"])
+
+    engine["profile_default"]["elevation"] = True
+    rewrite(config, engine)
+    assert plan(config, str(root))["decisions"] == {"car": "rebuild", "bike": "rebuild"}
+
+
+def test_unrecorded_graphs_are_adopted_or_left_alone(host):
+    root, config, _ = host
+    graphs_root = os.path.join(str(root), "graphs")
+    graph_folder(graphs_root, "car")
+    graph_folder(graphs_root, "bike", complete=False)
+    current = plan(config, str(root))
+    assert current["decisions"] == {"car": "adopt", "bike": "incomplete"}
+
+    manifest = prepare(current)
+    assert os.path.isdir(os.path.join(graphs_root, "car"))
+    assert os.path.isdir(os.path.join(graphs_root, "bike"))
+    assert manifest["profiles"]["car"]["fingerprint"] == current["fingerprints"]["car"]
+    assert list(manifest["pending"]) == ["bike"]
+    with open(os.path.join(graphs_root, MANIFEST_NAME)) as f:
+        assert json.load(f) == manifest
+    assert plan(config, str(root))["decisions"]["car"] == "reuse"
+
+
+def test_force_deletes_unrecorded_graphs(host):
+    root, config, _ = host
+    graphs_root = os.path.join(str(root), "graphs")
+    graph_folder(graphs_root, "car")
+    graph_folder(graphs_root, "bike", complete=False)
+    current = plan(config, str(root), force=True)
+    assert current["decisions"] == {"car": "rebuild", "bike": "rebuild"}
+    prepare(current)
+    assert os.listdir(graphs_root) == [MANIFEST_NAME]
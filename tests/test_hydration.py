@@ -0,0 +1,84 @@
+import pytest
+
+from ors_hydration import hydrate_routes, route_coordinates
+from ors_legs import LegCache
+
+LIMITS = {"profiles": {profile: {"maximum_distance": 100000, "maximum_waypoints": 50}
+                       for profile in ("driving-car", "cycling-regular")}}
+DEPOT = [8.68, 49.41]
+JOBS = [{"id": i, "location": [8.68 + i * 0.01, 49.42]} for i in range(1, 5)]
+BODY = {"jobs": JOBS, "vehicles": [{"id": 1, "start": DEPOT, "end": DEPOT},
+                                   {"id": 2, "profile": "cycling-regular", "start": DEPOT, "end": DEPOT},
+                                   {"id": 3, "profile": "cycling-regular", "start": DEPOT}]}
+
+
+def route(vehicle, job_ids):
+    steps = [{"type": "start", "location": DEPOT}]
+    steps += [{"type": "job", "job": job_id} for job_id in job_ids]  # job ids only, as some solvers answer
+    steps.append({"type": "end", "location": DEPOT})
+    return {"vehicle": vehicle, "steps": steps}
+
+
+RESULT = {"code": 0, "routes": [route(1, [1, 2]), route(2, [3, 4]), {"vehicle": 3, "steps": [
+    {"type": "start", "location": DEPOT}]}]}
+
+
+@pytest.fixture
+def send(directions_send):
+    """directions_send that also records endpoints, and fails for endpoints in send.failing"""
+    def send(endpoint, body, arrays=False):
+        send.endpoints.append(endpoint)
+        if endpoint in send.failing:
+            return None, "HTTP 503"
+        return directions_send(endpoint, body)
+
+    send.calls = directions_send.calls
+    send.endpoints = []
+    send.failing = []
+    return send
+
+
+def test_route_coordinates_fill_in_job_locations():
+    steps = route(1, [2]).get("steps") + [{"type": "break", "id": 7}]
+    assert route_coordinates({"steps": steps}, JOBS) == [DEPOT, JOBS[1]["location"], DEPOT]
+
+
+def test_each_vehicle_is_routed_with_its_profile(send):
+    hydrated, error = hydrate_routes(RESULT, BODY, send, LIMITS, cache=LegCache())
+    assert error is None
+    assert sorted(send.endpoints) == ["directions/cycling-regular", "directions/driving-car"]
+    by_vehicle = {r["vehicle"]: r for r in hydrated["routes"]}
+    first = by_vehicle[1]
+    assert first["geometry"]["coordinates"][0] == DEPOT
+    assert first["geometry"]["coordinates"][2] == JOBS[0]["location"]
+    assert first["legs"] == [{"distance": 100.0, "duration": 10.0}] * 3
+    assert first["hydrated"] == {"distance": 300.0, "duration": 30.0}
+    assert by_vehicle[2]["geometry"]["coordinates"][2] == JOBS[2]["location"]
+    assert by_vehicle[3] == RESULT["routes"][2]  # unused: nothing to route
+    assert "geometry" not in RESULT["routes"][0]  # the input result is left alone
+
+
+def test_failed_vehicle_keeps_its_route(send):
+    send.failing = ["directions/cycling-regular"]
+    hydrated, error = hydrate_routes(RESULT, BODY, send, LIMITS, cache=LegCache())
+    assert error == "1 of 3 routes without geometry (vehicle 2: HTTP 503)"
+    assert "geometry" in hydrated["routes"][0]
+    assert hydrated["routes"][1] == RESULT["routes"][1]
+
+
+def test_legs_come_from_the_cache(send):
+    cache = LegCache()
+    first, _ = hydrate_routes(RESULT, BODY, send, LIMITS, cache=cache)
+    assert len(send.calls) == 2 and len(cache) == 6
+
+    again, error = hydrate_routes(RESULT, BODY, send, LIMITS, cache=cache)
+    assert error is None and len(send.calls) == 2
+    assert [r.get("geometry") for r in again["routes"]] == [r.get("geometry") for r in first["routes"]]
+
+    # A re-plan that gives vehicle 1 one more stop requests only the legs after its last unchanged one
+    replanned = dict(RESULT, routes=[route(1, [1, 2, 4])] + RESULT["routes"][1:])
+    hydrated, error = hydrate_routes(replanned, BODY, send, LIMITS, cache=cache)
+    assert error is None and len(send.calls) == 3
+    assert send.calls[-1]["coordinates"] == [JOBS[1]["location"], JOBS[3]["location"], DEPOT]
+    stops = [DEPOT] + [JOBS[i]["location"] for i in (0, 1, 3)] + [DEPOT]
+    assert hydrated["routes"][0]["geometry"]["coordinates"][::2] == stops
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from conftest import travel_time
+from ors_landmarks import ROUNDING_SLACK, Landmarks, select_landmarks
+
+LIMITS = {"matrix": {"maximum_routes": 200}}
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(7)
+    return np.column_stack([8.6 + rng.random(80) * 0.4, 49.3 + rng.random(80) * 0.3]).tolist()
+
+
+@pytest.fixture
+def landmarks(points, matrix_send):
+    built, error = Landmarks.build(points, "driving-car", matrix_send, LIMITS, count=6)
+    assert error is None
+    return built
+
+
+def exact(points):
+    return np.array([[travel_time(a, b) for b in points] for a in points])
+
+
+def test_select_landmarks_picks_distinct_points(points):
+    chosen = select_landmarks(points, 6)
+    assert len(set(chosen.tolist())) == 6
+
+
+def test_build_fetches_two_landmark_matrices(landmarks, matrix_send):
+    assert landmarks.from_landmark.shape == (6, 80)
+    assert landmarks.to_landmark.shape == (80, 6)
+    assert landmarks.stats["cells_fetched"] == 2 * 6 * 80
+    assert len(matrix_send.calls) > 2  # tiled to the 200-route limit
+
+
+def test_bounds_enclose_the_exact_values(landmarks, points):
+    lower, upper = landmarks.bounds(np.arange(len(points)))
+    truth = exact(points)
+    tolerance = ROUNDING_SLACK + 1e-9  # two cells rounded to 0.1 can be off by exactly the slack
+    assert (lower <= truth + tolerance).all()
+    assert (upper >= truth - tolerance).all()
+    assert (np.diag(lower) == 0).all() and (np.diag(upper) == 0).all()
+
+
+def test_prune_by_k_keeps_the_true_nearest(landmarks, points):
+    truth = exact(points)
+    sources = np.arange(10)
+    candidates = np.tile(np.arange(10, 80), (10, 1))
+    kept = landmarks.prune(sources, candidates, k=3)
+    assert sum(len(row) for row in kept) < candidates.size
+    for source, row in zip(sources, kept):
+        nearest = candidates[source][np.argsort(truth[source, candidates[source]])[:3]]
+        assert set(nearest) <= set(row.tolist())
+
+
+def test_prune_by_threshold(landmarks, points):
+    truth = exact(points)
+    sources = np.array([0, 1])
+    candidates = np.tile(np.arange(2, 80), (2, 1))
+    threshold = np.array([50.0, 80.0])
+    kept = landmarks.prune(sources, candidates, threshold=threshold)
+    for source, row, limit in zip(sources, kept, threshold):
+        within = candidates[source][truth[source, candidates[source]] <= limit]
+        assert set(within) <= set(row.tolist())
+        assert len(row) < candidates.shape[1]
+
+
+def test_prune_without_candidates(landmarks):
+    kept = landmarks.prune([0, 1], np.empty((2, 0), dtype=np.int64), k=2)
+    assert [len(row) for row in kept] == [0, 0]
+
+
+@pytest.mark.parametrize("options", [{}, {"k": 0}, {"k": -1}])
+def test_prune_needs_a_threshold_or_a_positive_k(landmarks, options):
+    with pytest.raises(ValueError):
+        landmarks.prune([0], [[1, 2, 3]], **options)
+
+
+def test_nearest_matches_brute_force(landmarks, points):
+    truth = exact(points)
+    asked = []
+
+    def exact_row(source, targets):
+        asked.append(len(targets))
+        return truth[source, targets]
+
+    targets, values = landmarks.nearest(5, np.arange(20, 80), exact_row, k=4)
+    expected = np.arange(20, 80)[np.argsort(truth[5, 20:], kind="stable")[:4]]
+    assert targets.tolist() == expected.tolist()
+    assert values.tolist() == truth[5, expected].tolist()
+    assert asked[0] < 60
+
+
+def test_save_and_load(landmarks, tmp_path):
+    path = str(tmp_path / "landmarks.npz")
+    landmarks.save(path)
+    loaded = Landmarks.load(path)
+    assert np.array_equal(loaded.from_landmark, landmarks.from_landmark)
+    assert np.array_equal(loaded.to_landmark, landmarks.to_landmark)
+    assert loaded.metric == landmarks.metric and loaded.stats == landmarks.stats
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from conftest import travel_time
+from ors_matrix import LocationMatrix
+
+LIMITS = {"matrix": {"maximum_routes": 2500}}
+
+
+def stops(count, start=0):
+    return [[106.8 + (start + i) * 0.01, -6.2 - (start + i) % 3 * 0.01] for i in range(count)]
+
+
+def exact(locations):
+    return np.array([[travel_time(a, b) for b in locations] for a in locations])
+
+
+@pytest.fixture
+def matrix(matrix_send):
+    matrix = LocationMatrix("driving-car")
+    assert matrix.update(stops(5), matrix_send, LIMITS) is None
+    return matrix
+
+
+def test_first_update_fetches_the_full_matrix(matrix, matrix_send):
+    assert matrix.last_cells == 25 and len(matrix_send.calls) == 1
+    assert np.array_equal(matrix["duration"], exact(stops(5)))
+    assert np.array_equal(matrix["distance"], exact(stops(5)) * 10)
+
+
+def test_adding_a_stop_fetches_only_its_row_and_column(matrix, matrix_send):
+    matrix["duration"][1, 2] = -1.0  # a surviving cell must be kept, not fetched again
+    locations = stops(5) + stops(1, start=7)
+    assert matrix.update(locations, matrix_send, LIMITS) is None
+    assert matrix.last_cells == 6 + 5
+    row, column = matrix_send.calls[-2:]
+    assert (row["sources"], row["destinations"]) == ([5], list(range(6)))
+    assert (column["sources"], column["destinations"]) == (list(range(5)), [5])
+    expected = exact(locations)
+    expected[1, 2] = -1.0
+    assert np.array_equal(matrix["duration"], expected)
+
+
+def test_moving_a_stop_refetches_only_that_stop(matrix, matrix_send):
+    locations = stops(5)
+    locations[2] = [106.9, -6.3]
+    assert matrix.update(locations, matrix_send, LIMITS) is None
+    assert matrix.last_cells == 5 + 4
+    assert matrix_send.calls[-2]["sources"] == [2]
+    assert matrix_send.calls[-1]["destinations"] == [2]
+    assert np.array_equal(matrix["duration"], exact(locations))
+
+
+def test_removing_and_reordering_fetches_nothing(matrix, matrix_send):
+    locations = [stops(5)[i] for i in (4, 0, 2)]
+    assert matrix.update(locations, matrix_send, LIMITS) is None
+    assert matrix.last_cells == 0 and len(matrix_send.calls) == 1
+    assert np.array_equal(matrix["duration"], exact(locations))
+    assert matrix.index_of(stops(5)[2]) == 2
+    with pytest.raises(KeyError):
+        matrix.index_of(stops(5)[1])
+
+
+def test_repeated_locations_keep_their_own_rows(matrix, matrix_send):
+    locations = stops(5) + [stops(5)[0]]
+    assert matrix.update(locations, matrix_send, LIMITS) is None
+    assert matrix.last_cells == 6 + 5  # the copy is new; only existing rows are reused
+    assert matrix.update(locations[::-1], matrix_send, LIMITS) is None
+    assert matrix.last_cells == 0
+    assert np.array_equal(matrix["duration"], exact(locations[::-1]))
+
+
+def test_large_updates_are_tiled(matrix, matrix_send):
+    locations = stops(5) + stops(40, start=10)
+    assert matrix.update(locations, matrix_send, {"matrix": {"maximum_routes": 100}}) is None
+    assert matrix.last_cells == 40 * 45 + 5 * 40
+    assert all(len(call["sources"]) * len(call["destinations"]) <= 100 for call in matrix_send.calls[1:])
+    assert np.array_equal(matrix["duration"], exact(locations))
+
+
+def test_failed_update_keeps_the_previous_matrix(matrix):
+    before = matrix["duration"].copy()
+    error = matrix.update(stops(6), lambda endpoint, body, arrays=False: (None, "ORS is down"), LIMITS)
+    assert error == "ORS is down"
+    assert matrix.locations == stops(5)
+    assert np.array_equal(matrix["duration"], before)
+
+
+def test_vroom_matrices_need_every_cell(matrix, matrix_send):
+    custom = matrix.vroom_matrices()["driving-car"]
+    assert custom["durations"] == np.rint(exact(stops(5))).astype(int).tolist()
+
+    def unroutable(endpoint, body, arrays=False):
+        result, error = matrix_send(endpoint, body, arrays)
+        result["durations"][0, 0] = np.nan  # ORS answers null for unroutable pairs
+        return result, error
+
+    matrix.update(stops(6), unroutable, LIMITS)
+    assert not matrix.complete and matrix.vroom_matrices() is None
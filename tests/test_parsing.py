@@ -0,0 +1,99 @@
+import json
+
+import numpy as np
+import pytest
+
+import ors_parsing
+from ors_parsing import FAST_PATH_BYTES, decode_numeric_array, json_default, parse_response, parse_with_arrays
+
+
+@pytest.fixture(params=["orjson", "fallback"])
+def parser(request, monkeypatch):
+    """Runs a test with orjson and again with the json/NumPy text fallback"""
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(ors_parsing, "orjson", None)
+    return request.param
+
+
+def matrix_body(size, unroutable=()):
+    durations = [[float(i * size + j) for j in range(size)] for i in range(size)]
+    for i, j in unroutable:
+        durations[i][j] = None
+    locations = [[106.8 + i / 1000, -6.2] for i in range(size)]
+    return {"durations": durations, "distances": [[cell * 10 if cell is not None else None for cell in row]
+                                                  for row in durations],
+            "sources": [{"location": location} for location in locations],
+            "destinations": [{"location": location} for location in locations],
+            "metadata": {"query": {"locations": locations, "metrics": ["duration", "distance"]}}}
+
+
+def test_decode_numeric_array_turns_null_into_nan(parser):
+    values = decode_numeric_array(b"[[0, null, 2.5], [1e3, -4, null]]")
+    assert values.shape == (2, 3)
+    assert np.isnan(values[0, 1]) and np.isnan(values[1, 2])
+    assert values[1, 0] == 1000.0 and values[0, 2] == 2.5
+
+
+def test_decode_numeric_array_shapes(parser):
+    assert decode_numeric_array(b" [1, 2, 3] ").tolist() == [1.0, 2.0, 3.0]
+    assert decode_numeric_array(b"[]").shape == (0,)
+    assert decode_numeric_array(b"[\n  [1,\n 2],\n  [3, 4]\n]").tolist() == [[1.0, 2.0], [3.0, 4.0]]
+
+
+@pytest.mark.parametrize("raw", [b"[[1, 2], [3, x]]", b"[[1, 2], [3,", b"[[1, 2], [3, 4, 5]]"])
+def test_decode_numeric_array_rejects_malformed_input(parser, raw):
+    with pytest.raises(ValueError):
+        decode_numeric_array(raw)
+
+
+def test_large_matrix_comes_back_as_arrays(parser):
+    body = matrix_body(120, unroutable=[(3, 7)])
+    content = json.dumps(body).encode()
+    assert len(content) >= FAST_PATH_BYTES
+    parsed = parse_response(content, arrays=True)
+    assert isinstance(parsed["durations"], np.ndarray) and isinstance(parsed["distances"], np.ndarray)
+    assert parsed["durations"].shape == (120, 120)
+    assert np.isnan(parsed["durations"][3, 7]) and np.isnan(parsed["distances"][3, 7])
+    expected = np.array(body["durations"], dtype=float)
+    assert np.array_equal(parsed["durations"], expected, equal_nan=True)
+    # Everything else is parsed as usual
+    assert parsed["sources"] == body["sources"] and parsed["metadata"] == body["metadata"]
+
+
+def test_small_or_plain_responses_keep_lists(parser):
+    small = json.dumps(matrix_body(5)).encode()
+    assert len(small) < FAST_PATH_BYTES
+    assert parse_response(small, arrays=True)["durations"] == matrix_body(5)["durations"]
+    large = json.dumps(matrix_body(120)).encode()
+    assert isinstance(parse_response(large)["durations"], list)
+
+
+def test_geometry_coordinates_are_left_alone(parser):
+    coordinates = [[106.8 + i / 1e4, -6.2] for i in range(20000)]
+    body = {"type": "FeatureCollection",
+            "metadata": {"query": {"coordinates": [coordinates[0], coordinates[-1]]}},
+            "features": [{"type": "Feature", "geometry": {"type": "LineString", "coordinates": coordinates},
+                          "properties": {"summary": {"distance": 1.0}}}]}
+    content = json.dumps(body).encode()
+    assert len(content) >= FAST_PATH_BYTES
+    assert parse_response(content, arrays=True) == body
+
+
+def test_parse_with_arrays_accepts_str_and_bodies_without_arrays(parser):
+    assert parse_with_arrays('{"durations": [[1, 2]], "metadata": {}}')["durations"].tolist() == [[1.0, 2.0]]
+    assert parse_with_arrays(b'{"routes": []}') == {"routes": []}
+
+
+def test_parse_with_arrays_rejects_malformed_bodies(parser):
+    content = json.dumps(matrix_body(120)).encode()
+    with pytest.raises(ValueError):
+        parse_with_arrays(content[:len(content) // 2])
+
+
+def test_json_default_serializes_numpy_bodies():
+    body = {"locations": np.array([[8.68, 49.41], [8.69, 49.42]]), "sources": np.arange(2)}
+    assert json.dumps(body, default=json_default) == json.dumps({k: v.tolist() for k, v in body.items()})
+    with pytest.raises(TypeError):
+        json.dumps({"when": object()}, default=json_default)
@@ -0,0 +1,130 @@
+import numpy as np
+import pytest
+
+from ors_geometry import decode_polyline
+from ors_planner import merge_directions, plan_directions, plan_matrix, send_planned
+
+PROFILE = "driving-car"
+LIMITS = {"profiles": {PROFILE: {"maximum_distance": 100000, "maximum_waypoints": 4}},
+          "matrix": {"maximum_routes": 100}}
+
+
+def waypoints(count, step=0.01):
+    return [[8.68 + i * step, 49.41] for i in range(count)]
+
+
+def test_plan_directions_splits_at_shared_waypoints():
+    body = {"coordinates": waypoints(10)}
+    bodies, error = plan_directions(PROFILE, body, LIMITS)
+    assert error is None
+    assert all(len(b["coordinates"]) <= 4 for b in bodies)
+    for first, second in zip(bodies, bodies[1:]):
+        assert first["coordinates"][-1] == second["coordinates"][0]
+    stitched = bodies[0]["coordinates"] + sum((b["coordinates"][1:] for b in bodies[1:]), [])
+    assert stitched == body["coordinates"]
+
+
+def test_plan_directions_keeps_small_bodies_whole():
+    body = {"coordinates": waypoints(4)}
+    assert plan_directions(PROFILE, body, LIMITS) == ([body], None)
+
+
+def test_plan_directions_rejects_legs_over_the_distance_limit():
+    bodies, error = plan_directions(PROFILE, {"coordinates": waypoints(3, step=2.0)}, LIMITS)
+    assert bodies is None
+    assert "waypoints 1 and 2" in error
+
+
+def test_plan_directions_rejects_split_alternative_routes():
+    bodies, error = plan_directions(PROFILE, {"coordinates": waypoints(10), "alternative_routes": {"target_count": 2}}, LIMITS)
+    assert bodies is None
+    assert "alternative routes" in error
+
+
+def test_plan_directions_slices_per_waypoint_options():
+    body = {"coordinates": waypoints(7), "radiuses": list(range(7)), "skip_segments": [2, 5]}
+    bodies, _ = plan_directions(PROFILE, body, LIMITS)
+    assert [b["radiuses"] for b in bodies] == [[0, 1, 2, 3], [3, 4, 5, 6]]
+    assert [b["skip_segments"] for b in bodies] == [[2], [2]]
+
+
+@pytest.mark.parametrize("options", [
+    {"geometry": False},
+    {"geometry": False, "format": "geojson"},
+    {"geometry": True},
+    {"geometry": True, "format": "geojson"},
+])
+def test_split_directions_merge_into_the_unsplit_answer(options, directions_send):
+    body = dict(options, coordinates=waypoints(10))
+    whole, _ = directions_send("directions/driving-car", body)
+    merged, error = send_planned(f"directions/{PROFILE}", body, directions_send, LIMITS)
+    assert error is None
+    assert merged["metadata"]["split_requests"] == 3
+
+    def route(result):
+        return result["features"][0]["properties"] if "features" in result else result["routes"][0]
+
+    assert route(merged)["way_points"] == route(whole)["way_points"]
+    assert route(merged)["segments"] == route(whole)["segments"]
+    assert route(merged)["summary"] == route(whole)["summary"]
+    if options["geometry"]:
+        part = (lambda r: r["features"][0]) if "features" in whole else route
+        geometry = part(merged)["geometry"]
+        expected = part(whole)["geometry"]
+        if isinstance(expected, str):
+            geometry, expected = decode_polyline(geometry), decode_polyline(expected)
+        assert geometry == expected
+
+
+def test_merge_directions_without_way_points_falls_back_to_steps(directions_send):
+    body = {"coordinates": waypoints(5), "geometry": False}
+    whole, _ = directions_send("directions/driving-car", body)
+    parts = [directions_send("directions/driving-car", dict(body, coordinates=body["coordinates"][start:end]))[0]
+             for start, end in ((0, 3), (2, 5))]
+    for result in parts:
+        del result["routes"][0]["way_points"]
+    merged = merge_directions(parts, body)
+    assert merged["routes"][0]["segments"] == whole["routes"][0]["segments"]
+
+
+def test_plan_matrix_tiles_carry_only_their_locations():
+    body = {"locations": waypoints(30)}
+    bodies, error = plan_matrix(PROFILE, body, LIMITS)
+    assert error is None
+    assert len(bodies) > 1
+    for tile in bodies:
+        assert len(tile["sources"]) * len(tile["destinations"]) <= 100
+        assert len(tile["locations"]) <= len(tile["sources"]) + len(tile["destinations"])
+        assert max(tile["sources"] + tile["destinations"]) < len(tile["locations"])
+
+
+def test_tiled_matrix_merges_into_the_untiled_answer(matrix_send):
+    body = {"locations": waypoints(30), "sources": list(range(0, 30, 2)), "destinations": list(range(29, 0, -1))}
+    whole, _ = matrix_send("matrix/driving-car", body)
+    merged, error = send_planned(f"matrix/{PROFILE}", body, matrix_send, LIMITS)
+    assert error is None
+    assert len(matrix_send.calls) > 2
+    assert merged["durations"] == whole["durations"]
+    assert merged["sources"] == whole["sources"]
+    assert merged["destinations"] == whole["destinations"]
+    assert not any(key.startswith("_") for call in matrix_send.calls for key in call)
+
+
+def test_tiled_matrix_merges_numpy_tiles(matrix_send):
+    body = {"locations": waypoints(30)}
+    whole, _ = matrix_send("matrix/driving-car", body)
+    merged, error = send_planned(f"matrix/{PROFILE}", body, matrix_send, LIMITS, arrays=True)
+    assert error is None
+    assert isinstance(merged["durations"], np.ndarray)
+    assert merged["durations"].tolist() == whole["durations"]
+
+
+def test_send_planned_only_asks_for_arrays_when_requested():
+    seen = []
+
+    def send(endpoint, body):
+        seen.append(body)
+        return {"durations": [[0.0]]}, None
+
+    result, error = send_planned(f"matrix/{PROFILE}", {"locations": waypoints(1)}, send, LIMITS)
+    assert error is None and len(seen) == 1
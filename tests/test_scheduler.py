@@ -0,0 +1,108 @@
+import threading
+
+import pytest
+
+import ors_scheduler
+from ors_scheduler import RequestScheduler, _Waiter
+
+
+class FakeLimiter:
+    """Hands out numbered tokens while slots are free"""
+
+    def __init__(self, slots=0):
+        self.slots = slots
+        self.issued = 0
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        with self.lock:
+            if self.slots <= 0:
+                return None
+            self.slots -= 1
+            self.issued += 1
+            return self.issued
+
+    def release(self, token, status_code=None, failed=False):
+        with self.lock:
+            self.slots += 1
+        return 0.0
+
+
+def queue(scheduler, *requests):
+    """Enqueue (priority, session_id) waiters without serving them; returns the waiters"""
+    waiters = [_Waiter(priority, session_id) for priority, session_id in requests]
+    with scheduler._lock:
+        for waiter in waiters:
+            scheduler._enqueue(waiter)
+    return waiters
+
+
+def serve(scheduler, waiters, slots):
+    """Open `slots` slots and return who got them, in order"""
+    scheduler.limiter.slots += slots
+    scheduler._dispatch()
+    served = sorted((w for w in waiters if w.token is not None), key=lambda w: w.token)
+    return [(w.priority, w.session_id) for w in served]
+
+
+def test_sessions_in_a_class_take_turns():
+    scheduler = RequestScheduler(FakeLimiter())
+    waiters = queue(scheduler, *[("batch", "bulk")] * 10, *[("batch", "analyst")] * 2)
+    order = [session for _, session in serve(scheduler, waiters, 6)]
+    assert order == ["bulk", "analyst", "bulk", "analyst", "bulk", "bulk"]
+
+
+def test_interactive_gets_most_slots_but_prefetch_is_not_starved():
+    scheduler = RequestScheduler(FakeLimiter())
+    waiters = queue(scheduler, *[("prefetch", "map")] * 20, *[("interactive", "user")] * 40)
+    order = [priority for priority, _ in serve(scheduler, waiters, 34)]
+    assert order.count("prefetch") == 2
+    assert order.count("interactive") == 32
+
+
+def test_sessions_over_their_rate_wait_for_the_others():
+    scheduler = RequestScheduler(FakeLimiter(), session_rates={"batch": (0.0, 2)})
+    waiters = queue(scheduler, *[("batch", "bulk")] * 6)
+    assert serve(scheduler, waiters, 2) == [("batch", "bulk")] * 2
+    waiters += queue(scheduler, *[("batch", "analyst")] * 2)
+    order = [session for _, session in serve(scheduler, waiters, 3)][2:]
+    assert order == ["analyst", "analyst", "bulk"]
+
+
+def test_a_returning_class_does_not_cash_in_idle_credit():
+    scheduler = RequestScheduler(FakeLimiter())
+    waiters = queue(scheduler, *[("interactive", "user")] * 40)
+    serve(scheduler, waiters, 32)
+    waiters += queue(scheduler, *[("prefetch", "map")] * 5)
+    order = [priority for priority, _ in serve(scheduler, waiters, 5)][32:]
+    assert order.count("prefetch") == 1
+
+
+def test_acquire_times_out_and_release_hands_the_slot_on():
+    scheduler = RequestScheduler(FakeLimiter(slots=1))
+    token = scheduler.acquire("batch", "bulk")
+    with pytest.raises(TimeoutError):
+        scheduler.acquire("batch", "bulk", timeout=0.05)
+    assert scheduler.metrics()["batch"]["timeouts"] == 1
+    scheduler.release(token)
+    assert scheduler.acquire("interactive", "user", timeout=1) is not None
+
+
+def test_unknown_priority_is_rejected():
+    with pytest.raises(ValueError):
+        RequestScheduler(FakeLimiter(slots=1)).acquire("urgent")
+
+
+def test_idle_sessions_are_forgotten():
+    scheduler = RequestScheduler(FakeLimiter())
+    waiters = queue(scheduler, ("batch", "gone"), ("batch", "busy"), ("batch", "busy"))
+    serve(scheduler, waiters, 2)
+    assert ("batch", "gone") in scheduler._buckets
+    later = waiters[0].enqueued + ors_scheduler.SESSION_IDLE_TTL + 1
+    with scheduler._lock:
+        scheduler._prune_idle(later)
+    assert "gone" not in scheduler._session_vtime["batch"]
+    assert ("batch", "gone") not in scheduler._buckets
+    assert ("batch", "gone") not in scheduler._last_seen
+    # Still queued, so kept however long ago it arrived
+    assert ("batch", "busy") in scheduler._last_seen
@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+import ors_sparse
+from conftest import travel_time
+from ors_geometry import haversine
+from ors_landmarks import Landmarks
+from ors_sparse import SparseMatrix, build_sparse_matrix, hilbert_order, nearest_neighbours, plan_tiles
+
+LIMITS = {"matrix": {"maximum_routes": 300}}
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(5)
+    return np.column_stack([106.6 + rng.random(300) * 0.5, -6.4 + rng.random(300) * 0.3])
+
+
+@pytest.fixture
+def numpy_search(monkeypatch):
+    """The chunked NumPy search, in small chunks, even when SciPy is installed"""
+    monkeypatch.setattr(ors_sparse, "cKDTree", None)
+    monkeypatch.setattr(ors_sparse, "KNN_CHUNK", 64)
+
+
+def brute_force_distances(points, k):
+    distances = haversine(points[:, None, :], points[None, :, :])
+    np.fill_diagonal(distances, np.inf)
+    return np.sort(distances, axis=1)[:, :k]
+
+
+def chosen_distances(points, neighbours):
+    return np.array([haversine(points[i], points[row]) for i, row in enumerate(neighbours)])
+
+
+def test_numpy_search_finds_the_nearest_neighbours(points, numpy_search):
+    neighbours = nearest_neighbours(points, 8)
+    assert neighbours.shape == (300, 8)
+    assert not (neighbours == np.arange(300)[:, None]).any()
+    assert np.allclose(chosen_distances(points, neighbours), brute_force_distances(points, 8))
+
+
+def test_scipy_and_numpy_searches_agree(points, monkeypatch):
+    pytest.importorskip("scipy")
+    with_scipy = nearest_neighbours(points, 8)
+    monkeypatch.setattr(ors_sparse, "cKDTree", None)
+    assert np.allclose(chosen_distances(points, with_scipy),
+                       chosen_distances(points, nearest_neighbours(points, 8)))
+
+
+def test_neighbour_search_edge_cases(numpy_search):
+    duplicates = np.array([[106.8, -6.2], [106.8, -6.2], [106.9, -6.3]])
+    neighbours = nearest_neighbours(duplicates, 5)  # k is capped at n - 1
+    assert neighbours.tolist()[:2] == [[1, 2], [0, 2]]
+    assert nearest_neighbours(duplicates[:1], 3).shape == (1, 0)
+
+
+def test_hilbert_order_keeps_neighbours_together(points):
+    order = hilbert_order(points)
+    assert sorted(order.tolist()) == list(range(300))
+    along_curve = haversine(points[order[:-1]], points[order[1:]]).mean()
+    shuffled = np.random.default_rng(0).permutation(300)
+    assert along_curve < haversine(points[shuffled[:-1]], points[shuffled[1:]]).mean() / 4
+
+
+def test_plan_tiles_stay_within_maximum_routes(points):
+    candidates = list(nearest_neighbours(points, 10))
+    tiles = plan_tiles(candidates, hilbert_order(points), 300)
+    assert sorted(s for sources, _ in tiles for s in sources) == list(range(300))
+    for sources, destinations in tiles:
+        assert len(sources) * len(destinations) <= 300
+        for source in sources:
+            assert set(candidates[source].tolist()) <= set(destinations)
+
+
+def test_sparse_matrix_csr_layout(points, matrix_send):
+    matrix, error = build_sparse_matrix(points, "driving-car", matrix_send, LIMITS, k=6)
+    assert error is None
+    assert matrix.shape == (300, 300) and matrix.nnz == 300 * 6
+    assert matrix.indptr.tolist() == list(range(0, 300 * 6 + 1, 6))
+    assert all(len(call["sources"]) * len(call["destinations"]) <= 300 for call in matrix_send.calls)
+    assert matrix.stats["cells_fetched"] < 300 * 300 / 4
+    for i in (0, 17, 299):
+        indices, durations = matrix.row(i)
+        assert set(indices.tolist()) == set(nearest_neighbours(points, 6)[i].tolist())
+        assert durations.tolist() == [travel_time(points[i], points[j]) for j in indices]
+        assert (np.diff(durations) >= 0).all()  # nearest by travel time first
+        assert matrix.get(i, indices[0], "distance") == durations[0] * 10
+    assert np.isnan(matrix.get(0, 0))
+
+
+def test_sparse_matrix_save_and_load(points, matrix_send, tmp_path):
+    matrix, _ = build_sparse_matrix(points[:50], "driving-car", matrix_send, LIMITS, k=4)
+    path = str(tmp_path / "sparse.npz")
+    matrix.save(path)
+    loaded = SparseMatrix.load(path)
+    assert np.array_equal(loaded.indptr, matrix.indptr) and np.array_equal(loaded.indices, matrix.indices)
+    assert sorted(loaded.data) == ["distance", "duration"]
+    assert np.array_equal(loaded.data["duration"], matrix.data["duration"])
+    assert loaded.stats == matrix.stats
+
+
+def test_to_scipy(points, matrix_send):
+    pytest.importorskip("scipy")
+    matrix, _ = build_sparse_matrix(points[:50], "driving-car", matrix_send, LIMITS, k=4)
+    dense = matrix.to_scipy().toarray()
+    indices, durations = matrix.row(3)
+    assert dense[3, indices].tolist() == durations.tolist()
+
+
+def test_landmark_pass_picks_neighbours_by_travel_time(points, matrix_send):
+    landmarks, _ = Landmarks.build(points, "driving-car", matrix_send, LIMITS, count=8)
+    matrix, error = build_sparse_matrix(points, "driving-car", matrix_send, LIMITS, k=6, landmarks=landmarks)
+    assert error is None
+    assert matrix.stats["pruned"] > 0
+    pool = nearest_neighbours(points, 6 * ors_sparse.CANDIDATE_FACTOR)
+    for i in range(0, 300, 29):
+        by_time = sorted(travel_time(points[i], points[j]) for j in pool[i])[:6]
+        assert matrix.row(i)[1].tolist() == by_time
@@ -0,0 +1,112 @@
+import json
+
+import numpy as np
+import pytest
+
+from ors_cache import ResultCache
+from ors_geometry import haversine
+from ors_surrogate import Surrogate, fit_profile, pairs_from_cache
+
+
+def synthetic_pairs(count, seed):
+    """Pairs around Jakarta: 1.3x circuity and 10 m/s, each with lognormal noise"""
+    rng = np.random.default_rng(seed)
+    origins = np.column_stack([106.6 + rng.random(count) * 0.5, -6.4 + rng.random(count) * 0.3])
+    destinations = np.column_stack([106.6 + rng.random(count) * 0.5, -6.4 + rng.random(count) * 0.3])
+    distances = haversine(origins, destinations) * 1.3 * rng.lognormal(0, 0.1, count)
+    durations = distances / 10 * rng.lognormal(0, 0.15, count)
+    return origins, destinations, durations, distances
+
+
+@pytest.fixture(scope="module")
+def surrogate():
+    return Surrogate.train({"driving-car": synthetic_pairs(5000, seed=1)})
+
+
+def test_pairs_from_cache_reads_matrices_and_directions(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    matrix = {"durations": [[0, 60], [65, None]], "distances": [[0, 600], [640, None]],
+              "sources": [{"location": [106.8, -6.2]}, {"location": [106.81, -6.2]}],
+              "destinations": [{"location": [106.8, -6.2]}, {"location": [106.81, -6.2]}]}
+    route = {"features": [{"properties": {"segments": [{"duration": 30, "distance": 300},
+                                                       {"duration": 40, "distance": 450}],
+                                          "summary": {"duration": 70, "distance": 750}}}],
+             "metadata": {"query": {"coordinates": [[106.8, -6.2], [106.805, -6.2], [106.81, -6.21]]}}}
+    single = {"routes": [{"summary": {"duration": 90, "distance": 1000}}],
+              "metadata": {"query": {"coordinates": [[106.7, -6.3], [106.71, -6.3]]}}}
+    cache.put("a", "matrix/driving-car", json.dumps(matrix).encode())
+    cache.put("b", "directions/driving-car/geojson", json.dumps(route).encode())
+    cache.put("c", "directions/cycling-regular/json", json.dumps(single).encode())
+    cache.put("d", "status", b"{}")
+    cache.put("e", "directions/driving-car", b"{not json")
+    cache.close()
+
+    data = pairs_from_cache(str(tmp_path / "cache.sqlite"))
+    assert sorted(data) == ["cycling-regular", "driving-car"]
+    origins, destinations, durations, distances = data["driving-car"]
+    assert sorted(durations.tolist()) == [0, 30, 40, 60, 65]  # the unroutable cell is left out
+    assert distances[durations.tolist().index(40)] == 450
+    assert destinations[durations.tolist().index(40)].tolist() == [106.81, -6.21]
+    assert data["cycling-regular"][2].tolist() == [90]
+
+
+def test_fit_recovers_the_pace_and_circuity():
+    model = fit_profile(*synthetic_pairs(5000, seed=2))
+    origins, destinations, durations, distances = synthetic_pairs(2000, seed=3)
+    predicted = model.predict(origins, destinations)
+    assert np.median(np.abs(predicted["distance"] - distances) / distances) < 0.1
+    assert np.median(np.abs(predicted["duration"] - durations) / durations) < 0.15
+    assert model.metrics["train_pairs"] + model.metrics["calibration_pairs"] <= 5000
+
+
+def test_intervals_cover_about_ninety_percent_of_unseen_pairs(surrogate):
+    origins, destinations, durations, distances = synthetic_pairs(4000, seed=4)
+    predicted = surrogate.predict("driving-car", origins, destinations)
+    for target, actual in (("duration", durations), ("distance", distances)):
+        inside = (predicted[f"{target}_low"] <= actual) & (actual <= predicted[f"{target}_high"])
+        assert 0.85 <= inside.mean() <= 0.95
+        assert (predicted[f"{target}_low"] < predicted[target]).all()
+        assert (predicted[target] < predicted[f"{target}_high"]).all()
+
+
+def test_fit_needs_enough_pairs():
+    with pytest.raises(ValueError):
+        fit_profile(*synthetic_pairs(5, seed=5))
+    assert Surrogate.train({"driving-car": synthetic_pairs(5, seed=5)}).profiles == {}
+
+
+def test_route_adds_legs_and_combines_bounds_in_quadrature(surrogate):
+    stops = [[106.7, -6.3], [106.8, -6.25], [106.9, -6.2], [106.95, -6.35]]
+    legs = surrogate.predict("driving-car", stops[:-1], stops[1:])
+    totals = surrogate.route("driving-car", stops)
+    assert totals["calibrated"] is False
+    for target in ("duration", "distance"):
+        assert totals[target] == pytest.approx(legs[target].sum())
+        below = np.sqrt(((legs[target] - legs[f"{target}_low"]) ** 2).sum())
+        assert totals[f"{target}_low"] == pytest.approx(totals[target] - below)
+        # Narrower than adding the legs' bounds, wider than any single leg's
+        assert totals[f"{target}_low"] > legs[f"{target}_low"].sum()
+        assert totals[f"{target}_high"] < legs[f"{target}_high"].sum()
+
+
+def test_single_leg_route_is_the_calibrated_interval(surrogate):
+    stops = [[106.7, -6.3], [106.8, -6.25]]
+    leg = surrogate.predict("driving-car", stops[:1], stops[1:])
+    totals = surrogate.route("driving-car", stops)
+    assert totals["calibrated"] is True
+    assert totals["duration_low"] == pytest.approx(leg["duration_low"][0])
+    assert totals["duration_high"] == pytest.approx(leg["duration_high"][0])
+
+
+def test_unknown_profiles_and_short_routes(surrogate):
+    assert surrogate.predict("foot-walking", [[106.7, -6.3]], [[106.8, -6.3]]) is None
+    assert surrogate.route("foot-walking", [[106.7, -6.3], [106.8, -6.3]]) is None
+    assert surrogate.route("driving-car", [[106.7, -6.3]]) is None
+
+
+def test_save_and_load(surrogate, tmp_path):
+    path = str(tmp_path / "surrogate.json")
+    surrogate.save(path)
+    loaded = Surrogate.load(path)
+    stops = [[106.7, -6.3], [106.8, -6.25], [106.9, -6.2]]
+    assert loaded.route("driving-car", stops) == pytest.approx(surrogate.route("driving-car", stops))